@@ -1,65 +1,147 @@
+# python
+from typing import List
+import glob
+import json
+import mmap
+import os
+import re
+# 유틸리티 함수
 import gradio as gr
-import jsonlines
+import fire
+# framework
+from checkpoint import read_index
 
-# 데이터 준비
-with jsonlines.open('user_oriented_instructions_deepl_ko.jsonl') as reader:
-    idxs = [obj['id'] for obj in reader]
-with jsonlines.open('user_oriented_instructions_deepl_ko_eval_chatgpt.jsonl') as reader:
-    chatgpt = {obj['id']: obj for obj in reader}
-with jsonlines.open('user_oriented_instructions_deepl_ko_eval_gpt4.jsonl') as reader:
-    gpt4 = {obj['id']: obj for obj in reader}
+
+class ResultFile:
+    """
+    jsonl 결과 파일을 id 로 읽는 클래스입니다.
+    manifest(.ckpt) 의 바이트 위치 색인과 mmap 을 사용하므로, 파일 크기와 상관없이 필요한 줄만 읽습니다.
+    manifest 가 없으면 메모리에서만 색인하며, 결과 파일 옆에 아무것도 쓰지 않습니다.
+
+    Args:
+        filepath (str): jsonl 파일 경로
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.index = read_index(filepath, write_manifest=False)
+        self.keys = {str(obj_id): obj_id for obj_id in self.index}  # 화면(드롭다운)의 문자열 id -> 실제 id
+        with open(filepath, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(filepath) else None
+
+    def get(self, key: str):
+        """문자열 id 에 해당하는 객체를 반환합니다. 없으면 None 을 반환합니다."""
+        location = self.index.get(self.keys.get(key))
+        if location is None or self.mm is None:
+            return None
+        offset, nbytes = location
+        return json.loads(self.mm[offset:offset + nbytes])
+
+
+def discover(directory='.') -> dict:
+    """
+    directory 에서 '<base>_eval_<model>.jsonl' 파일들을 찾아 {base: {model: 파일 경로}} 로 반환합니다.
+    """
+    results = {}
+    for filepath in sorted(glob.glob(os.path.join(directory, '*_eval_*.jsonl'))):
+        match = re.match(r'(.+)_eval_(.+)\.jsonl$', os.path.basename(filepath))
+        if match:
+            results.setdefault(match.group(1), {})[match.group(2)] = filepath
+    return results
 
 
 # 마크다운 변환
-def extract_output(model:str, obj: dict):
-        return f"""## {model}
-{obj['instances'][0]['output']}"""
+def instances(obj: dict) -> List[dict]:
+    # user_oriented_instructions 는 instances 리스트를, dolly 는 context/response 를 사용합니다.
+    if 'instances' in obj:
+        return obj['instances']
+    return [{'input': obj.get('context', obj.get('input', '')), 'output': obj.get('response', obj.get('answer', ''))}]
+
+
+def extract_output(model: str, obj: dict):
+    if obj is None:
+        return f"## {model}\n(no result)"
+    outputs = '\n\n---\n\n'.join(str(instance.get('output', '')) for instance in instances(obj))
+    return f"""## {model}
+{outputs}"""
+
 
 def extract_input_md(obj: dict):
-        return f"""## Instruction
+    if obj is None:
+        return ''
+    inputs = '\n\n'.join(str(instance.get('input', '')) for instance in instances(obj))
+    return f"""## Instruction
 {obj['instruction']}
 ## Input
-{obj['instances'][0]['input']}
+{inputs}
 
 ---
 """
 
-def update(idx):
-    return [extract_input_md(chatgpt[idx]), extract_output('chatgpt', chatgpt[idx]), extract_output('gpt4', gpt4[idx])]
-
-# 데이터 이동
-def dec(idx):
-    return move(idx, -1)
-
-def inc(idx):
-    return move(idx, 1)
-
-def move(idx, step):
-    selected_idx = idxs.index(idx)
-    selected_idx += step
-    selected_idx = max(0, selected_idx)
-    selected_idx = min(selected_idx, len(idxs))
-    return idxs[selected_idx]
-
-
-with gr.Blocks() as demo:
-    gr.Markdown("Select example from the following dropdown and see the results for LLMs.")
-    # 드롭다운 리스트
-    dd = gr.Dropdown(idxs, label="id", info="user oriented instruction task id", value=idxs[0])
-    with gr.Row():
-        # 아이템 이동 버튼
-        lb = gr.Button("<-").style(full_width=True)
-        rb = gr.Button("->").style(full_width=True)
-    # 명령 및 입력 출력
-    ins = gr.Markdown(extract_input_md(chatgpt[idxs[0]]))
-    with gr.Row():
-        # chatgpt 결과 출력
-        out1 = gr.Markdown(extract_output('chatGPT', chatgpt[idxs[0]]))
-        # gpt4 결과 출력
-        out2 = gr.Markdown(extract_output('GPT4', gpt4[idxs[0]]))
-
-    lb.click(dec, inputs=dd, outputs=dd)
-    rb.click(inc, inputs=dd, outputs=dd)
-    dd.change(update, dd, [ins, out1, out2])
-
-demo.launch(share=True)
\ No newline at end of file
+
+def build(base: str, files: dict, directory='.'):
+    """base 데이터셋과 모델별 결과 파일로 gradio 화면을 만듭니다."""
+    models = list(files)
+    results = [ResultFile(files[model]) for model in models]
+    # id 순서는 평가 입력 파일(번역 결과)을 따르고, 없으면 첫 번째 결과 파일을 따릅니다.
+    base_filepath = os.path.join(directory, base + '.jsonl')
+    source = ResultFile(base_filepath) if os.path.exists(base_filepath) else results[0]
+    idxs = list(source.keys)
+    positions = {idx: i for i, idx in enumerate(idxs)}  # id -> 위치 (이동을 O(1) 로 합니다)
+
+    def update(idx):
+        objs = [result.get(idx) for result in results]
+        obj = source.get(idx) if source not in results else None
+        obj = next((o for o in [obj] + objs if o is not None), None)
+        return [extract_input_md(obj)] + [extract_output(model, o) for model, o in zip(models, objs)]
+
+    # 데이터 이동
+    def move(idx, step):
+        selected_idx = positions.get(idx, 0) + step
+        selected_idx = max(0, min(selected_idx, len(idxs) - 1))
+        return idxs[selected_idx]
+
+    def dec(idx):
+        return move(idx, -1)
+
+    def inc(idx):
+        return move(idx, 1)
+
+    with gr.Blocks() as demo:
+        gr.Markdown("Select example from the following dropdown and see the results for LLMs.")
+        # 드롭다운 리스트
+        dd = gr.Dropdown(idxs, label="id", info=f"{base} task id", value=idxs[0] if idxs else None)
+        with gr.Row():
+            # 아이템 이동 버튼
+            lb = gr.Button("<-").style(full_width=True)
+            rb = gr.Button("->").style(full_width=True)
+        first = update(idxs[0]) if idxs else [''] * (len(models) + 1)
+        # 명령 및 입력 출력
+        ins = gr.Markdown(first[0])
+        with gr.Row():
+            # 모델별 결과 출력
+            outs = [gr.Markdown(text) for text in first[1:]]
+
+        lb.click(dec, inputs=dd, outputs=dd)
+        rb.click(inc, inputs=dd, outputs=dd)
+        dd.change(update, dd, [ins] + outs)
+    return demo
+
+
+def main(base: str = 'user_oriented_instructions_deepl_ko', directory='.', share=True):
+    """
+    '<base>_eval_<model>.jsonl' 결과 파일들을 모델별 열로 보여주는 뷰어를 실행합니다.
+
+    Args:
+        base (str): 평가 입력 데이터셋 이름 (예: user_oriented_instructions_deepl_ko, databricks-dolly-15k_deepl_ko)
+        directory (str): 결과 파일을 찾을 디렉토리
+        share (bool): gradio 공유 링크 생성 여부
+    """
+    found = discover(directory)
+    if base not in found:
+        raise SystemExit(f"no '{base}_eval_<model>.jsonl' files in {directory}; found: {sorted(found)}")
+    build(base, found[base], directory).launch(share=share)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,125 @@
+# python
+from collections import deque
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Iterable, Iterator, Optional
+import atexit
+import os
+import threading
+# 비동기
+import asyncio
+# framework
+from httppool import close_session, sessions, shared_session, with_session
+
+
+class BackgroundLoop:
+    """
+    동기 코드(노트북, 동기 서비스 등)에서 비동기 백엔드를 사용하기 위해, 별도 스레드에서 계속 실행되는 이벤트 루프입니다.
+    호출마다 이벤트 루프와 HTTP 세션을 새로 만들지 않으며, 모든 호출이 같은 루프에서 실행되므로
+    여러 스레드에서 동시에 들어온 요청도 백엔드별 제한기, DeepL 묶음 요청, packing 의 대상이 됩니다.
+
+    Args:
+        name (str, optional): 스레드 이름. Defaults to 'background-loop'.
+    """
+
+    def __init__(self, name='background-loop'):
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.stopping = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+        self.started.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._hold())
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+
+    async def _hold(self):
+        # 세션 사용자를 하나 유지하여, 호출이 끝날 때마다 공유 세션이 닫히지 않도록 합니다.
+        self.stopping = asyncio.Event()
+        try:
+            async with shared_session():
+                self.started.set()
+                await self.stopping.wait()
+                # 남은 호출을 취소한 뒤 세션을 닫습니다.
+                tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await close_session()  # 사용 수가 맞지 않더라도 이 루프의 세션은 루프와 함께 닫습니다.
+
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        코루틴을 이벤트 루프에서 실행하고 concurrent.futures.Future 를 바로 반환합니다. 여러 스레드에서 동시에 호출할 수 있습니다.
+        Future 를 취소하면 실행 중인 코루틴도 취소됩니다.
+        """
+        return asyncio.run_coroutine_threadsafe(with_session(coro), self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """코루틴을 이벤트 루프에서 실행하고 결과를 기다려 반환합니다."""
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("cannot block on the background loop from inside it; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def map(self, func: Callable[..., Awaitable], *iterables: Iterable, max_concurrency=256) -> Iterator:
+        """
+        func(*args) 코루틴들을 이벤트 루프에서 동시에 실행하고, 결과를 입력 순서대로 돌려주는 제너레이터입니다. (concurrent.futures.Executor.map 과 같습니다)
+        한 번에 max_concurrency 개까지만 제출하므로 입력이 커도 메모리 사용량이 일정합니다. 실제 동시 요청 수는 백엔드의 제한기가 조절합니다.
+
+        Args:
+            func (Callable[..., Awaitable]): 코루틴 함수 (예: translator.__call__)
+            *iterables (Iterable): func 의 인자들
+            max_concurrency (int, optional): 동시에 제출하는 코루틴 수의 상한. Defaults to 256.
+        """
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("cannot block on the background loop from inside it; await the coroutines instead")
+        pending = deque()
+        try:
+            for args in zip(*iterables):
+                if len(pending) >= max_concurrency:
+                    yield pending.popleft().result()
+                pending.append(self.submit(func(*args)))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:  # 결과를 끝까지 읽지 않으면 남은 호출을 취소합니다.
+                future.cancel()
+
+    def close(self, timeout: Optional[float] = 10):
+        """남은 호출을 취소하고 세션과 이벤트 루프를 닫습니다."""
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+            self.thread.join(timeout)
+        if not self.thread.is_alive():
+            sessions.pop(self.loop, None)  # 루프가 닫혔으므로 남은 항목을 지웁니다.
+
+
+# 프로세스별 백그라운드 이벤트 루프. fork 한 자식 프로세스는 자신의 루프를 새로 만듭니다.
+loops = {}
+loops_lock = threading.Lock()
+
+
+def get_loop() -> BackgroundLoop:
+    """현재 프로세스의 백그라운드 이벤트 루프를 반환합니다. 없으면 새로 만듭니다."""
+    with loops_lock:
+        loop = loops.get(os.getpid())
+        if loop is None or not loop.thread.is_alive():
+            loop = loops[os.getpid()] = BackgroundLoop()
+    return loop
+
+
+def run_sync(coro: Awaitable, timeout: Optional[float] = None):
+    """코루틴을 백그라운드 이벤트 루프에서 실행하고 결과를 반환합니다. 예) run_sync(translator('hello'))"""
+    return get_loop().run(coro, timeout)
+
+
+@atexit.register
+def close_loops():
+    loop = loops.pop(os.getpid(), None)
+    if loop is not None:
+        loop.close()
@@ -0,0 +1,80 @@
+# 비동기
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    동시에 들어오는 요청들을 잠깐(max_delay) 모아 한 번의 배치 요청으로 보내고, 결과를 각 호출자에게 돌려주는 클래스입니다.
+    max_delay 가 지나거나 모인 항목 수가 max_items, 크기가 max_bytes 에 도달하면 바로 전송합니다.
+
+    Args:
+        flush_func (Callable[[List[str]], Awaitable[List[str]]]): 항목 리스트를 받아 같은 순서의 결과 리스트를 반환하는 코루틴 함수
+        max_items (int, optional): 한 배치의 최대 항목 수. Defaults to 50.
+        max_bytes (int, optional): 한 배치의 최대 크기. Defaults to 120 * 1024.
+        max_delay (float, optional): 첫 항목이 들어온 뒤 배치를 보내기까지 기다리는 최대 시간(초). Defaults to 0.005.
+        size_func (Callable[[str], int], optional): 항목의 크기를 재는 함수. 기본값은 utf-8 바이트 수입니다. (예: 토큰 수 추정)
+    """
+
+    def __init__(self,
+                 flush_func: Callable[[List[str]], Awaitable[List[str]]],
+                 max_items=50,
+                 max_bytes=120 * 1024,
+                 max_delay=0.005,
+                 size_func: Optional[Callable[[str], int]] = None):
+        self.flush_func = flush_func
+        self.size_func = size_func
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.pending = []
+        self.pending_bytes = 0
+        self.timer = None
+        self.inflight = set()
+
+    async def submit(self, item: str) -> str:
+        """
+        항목 하나를 배치에 추가하고, 배치 요청이 끝나면 해당 항목의 결과를 반환합니다.
+
+        Args:
+            item (str): 배치에 추가할 항목
+
+        Returns:
+            str: 항목의 결과
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        size = self.size_func(item) if self.size_func is not None else len(item.encode('utf-8'))
+        if self.pending and self.pending_bytes + size > self.max_bytes:
+            self._flush()  # 이번 항목을 넣으면 크기 제한을 넘으므로 먼저 보냅니다.
+        self.pending.append((item, future))
+        self.pending_bytes += size
+        if len(self.pending) >= self.max_items:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending, self.pending_bytes = self.pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self.inflight.add(task)  # 태스크가 가비지 컬렉션되지 않도록 참조를 유지합니다.
+            task.add_done_callback(self.inflight.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await self.flush_func([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"batch size mismatch: sent {len(batch)}, received {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # 호출자가 이미 취소된 경우는 건너뜁니다.
+                future.set_result(result)
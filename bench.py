@@ -0,0 +1,340 @@
+# python
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import List, Optional
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+# 비동기
+import asyncio
+from aiohttp import web
+# jsonl 파일 핸들링
+import jsonlines
+# 유틸리티 함수
+from termcolor import colored
+import fire
+# framework
+from limiter import configure_limiter, estimate_tokens
+from metrics import metrics
+from retry import RetryPolicy
+
+
+class StubServer:
+    """
+    OpenAI chat completions (/v1/chat/completions) 와 DeepL translate (/v2/translate) 프로토콜을 흉내 내는 로컬 HTTP 서버입니다.
+    API 비용 없이 파이프라인의 처리량을 측정하기 위해 사용하며, 별도의 스레드와 이벤트 루프에서 실행됩니다.
+
+    응답 시간은 latency(중앙값, 초)와 sigma 를 따르는 로그 정규 분포에 completion 토큰 수 / tokens_per_sec 를 더한 값입니다.
+
+    Args:
+        latency (float, optional): 응답 시간의 중앙값(초). Defaults to 0.2.
+        sigma (float, optional): 로그 정규 분포의 표준편차. 클수록 꼬리 지연이 길어집니다. Defaults to 0.5.
+        tokens_per_sec (float, optional): completion 토큰 생성 속도. 0 이면 생성 시간을 더하지 않습니다. Defaults to 0.
+        error_rate (float, optional): 500 을 반환할 확률. Defaults to 0.
+        rate_limit_rate (float, optional): 429 를 반환할 확률. Defaults to 0.
+        seed (int, optional): 난수 시드. Defaults to 0.
+    """
+
+    def __init__(self, latency=0.2, sigma=0.5, tokens_per_sec=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency = latency
+        self.sigma = sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def start(self) -> str:
+        """서버를 시작하고 기본 URL(예: http://127.0.0.1:12345)을 반환합니다."""
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        app.router.add_post('/v2/translate', self.deepl_translate)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f'http://{host}:{port}'
+
+    async def _respond(self, completion_tokens: int):
+        """지연을 흉내 낸 뒤, 오류를 반환해야 하면 오류 응답을 반환합니다. streaming 응답은 completion_tokens 를 0 으로 넘깁니다."""
+        self.requests += 1
+        delay = self.random.lognormvariate(math.log(self.latency), self.sigma) if self.latency > 0 else 0
+        if self.tokens_per_sec:
+            delay += completion_tokens / self.tokens_per_sec
+        await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response({'error': {'message': 'Rate limit reached', 'type': 'rate_limit_exceeded'}}, status=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response({'error': {'message': 'Internal server error', 'type': 'server_error'}}, status=500)
+        return None
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt = '\n'.join(message['content'] for message in body['messages'])
+        content = 'stub: ' + body['messages'][-1]['content']
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        if body.get('stream'):
+            return await self._stream(request, body, content)
+        error = await self._respond(completion_tokens)
+        if error is not None:
+            return error
+        return web.json_response({
+            'id': f'chatcmpl-stub-{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    async def _stream(self, request: web.Request, body: dict, content: str) -> web.StreamResponse:
+        # latency 는 첫 토큰까지의 시간이 되고, 이후 토큰은 tokens_per_sec 속도로 server-sent events 로 보냅니다.
+        error = await self._respond(0)
+        if error is not None:
+            return error
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        words = content.split(' ')[:body.get('max_tokens') or None]
+        for i, word in enumerate(words):
+            chunk = {'id': f'chatcmpl-stub-{self.requests}', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': body.get('model', 'stub'),
+                     'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word}, 'finish_reason': None}]}
+            await response.write(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            if self.tokens_per_sec:
+                await asyncio.sleep(1 / self.tokens_per_sec)
+        await response.write(b'data: [DONE]\n\n')
+        return response
+
+    async def deepl_translate(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        texts = form.getall('text', [])
+        error = await self._respond(sum(estimate_tokens(text) for text in texts))
+        if error is not None:
+            return error
+        return web.json_response({'translations': [{'detected_source_language': 'EN', 'text': 'stub: ' + text} for text in texts]})
+
+
+# 벤치마크에 사용할 레코드 모양별 (번역할 필드, 평가 입력 필드, 평가 결과 키)
+SHAPES = {
+    'user_oriented': (('instruction', 'instances[].input'), 'instances[].input', 'output'),
+    'dolly': (('instruction', 'context'), 'context', 'response'),
+}
+
+# 벤치마크할 작업 -> (모듈, 클래스, 생성 옵션)
+TASKS = {
+    'deepl': ('deepl_', 'DeepL', {}),
+    'chatgpt': ('chatgpt', 'ChatGPT', {}),
+    'chatgpt_eval': ('chatgpt', 'ChatGPTEval', {}),
+    'chatgpt_eval_stream': ('chatgpt', 'ChatGPTEval', {'stream': True, 'max_output_tokens': 512}),
+}
+
+WORDS = ('the model data answer question write short long summary context people city because would about '
+         'which their first water after where great between through should language').split()
+
+
+def make_dataset(filepath: str, shape: str, size: int, seed=0):
+    """
+    벤치마크용 입력 파일을 만듭니다.
+    user_oriented 는 user_oriented_instructions.jsonl 을 size 개가 될 때까지 반복하고, dolly 는 dolly 와 비슷한 모양의 레코드를 생성합니다.
+    """
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+    with jsonlines.open(filepath, mode='w') as writer:
+        if shape == 'user_oriented':
+            with jsonlines.open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_oriented_instructions.jsonl')) as reader:
+                source = list(reader)
+            for idx in range(size):
+                obj = dict(source[idx % len(source)])
+                obj['id'] = f"{obj['id']}_{idx}"
+                writer.write(obj)
+        else:
+            for idx in range(size):
+                context = ' '.join(sentence(rng.randint(8, 30)) for _ in range(rng.choice([0, 0, 2, 5, 12])))
+                writer.write({'id': idx, 'instruction': sentence(rng.randint(5, 25)), 'context': context,
+                              'response': sentence(rng.randint(10, 60)), 'category': rng.choice(['open_qa', 'closed_qa', 'summarization'])})
+
+
+def _disable_client_retries(backend):
+    # langchain(openai) 클라이언트 자체의 재시도는 끄고, 파이프라인의 RetryPolicy 만 측정합니다.
+    for value in vars(backend).values():
+        for chain in value.values() if isinstance(value, dict) else [value]:  # 엔드포인트별 chain
+            llm = getattr(chain, 'llm', None)
+            if llm is not None and hasattr(llm, 'max_retries'):
+                llm.max_retries = 0
+
+
+def run_scenario(urls: List[str], task: str, shape: str, size: int, concurrency: int, workdir: str) -> dict:
+    """
+    새 프로세스에서 시나리오 하나를 실행하고 결과를 반환합니다. (peak RSS 를 시나리오별로 측정하기 위해 프로세스를 나눕니다)
+    stub 서버가 여러 개이면 서버마다 키 하나인 엔드포인트로 설정하며, 동시성은 엔드포인트마다 concurrency 입니다.
+    """
+    # 백엔드 모듈을 불러오기 전에 API 주소를 stub 서버로 바꿉니다.
+    url = urls[0]
+    os.environ.update(OPENAI_API_BASE=url + '/v1', OPENAI_API_KEY='stub', DEEPL_API_URL=url + '/v2/translate', DEEPL_API_KEY='stub')
+    import importlib
+    from fanout import translate_fields, evaluate_fields
+    from endpoints import configure_endpoints
+    # 처리량을 재기 위해 rpm/tpm 한도는 끄고, 동시성은 시나리오 값으로 고정합니다.
+    limits = dict(rpm=None, tpm=None, concurrency=concurrency, max_concurrency=concurrency)
+    for name in ('deepl:deepl', 'openai:gpt-3.5-turbo'):
+        configure_limiter(name, **limits)
+    if len(urls) > 1:
+        configure_endpoints('openai', [dict(name=f'stub{i}', api_key=f'stub{i}', api_base=u + '/v1', **limits) for i, u in enumerate(urls)])
+        configure_endpoints('deepl', [dict(name=f'stub{i}', api_key=f'stub{i}', url=u + '/v2/translate', **limits) for i, u in enumerate(urls)])
+
+    module, cls, options = TASKS[task]
+    backend = getattr(importlib.import_module(module), cls)(**options)
+    _disable_client_retries(backend)
+    translate_paths, input_path, output_key = SHAPES[shape]
+    if '_eval' in task:
+        func, run = evaluate_fields(input_path, output_key), backend.aeval_jsonl
+    else:
+        func, run = translate_fields(*translate_paths), backend.atranslate_jsonl
+
+    in_filepath = os.path.join(workdir, f'{shape}_{size}.jsonl')
+    if not os.path.exists(in_filepath):
+        make_dataset(in_filepath, shape, size)
+    out_filepath = os.path.join(workdir, f'{task}_{shape}_{size}_{concurrency}.jsonl')
+    latencies = []
+
+    async def timed(backend, obj):
+        start = time.perf_counter()
+        result = await func(backend, obj)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    asyncio.run(run(in_filepath, out_filepath, timed, max_concurrency=concurrency * len(urls), verbose=False, increment=False,
+                    retry_policy=RetryPolicy(base_delay=0.05, overload_delay=0.2, max_delay=2)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    ttft = metrics.histograms.get(('ttft_seconds', (('backend', backend.limiter.name),)))
+    return {
+        'task': task,
+        'shape': shape,
+        'size': size,
+        'concurrency': concurrency,
+        'endpoints': len(urls),
+        'records': len(latencies),
+        'seconds': round(elapsed, 3),
+        'records_per_sec': round(len(latencies) / elapsed, 2),
+        'p50': round(_percentile(latencies, 0.50), 4),
+        'p99': round(_percentile(latencies, 0.99), 4),
+        'ttft_p50': round(ttft.quantile(0.5), 4) if ttft else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(tasks='deepl,chatgpt,chatgpt_eval', shapes='user_oriented,dolly', sizes='250,2000', concurrency='16,64,256',
+         latency=0.2, sigma=0.5, tokens_per_sec=0.0, error_rate=0.0, rate_limit_rate=0.0,
+         endpoints=1, out='bench_results.json', baseline: Optional[str] = None, tolerance=0.15):
+    """
+    로컬 stub 서버를 띄우고, 작업 x 레코드 모양 x 데이터 크기 x 동시성 조합마다 처리량(records/sec), 레코드 지연(p50/p99), peak RSS 를 측정합니다.
+
+    예) python bench.py --tasks=chatgpt_eval --sizes=1000 --concurrency=64,256 --rate_limit_rate=0.02
+
+    Args:
+        tasks (str): 쉼표로 구분한 작업 이름 (deepl, chatgpt, chatgpt_eval, chatgpt_eval_stream)
+        shapes (str): 쉼표로 구분한 레코드 모양 (user_oriented, dolly)
+        sizes (str): 쉼표로 구분한 레코드 수
+        concurrency (str): 쉼표로 구분한 max_concurrency 값
+        latency, sigma, tokens_per_sec, error_rate, rate_limit_rate: StubServer 설정
+        endpoints (int): stub 서버(API 키) 수. 2 이상이면 요청을 엔드포인트 풀로 나누어 보내며, concurrency 는 키마다의 동시성입니다.
+        out (str): 결과를 저장할 json 파일 경로
+        baseline (str, optional): 비교할 이전 결과 json 파일. records/sec 가 tolerance 이상 떨어지면 실패로 종료합니다.
+        tolerance (float): 허용하는 처리량 감소 비율. Defaults to 0.15.
+    """
+    def split(value):
+        return [v for v in str(value).split(',') if v] if not isinstance(value, (tuple, list)) else list(value)
+
+    servers = [StubServer(latency=latency, sigma=sigma, tokens_per_sec=tokens_per_sec, error_rate=error_rate, rate_limit_rate=rate_limit_rate, seed=i)
+               for i in range(endpoints)]
+    urls = [server.start() for server in servers]
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    results = []
+    try:
+        for task, shape, size, conc in product(split(tasks), split(shapes), split(sizes), split(concurrency)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(run_scenario, urls, task, shape, int(size), int(conc), workdir).result()
+            results.append(result)
+            print(colored(f"{task:>12} {shape:>13} n={size:<6} c={conc:<4} {result['records_per_sec']:>9.1f} rec/s  "
+                          f"p50 {result['p50']:.3f}s  p99 {result['p99']:.3f}s  rss {result['peak_rss_mb']:.0f}MB", 'yellow'))
+    finally:
+        for server in servers:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'stub': {'latency': latency, 'sigma': sigma, 'tokens_per_sec': tokens_per_sec,
+                            'error_rate': error_rate, 'rate_limit_rate': rate_limit_rate},
+                   'results': results}, f, indent=2)
+
+    if baseline:
+        regressions = compare(baseline, results, tolerance)
+        if regressions:
+            raise SystemExit(1)
+
+
+def compare(baseline_filepath: str, results: List[dict], tolerance=0.15) -> List[dict]:
+    """이전 결과와 비교하여 records/sec 가 tolerance 이상 떨어진 시나리오를 출력하고 반환합니다."""
+    def key(r):
+        return r['task'], r['shape'], r['size'], r['concurrency'], r.get('endpoints', 1)
+
+    with open(baseline_filepath, encoding='utf-8') as f:
+        before = {key(r): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result['records_per_sec'] / old['records_per_sec'] if old['records_per_sec'] else 1.0
+        if ratio < 1 - tolerance:
+            regressions.append(result)
+            print(colored(f"regression {key(result)}: {old['records_per_sec']} -> {result['records_per_sec']} rec/s ({ratio:.0%})", 'red'))
+    return regressions
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,171 @@
+# python
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+# 비동기
+import asyncio
+# framework
+from translate import TranslateWrapper
+from eval import EvaluateWrapper
+from packing import PackedTranslate
+
+
+class TranslationCache:
+    """
+    번역/추론 결과를 저장하는 2단계 캐시입니다.
+    메모리의 LRU 캐시(max_items 개)를 먼저 확인하고, 없으면 SQLite 파일 캐시를 확인합니다.
+    SQLite 접근은 스레드에서 lock 을 잡고 실행하므로 여러 코루틴이 동시에 사용해도 안전합니다.
+
+    Args:
+        path (str, optional): SQLite 파일 경로. None 이면 메모리 캐시만 사용합니다.
+        max_items (int, optional): 메모리 캐시의 최대 항목 수. Defaults to 100000.
+
+    Attributes:
+        hits (int): 메모리 캐시 적중 수
+        disk_hits (int): SQLite 캐시 적중 수
+        misses (int): 캐시에 없어 API 를 호출한 수
+    """
+
+    def __init__(self, path: str = 'translation_cache.sqlite', max_items=100000):
+        self.memory = OrderedDict()
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        self.conn = None
+        if path is not None:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')  # 여러 프로세스가 동시에 읽고 쓸 수 있도록 합니다.
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(*parts, text: str) -> str:
+        """
+        (backend, model_name, template, target_lang, ...) 와 원문의 해시로 캐시 키를 만듭니다.
+
+        Args:
+            *parts: 캐시 키를 구분하는 값들
+            text (str): 원문
+
+        Returns:
+            str: sha256 캐시 키
+        """
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return hashlib.sha256(json.dumps([*parts, text_hash], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    async def get(self, key: str):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.conn is not None:
+            value = await asyncio.get_running_loop().run_in_executor(None, self._select, key)
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        self._remember(key, value)
+        if self.conn is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._insert, key, value)
+
+    def stats(self) -> dict:
+        """캐시 적중률 통계를 반환합니다."""
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / total if total else 0.0,
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)  # 가장 오래 사용하지 않은 항목을 제거합니다.
+
+    def _select(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _insert(self, key, value):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', (key, value))
+            self.conn.commit()
+
+
+class CachedTranslate(TranslateWrapper):
+    """
+    번역 객체를 감싸 (backend, model_name, template, target_lang, 원문) 기준으로 번역 결과를 캐시합니다.
+    packing 이 켜진 번역기(PackedTranslate)를 직접 감싸면, 실제로 묶어서 번역한 결과는 packed_template 으로 따로 저장합니다.
+    따로 번역한 결과는 packing 여부와 상관없이 같은 항목을 사용하며, packing 을 끈 번역기는 묶어서 번역한 결과를 받지 않습니다.
+
+    Args:
+        inner (Translate): 감쌀 번역 객체 (DeepL, ChatGPT, GPT4 등)
+        cache (TranslationCache, optional): 사용할 캐시. 여러 백엔드가 하나의 캐시를 공유할 수 있습니다.
+    """
+
+    def __init__(self, inner, cache: TranslationCache = None):
+        super().__init__(inner)
+        self.cache = cache if cache is not None else TranslationCache()
+
+    async def __call__(self, original_text, target_lang=None):
+        # original_text가 빈 문자열인 경우 바로 반환합니다.
+        if not original_text or original_text.strip() == "":
+            return original_text
+
+        key = self.cache.make_key('translate', self.backend, self.model_name, self.template, target_lang, text=original_text)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        # 감싼 객체가 묶어서 번역할 수 있으면, 실제로 사용한 방식에 따라 키를 정합니다.
+        if not (isinstance(self.inner, PackedTranslate) and self.inner.pack):
+            result = await super().__call__(original_text, target_lang)
+            await self.cache.put(key, result)
+            return result
+        packed_key = self.cache.make_key('translate', self.backend, self.model_name, self.inner.packed_template, target_lang, text=original_text)
+        cached = await self.cache.get(packed_key)
+        if cached is not None:
+            return cached
+        if target_lang is None:
+            result, packed = await self.inner.translate_with_mode(original_text)
+        else:
+            result, packed = await self.inner.translate_with_mode(original_text, target_lang)
+        await self.cache.put(packed_key if packed else key, result)
+        return result
+
+
+class CachedEvaluate(EvaluateWrapper):
+    """
+    추론 객체를 감싸 (backend, model_name, template, instruction, input) 기준으로 결과를 캐시합니다.
+
+    Args:
+        inner (Evaluate): 감쌀 추론 객체 (ChatGPTEval, GPT4Eval 등)
+        cache (TranslationCache, optional): 사용할 캐시
+    """
+
+    def __init__(self, inner, cache: TranslationCache = None):
+        super().__init__(inner)
+        self.cache = cache if cache is not None else TranslationCache()
+
+    async def __call__(self, instruction, input) -> str:
+        key = self.cache.make_key('eval', self.backend, self.model_name, self.template, instruction, text=input)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = await super().__call__(instruction, input)
+        await self.cache.put(key, result)
+        return result
@@ -0,0 +1,178 @@
+# python
+from typing import Dict, Tuple
+import os
+import json
+import re
+
+
+# 출력 파일의 줄에서 id 만 읽기 위한 패턴입니다. (json.dumps 의 기본 구분자 기준)
+# id 가 첫 번째 키이거나(대부분의 데이터셋) 마지막 키이면(Translate.append_id) 줄 전체를 파싱하지 않습니다.
+JSON_SCALAR = rb'(?:"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)'
+ID_FIRST = re.compile(rb'\{"id": (' + JSON_SCALAR + rb')[,}]')
+ID_LAST = re.compile(rb', "id": (' + JSON_SCALAR + rb')\}\s*$')
+
+
+def line_id(line: bytes):
+    """출력 파일의 한 줄에서 id 를 읽습니다. 패턴에 맞지 않으면 줄 전체를 파싱합니다."""
+    match = ID_FIRST.match(line) or ID_LAST.search(line[-256:])
+    if match is not None:
+        return json.loads(match.group(1))
+    return json.loads(line)['id']
+
+
+class Checkpoint:
+    """
+    출력 jsonl 파일 옆에 처리 완료된 id 와 바이트 위치를 기록하는 체크포인트(manifest)입니다.
+
+    manifest 의 각 줄은 "offset\\tlength\\tid" 형식이며, 출력 파일에 객체가 기록될 때마다 한 줄씩 추가됩니다.
+    재시작 시 manifest 만 읽으면 되므로 이전 출력 파일을 다시 파싱하지 않고도 처리된 id 집합을 얻을 수 있습니다.
+
+    Args:
+        out_filepath (str): 출력 jsonl 파일 경로
+        manifest_filepath (str, optional): manifest 파일 경로. 기본값은 out_filepath + '.ckpt'
+
+    Attributes:
+        offset (int): 지금까지 기록이 완료된 출력 파일의 바이트 길이
+    """
+
+    def __init__(self, out_filepath: str, manifest_filepath: str = None):
+        self.out_filepath = out_filepath
+        self.manifest_filepath = manifest_filepath or out_filepath + '.ckpt'
+        self.offset = 0
+        self.fp = None
+
+    def recover(self) -> set:
+        """
+        manifest 를 읽어 처리된 id 집합을 반환합니다.
+        기록 도중 중단되어 manifest 에 없는 출력 파일의 꼬리(잘린 마지막 줄 등)는 잘라냅니다.
+        manifest 가 없거나 출력 파일과 맞지 않으면 출력 파일을 한 번 훑어 manifest 를 다시 만듭니다.
+
+        Returns:
+            set: 이미 처리된 id 집합
+        """
+        out_size = os.path.getsize(self.out_filepath) if os.path.exists(self.out_filepath) else 0
+        done, end, valid = self._read_manifest()
+        if end > out_size or not self._verify_tail(done):  # manifest 가 출력 파일과 맞지 않으면 믿을 수 없으므로 다시 만듭니다.
+            done, end = self._rebuild()
+        else:
+            with open(self.manifest_filepath, 'r+b') as f:
+                f.truncate(valid)  # 잘린 manifest 꼬리 제거
+        if out_size > end:
+            with open(self.out_filepath, 'r+b') as f:
+                f.truncate(end)  # manifest 에 기록되지 않은 출력 꼬리 제거
+        self.offset = end
+        self.fp = open(self.manifest_filepath, 'a', encoding='utf-8')
+        return set(done)
+
+    def reset(self):
+        """출력 파일을 새로 쓰는 경우 manifest 도 비웁니다."""
+        self.offset = 0
+        self.fp = open(self.manifest_filepath, 'w', encoding='utf-8')
+
+    def add(self, obj_id, nbytes: int):
+        """
+        출력 파일에 nbytes 길이의 줄이 기록되었음을 manifest 에 추가합니다.
+        출력 파일에 쓰기가 끝난 뒤, 쓰기 순서대로 호출해야 합니다. 디스크에 반영하려면 flush() 를 호출합니다.
+
+        Args:
+            obj_id: 기록된 객체의 id
+            nbytes (int): 기록된 줄의 바이트 길이 (개행 포함)
+        """
+        self.fp.write(f"{self.offset}\t{nbytes}\t{json.dumps(obj_id, ensure_ascii=False)}\n")
+        self.offset += nbytes
+
+    def flush(self):
+        self.fp.flush()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def _read_manifest(self):
+        done, end, valid = {}, 0, 0  # id -> (offset, length)
+        if not os.path.exists(self.manifest_filepath):
+            return done, float('inf'), 0  # manifest 가 없으면 다시 만들도록 합니다.
+        with open(self.manifest_filepath, 'rb') as f:
+            lines = f.read().split(b'\n')
+        for line in lines[:-1]:  # 마지막 조각은 개행이 없는(잘린) 줄이거나 빈 문자열입니다.
+            try:
+                offset, nbytes, obj_id = line.decode('utf-8').split('\t', 2)
+                offset, nbytes, obj_id = int(offset), int(nbytes), json.loads(obj_id)
+            except ValueError:
+                break
+            if offset < end:
+                break
+            done[obj_id] = (offset, nbytes)
+            end = offset + nbytes
+            valid += len(line) + 1
+        return done, end, valid
+
+    def _verify_tail(self, index: dict) -> bool:
+        # manifest 의 마지막 줄이 출력 파일의 같은 위치에 있는 줄과 맞는지 확인합니다. (출력 파일을 다시 쓴 뒤 남은 manifest 를 걸러냅니다)
+        if not index:
+            return True
+        obj_id, (offset, nbytes) = next(reversed(index.items()))
+        if not os.path.exists(self.out_filepath):
+            return False
+        with open(self.out_filepath, 'rb') as f:
+            f.seek(max(offset - 1, 0))
+            data = f.read(nbytes + (1 if offset else 0))
+        line = data[1:] if offset else data
+        if (offset and data[:1] != b'\n') or len(line) != nbytes or not line.endswith(b'\n'):
+            return False
+        try:
+            return line_id(line) == obj_id
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def _scan(self):
+        # 출력 파일을 훑어 (id, offset, length) 를 순서대로 반환합니다.
+        if not os.path.exists(self.out_filepath):
+            return
+        end = 0
+        with open(self.out_filepath, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 개행이 없는 마지막 줄은 기록 도중 중단된 줄입니다.
+                if not line.strip():
+                    end += len(line)  # 빈 줄은 건너뜁니다.
+                    continue
+                try:
+                    obj_id = line_id(line)
+                except (ValueError, KeyError, TypeError):
+                    break
+                yield obj_id, end, len(line)
+                end += len(line)
+
+    def _rebuild(self):
+        done, end = {}, 0
+        with open(self.manifest_filepath, 'w', encoding='utf-8') as manifest:
+            for obj_id, offset, nbytes in self._scan():
+                manifest.write(f"{offset}\t{nbytes}\t{json.dumps(obj_id, ensure_ascii=False)}\n")
+                done[obj_id] = (offset, nbytes)
+                end = offset + nbytes
+        return done, end
+
+
+def read_index(out_filepath: str, write_manifest=True) -> Dict[object, Tuple[int, int]]:
+    """
+    출력 파일의 manifest 를 id -> (offset, length) 색인으로 읽습니다. 출력 파일을 수정하지 않습니다.
+    manifest 가 없거나 출력 파일과 맞지 않으면 출력 파일을 한 번 훑어 manifest 를 다시 만들고, 다음부터는 그대로 재사용합니다.
+    기록 중인 파일이면 manifest 에 기록된 부분까지만 색인합니다.
+
+    Args:
+        out_filepath (str): 출력 jsonl 파일 경로
+        write_manifest (bool, optional): False 이면 manifest 를 다시 만들어야 할 때 파일에 쓰지 않고 메모리에서만 색인합니다.
+            (뷰어 등 읽기만 하는 쪽에서 사용합니다) Defaults to True.
+
+    Returns:
+        Dict[object, Tuple[int, int]]: 파일 순서대로 정렬된 id -> (offset, length)
+    """
+    checkpoint = Checkpoint(out_filepath)
+    index, end, _ = checkpoint._read_manifest()
+    if end > os.path.getsize(out_filepath) or not checkpoint._verify_tail(index):
+        if not write_manifest:
+            return {obj_id: (offset, nbytes) for obj_id, offset, nbytes in checkpoint._scan()}
+        index, _ = checkpoint._rebuild()
+    return index
@@ -0,0 +1,91 @@
+# python
+from typing import Callable, List, Tuple
+import re
+# 비동기
+import asyncio
+# framework
+from translate import TranslateWrapper
+from segment import split_sentences, WORD
+from limiter import estimate_tokens
+from metrics import metrics
+
+
+# 긴 텍스트를 나누는 경계. 앞의 경계부터(문단, 줄, 문장, 단어 순서로) 시도합니다.
+PARAGRAPH_BREAK = re.compile(r'([ \t]*\n[ \t]*\n\s*)')
+LINE_BREAK = re.compile(r'([ \t]*\n[ \t]*)')
+WORD_BREAK = re.compile(r'(\s+)')
+LEVELS = [PARAGRAPH_BREAK.split, LINE_BREAK.split, split_sentences, WORD_BREAK.split]
+
+# 조각 크기를 재는 단위
+SIZE_FUNCS = {
+    'tokens': estimate_tokens,
+    'bytes': lambda text: len(text.encode('utf-8')),
+}
+
+
+def split_chunks(text: str, max_size: int, size_func: Callable[[str], int] = estimate_tokens, level=0) -> List[Tuple[str, bool]]:
+    """
+    text 를 max_size 이하의 조각들로 나눕니다. 문단 경계에서 먼저 나누고, 그래도 큰 문단은 줄, 문장, 단어 경계에서 나눕니다.
+    이웃한 작은 문단(줄, 문장)은 max_size 를 넘지 않는 만큼 한 조각으로 합치므로 번역기가 문맥을 최대한 볼 수 있습니다.
+
+    Args:
+        text (str): 나눌 텍스트
+        max_size (int): 조각의 최대 크기
+        size_func (Callable[[str], int], optional): 크기를 재는 함수. Defaults to estimate_tokens.
+
+    Returns:
+        List[Tuple[str, bool]]: (조각, 번역 여부) 리스트. 경계의 공백/줄바꿈은 번역하지 않는 조각이며, 조각을 모두 이으면 text 와 같습니다.
+    """
+    if size_func(text) <= max_size or level == len(LEVELS):
+        return [(text, True)]
+    parts = LEVELS[level](text)  # (텍스트, 경계, 텍스트, ...) 순서입니다.
+    chunks, current, sep = [], '', ''
+    for i in range(0, len(parts), 2):
+        part = parts[i]
+        if current and size_func(current + sep + part) <= max_size:
+            current += sep + part
+        else:
+            if current:
+                chunks.append((current, True))
+            chunks.append((sep, False))
+            current = ''
+            if size_func(part) > max_size:
+                chunks += split_chunks(part, max_size, size_func, level + 1)
+            else:
+                current = part
+        sep = parts[i + 1] if i + 1 < len(parts) else ''
+    if current:
+        chunks.append((current, True))
+    chunks.append((sep, False))
+    return [(piece, translate and WORD.search(piece) is not None) for piece, translate in chunks if piece]
+
+
+class ChunkedTranslate(TranslateWrapper):
+    """
+    번역 객체를 감싸 max_chunk_size 를 넘는 긴 텍스트를 문단/문장 경계에서 나누고, 조각들을 동시에 번역하여 순서대로 이어 붙입니다.
+    API 의 크기/토큰 한도를 넘지 않고, 긴 문서의 지연 시간이 가장 큰 조각의 번역 시간 정도로 줄어듭니다.
+    max_chunk_size 이하의 텍스트는 나누지 않고 그대로 번역합니다.
+
+    Args:
+        inner (Translate): 감쌀 번역 객체
+        max_chunk_size (int, optional): 조각의 최대 크기. Defaults to 1000.
+        unit (str, optional): 크기 단위. 'tokens' (추정 토큰 수) 또는 'bytes' (utf-8 바이트 수). Defaults to 'tokens'.
+    """
+
+    def __init__(self, inner, max_chunk_size=1000, unit='tokens'):
+        super().__init__(inner)
+        self.max_chunk_size = max_chunk_size
+        self.size_func = SIZE_FUNCS[unit]
+
+    async def __call__(self, original_text, target_lang=None):
+        # original_text가 빈 문자열인 경우 바로 반환합니다.
+        if not original_text or original_text.strip() == "":
+            return original_text
+        chunks = split_chunks(original_text, self.max_chunk_size, self.size_func)
+        if len(chunks) == 1:
+            return await super().__call__(original_text, target_lang)
+        metrics.inc('chunked_texts_total', backend=self.backend)
+        metrics.inc('chunks_total', sum(translate for _, translate in chunks), backend=self.backend)
+        translated = await asyncio.gather(*[super(ChunkedTranslate, self).__call__(piece, target_lang) for piece, translate in chunks if translate])
+        translated = iter(translated)
+        return ''.join(next(translated) if translate else piece for piece, translate in chunks)
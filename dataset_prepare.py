@@ -1,29 +1,47 @@
-import asyncio
 from deepl_ import DeepL
 from chatgpt import ChatGPT
 from gpt4 import GPT4 # 번역 모델을 사용하기 위한 라이브러리
+from cache import TranslationCache, CachedTranslate
+from segment import SegmentedTranslate
+from chunking import ChunkedTranslate
+from fanout import translate_fields
+from jobs import Job, run_jobs
 
-# instruction 및 instances 안에 있는 내용들을 번역하는 함수 
-async def translate_func(translator, obj):
-    obj['instruction'] = await translator(obj['instruction']) # instruction 번역
-    # instances에 있는 input과 output을 번역 후 dict로 저장하여 리스트로 만듦
-    obj['instances'] = [{'input': await translator(instance['input']), 'output': instance['output']} for instance in obj['instances']]
-    return obj # 번역된 결과 반환
-
-# DeepL 번역을 사용하여 user_oriented_instructions.jsonl 파일의 내용을 한국어로 번역한 후, user_oriented_instructions_deepl_ko.jsonl 파일에 저장
-asyncio.run(DeepL().atranslate_jsonl(in_filepath='user_oriented_instructions.jsonl',
-                    out_filepath='user_oriented_instructions_deepl_ko.jsonl',
-                    translate_func=translate_func,
-                    max_concurrency=100))
-
-# ChatGPT 번역을 사용하여 user_oriented_instructions.jsonl 파일의 내용을 한국어로 번역한 후, user_oriented_instructions_chatgpt_ko.jsonl 파일에 저장
-asyncio.run(ChatGPT().atranslate_jsonl(in_filepath='user_oriented_instructions.jsonl',
-                    out_filepath='user_oriented_instructions_chatgpt_ko.jsonl',
-                    translate_func=translate_func,
-                    max_concurrency=100))
-
-# GPT4 번역을 사용하여 user_oriented_instructions.jsonl 파일의 내용을 한국어로 번역한 후, user_oriented_instructions_gpt4_ko.jsonl 파일에 저장
-asyncio.run(GPT4().atranslate_jsonl(in_filepath='user_oriented_instructions.jsonl',
-                    out_filepath='user_oriented_instructions_gpt4_ko.jsonl',
-                    translate_func=translate_func,
-                    max_concurrency=50))
\ No newline at end of file
+# 동시에 처리할 레코드 수의 상한입니다. 실제 동시 요청 수는 백엔드별 AdaptiveLimiter 가 한도에 맞춰 조절합니다.
+MAX_WORKERS = 256
+
+# 번역할 원본 파일
+IN_FILEPATH = 'user_oriented_instructions.jsonl'
+
+# 번역기 이름과 번역기 클래스
+TRANSLATORS = {
+    'deepl': DeepL,
+    'chatgpt': ChatGPT,
+    'gpt4': GPT4,
+}
+
+# instruction 및 instances 안에 있는 input 들을 동시에 번역하는 함수
+translate_func = translate_fields('instruction', 'instances[].input')
+
+
+def translate_jobs(cache: TranslationCache) -> list:
+    """
+    user_oriented_instructions.jsonl 파일을 각 번역기로 한국어로 번역하여 user_oriented_instructions_<번역기>_ko.jsonl 파일에 저장하는 작업 목록을 만듭니다.
+    세 번역기는 서로 다른 API 한도를 사용하므로 동시에 실행합니다.
+    텍스트는 조각으로 나누어 반복되는 조각을 한 번만 번역하며, LLM 번역기는 문맥을 유지하도록 문장이 아닌 줄 단위로 나눕니다.
+    그래도 긴 조각은 문장 경계에서 나누어 동시에 번역합니다.
+    """
+    return [Job(f'translate_{name}', SegmentedTranslate(ChunkedTranslate(CachedTranslate(translator(), cache)), sentences=name == 'deepl'),
+                in_filepath=IN_FILEPATH,
+                out_filepath=f'user_oriented_instructions_{name}_ko.jsonl',
+                func=translate_func,
+                max_concurrency=MAX_WORKERS)
+            for name, translator in TRANSLATORS.items()]
+
+
+if __name__ == '__main__':
+    # 세 번역기가 공유하는 번역 캐시. 다시 실행하면 이미 번역한 문자열은 API 를 호출하지 않습니다.
+    cache = TranslationCache('translation_cache.sqlite')
+    run_jobs(translate_jobs(cache))
+    print(cache.stats())
+    cache.close()
@@ -1,10 +1,17 @@
 # python
 import os
 from enum import Enum
-# DeepL 라이브러리를 이용하여 번역
-import deepl
+from functools import partial
+from typing import List
 # framework
 from translate import Translate
+from batching import MicroBatcher
+from endpoints import get_pool
+from httppool import get_session
+from metrics import metrics
+
+
+DEEPL_API_URL = os.getenv("DEEPL_API_URL", "https://api.deepl.com/v2/translate")
 
 
 class TargetLang(Enum):
@@ -39,11 +46,40 @@ class TargetLang(Enum):
     Korean = 'KO'
 
 
+def to_target_lang(target_lang) -> TargetLang:
+    """TargetLang, 언어 코드('KO', 'en-us') 또는 이름('Korean')을 TargetLang 으로 바꿉니다."""
+    if isinstance(target_lang, TargetLang):
+        return target_lang
+    try:
+        return TargetLang(target_lang.upper())
+    except ValueError:
+        if target_lang in TargetLang.__members__:
+            return TargetLang[target_lang]
+        raise ValueError(f"unsupported DeepL target language: {target_lang!r}")
+
+
 # deepl 번역
 class DeepL(Translate):
-    def __init__(self):
-        # DeepL API Key를 가져와 비동기 Translator 객체를 생성합니다.
-        self.translator = deepl.Translator(deepl.AiohttpAdapter(os.getenv("DEEPL_API_KEY"), pro=True))
+    def __init__(self, batch=True, max_batch_texts=50, max_batch_bytes=120 * 1024, batch_delay=0.005):
+        """
+        Args:
+          batch (bool): 동시에 들어온 번역 요청을 모아 한 번의 API 요청으로 보낼지 여부 (default: True)
+          max_batch_texts (int): 한 요청에 담을 최대 문자열 수. DeepL API 의 제한은 50개입니다. (default: 50)
+          max_batch_bytes (int): 한 요청에 담을 최대 바이트 수. DeepL API 의 제한은 128KiB 입니다. (default: 120KiB)
+          batch_delay (float): 배치를 모으기 위해 기다리는 최대 시간(초) (default: 0.005)
+        """
+        # DeepL API Key. 요청은 모든 백엔드가 함께 쓰는 연결 풀(httppool.get_session)로 보냅니다.
+        self.api_key = os.getenv("DEEPL_API_KEY")
+        # 배치 번역 설정
+        self.batch = batch
+        self.batch_options = dict(max_items=max_batch_texts, max_bytes=max_batch_bytes, max_delay=batch_delay)
+        self.batchers = {}  # target_lang 별 MicroBatcher
+        # 캐시 키 등에 사용하는 백엔드 정보
+        self.backend = 'deepl'
+        self.model_name = 'deepl'
+        self.template = ''
+        # 모든 DeepL 객체가 공유하는 엔드포인트(API 키) 풀. 엔드포인트 설정(api_key, url)이 없으면 DEEPL_API_KEY 를 사용합니다.
+        self.limiter = get_pool(f'{self.backend}:{self.model_name}')
 
     async def __call__(self, original_text: str, target_lang: str = 'KO') -> str:
         """
@@ -51,7 +87,7 @@ class DeepL(Translate):
 
         Args:
           original_text (str): 번역할 텍스트
-          target_lang (str): 번역될 언어 코드 (default: 'KO')
+          target_lang (str): 번역될 언어 코드 또는 TargetLang 의 이름 (default: 'KO')
 
         Returns:
           str: 번역된 텍스트
@@ -59,10 +95,41 @@ class DeepL(Translate):
         # original_text가 빈 문자열인 경우 바로 반환합니다.
         if not original_text or original_text.strip() == "":
             return original_text
+        target_lang = to_target_lang(target_lang)
+
+        # 배치 모드에서는 동시에 들어온 요청들과 함께 한 번의 API 요청으로 번역합니다.
+        if self.batch:
+            if target_lang not in self.batchers:
+                self.batchers[target_lang] = MicroBatcher(partial(self.translate_batch, target_lang=target_lang), **self.batch_options)
+            return await self.batchers[target_lang].submit(original_text)
+
+        # 배치 모드가 아니면 문자열 하나를 한 번의 API 요청으로 번역합니다.
+        return (await self.translate_batch([original_text], target_lang))[0]
+
+    async def translate_batch(self, texts: List[str], target_lang: str = 'KO') -> List[str]:
+        """
+        여러 문자열을 한 번의 DeepL API 요청으로 번역하는 함수입니다.
+
+        Args:
+          texts (List[str]): 번역할 텍스트 리스트
+          target_lang (str): 번역될 언어 코드 (default: 'KO')
+
+        Returns:
+          List[str]: texts 와 같은 순서의 번역된 텍스트 리스트
+        """
+        async with self.limiter.slot() as endpoint:
+            return await self.request(endpoint, texts, target_lang)
+
+    async def request(self, endpoint, texts: List[str], target_lang: str) -> List[str]:
+        """엔드포인트의 키(api_key)와 주소(url)로 DeepL API 요청을 보냅니다. 설정되지 않은 값은 DEEPL_API_KEY, DEEPL_API_URL 을 사용합니다."""
+        data = [('text', text) for text in texts] + [('target_lang', to_target_lang(target_lang).value)]
+        headers = {'Authorization': f"DeepL-Auth-Key {endpoint.params.get('api_key', self.api_key)}"}
+        async with get_session().post(endpoint.params.get('url', DEEPL_API_URL), data=data, headers=headers) as resp:
+            resp.raise_for_status()
+            body = await resp.json()
+        metrics.inc('characters_total', sum(len(text) for text in texts), backend=self.limiter.name)  # DeepL 은 글자 수로 과금합니다.
+        return [translation['text'] for translation in body['translations']]
 
-        # DeepL 라이브러리의 translate_text 메소드를 사용하여 번역한 후, 결과를 반환합니다.
-        return await self.translator.translate(original_text, target_lang=TargetLang.Korean)
-    
 
 if __name__ == '__main__':
     text = 'hello world!'
@@ -1,25 +1,32 @@
-import asyncio
 from deepl_ import DeepL
 from gpt4 import GPT4Eval
+from cache import TranslationCache, CachedTranslate
+from segment import SegmentedTranslate
+from fanout import translate_fields, evaluate_fields
+from jobs import Job, run_jobs
 
-# instruction 및 instances 안에 있는 내용들을 번역하는 함수 
-async def translate_func(translate, obj):
-    obj['instruction'] = await translate(obj['instruction']) # instruction 번역
-    obj['context'] = await translate(obj['context']) # instruction 번역
-    return obj # 번역된 결과 반환
+# 동시에 처리할 레코드 수의 상한입니다. 실제 동시 요청 수는 백엔드별 AdaptiveLimiter 가 한도에 맞춰 조절합니다.
+MAX_WORKERS = 256
 
-async def arun(self, obj: dict) -> dict:
-    obj['response'] = await self.__call__(obj['instruction'], obj['context'])
-    return obj
+# instruction 과 context 를 동시에 번역하는 함수
+translate_func = translate_fields('instruction', 'context')
 
-# DeepL 번역을 사용하여 instruction을 한국어로 번역
-asyncio.run(DeepL().atranslate_jsonl(in_filepath='databricks-dolly-15k.jsonl',
-                    out_filepath='databricks-dolly-15k_deepl_ko.jsonl',
-                    translate_func=translate_func,
-                    max_concurrency=100))
+# instruction 과 context 로 response 를 생성하는 함수
+arun = evaluate_fields('context', 'response')
 
-# GPT4 API를 사용하여 output을 생성
-asyncio.run(GPT4Eval().aeval_jsonl(in_filepath='databricks-dolly-15k_deepl_ko.jsonl',
-                    out_filepath='databricks-dolly-15k_deepl+gpt4_ko.jsonl',
-                    run_func=arun,
-                    max_concurrency=50))
\ No newline at end of file
+run_jobs([
+    # DeepL 번역을 사용하여 instruction을 한국어로 번역
+    # context 는 문장 단위로 나누어, 레코드마다 반복되는 문장은 캐시로 한 번만 번역합니다.
+    Job('translate', SegmentedTranslate(CachedTranslate(DeepL(), TranslationCache('translation_cache.sqlite'))),
+        in_filepath='databricks-dolly-15k.jsonl',
+        out_filepath='databricks-dolly-15k_deepl_ko.jsonl',
+        func=translate_func,
+        max_concurrency=MAX_WORKERS),
+    # GPT4 API를 사용하여 output을 생성 (번역이 끝난 레코드부터 바로 처리)
+    Job('generate', GPT4Eval(),
+        in_filepath='databricks-dolly-15k_deepl_ko.jsonl',
+        out_filepath='databricks-dolly-15k_deepl+gpt4_ko.jsonl',
+        func=arun,
+        after='translate',
+        max_concurrency=MAX_WORKERS),
+])
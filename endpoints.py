@@ -0,0 +1,200 @@
+# python
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import json
+import os
+import random
+import time
+# 유틸리티 함수
+from termcolor import colored
+try:
+    from langchain.chains import LLMChain
+    from langchain.chat_models import ChatOpenAI
+except ImportError:  # DeepL 만 사용하는 경우
+    LLMChain = ChatOpenAI = None
+# framework
+from limiter import DEFAULT_LIMITS, get_limiter, configure_limiter, limiters, is_overload_error
+from metrics import metrics
+
+
+# 백엔드별 엔드포인트 설정. configure_endpoints 또는 환경변수(OPENAI_ENDPOINTS, DEEPL_ENDPOINTS)로 지정합니다.
+ENDPOINTS = {}
+
+# 엔드포인트 설정 중 요청 파라미터가 아닌 키
+POOL_KEYS = {'name', 'weight', 'models', 'rpm', 'tpm', 'concurrency', 'min_concurrency', 'max_concurrency'}
+LIMIT_KEYS = {'rpm', 'tpm', 'concurrency', 'min_concurrency', 'max_concurrency'}
+
+
+def is_server_error(e: BaseException) -> bool:
+    """예외가 서버 오류(5xx)에 의한 것인지 판단합니다."""
+    status = getattr(e, 'status', None) or getattr(e, 'http_status', None)
+    return isinstance(status, int) and status >= 500
+
+
+class Endpoint:
+    """
+    API 키 하나(또는 Azure 배포 하나)에 해당하는 엔드포인트입니다. 엔드포인트마다 제한기를 따로 가지므로 키별 한도를 지킵니다.
+
+    Args:
+        name (str): 엔드포인트 이름
+        limiter (AdaptiveLimiter): 이 엔드포인트의 제한기
+        params (dict): 요청에 덧붙일 파라미터 (OpenAI: api_key, api_base, api_type, api_version, deployment_id 등 / DeepL: api_key, url)
+        weight (float, optional): 가중치. 가중치가 2 이면 1 인 엔드포인트보다 두 배의 요청을 받습니다. Defaults to 1.
+    """
+
+    def __init__(self, name: str, limiter, params: dict, weight: float = 1.0):
+        self.name = name
+        self.limiter = limiter
+        self.params = params
+        self.weight = weight
+        self.active = 0  # 이 엔드포인트에 배정되어 아직 끝나지 않은 요청 수
+        self.failures = 0  # 연속으로 실패한 횟수
+        self.ejected_until = 0.0
+
+
+class EndpointPool:
+    """
+    같은 백엔드/모델의 여러 엔드포인트에 요청을 나누어 보내는 클래스입니다. AdaptiveLimiter 와 같은 방법(slot)으로 사용합니다.
+    요청마다 건강한 엔드포인트 중 (진행 중인 요청 수 / 가중치)가 가장 작은 곳을 고르고,
+    한도 초과(429)나 서버 오류(5xx)를 돌려준 엔드포인트는 잠시 제외합니다. (연속으로 실패하면 제외 시간이 두 배씩 늘어납니다)
+
+    Args:
+        name (str): 백엔드 이름 (예: 'openai:gpt-4'). 지표 라벨로 사용합니다.
+        endpoints (List[Endpoint]): 엔드포인트 목록
+        eject_seconds (float, optional): 처음 제외하는 시간(초). Defaults to 10.
+        max_eject_seconds (float, optional): 최대 제외 시간(초). Defaults to 300.
+    """
+
+    def __init__(self, name: str, endpoints: List[Endpoint], eject_seconds=10.0, max_eject_seconds=300.0):
+        self.name = name
+        self.endpoints = endpoints
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+
+    @property
+    def inflight(self) -> int:
+        return sum(endpoint.limiter.inflight for endpoint in self.endpoints)
+
+    @property
+    def limit(self) -> int:
+        return sum(int(endpoint.limiter.limit) for endpoint in self.endpoints if endpoint.ejected_until <= time.monotonic())
+
+    def choose(self) -> Endpoint:
+        """요청을 보낼 엔드포인트를 고릅니다. 모든 엔드포인트가 제외되어 있으면 가장 먼저 돌아올 엔드포인트를 고릅니다."""
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.ejected_until <= now]
+        if not healthy:
+            return min(self.endpoints, key=lambda endpoint: endpoint.ejected_until)
+        return min(healthy, key=lambda endpoint: ((endpoint.active + 1) / endpoint.weight, random.random()))
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """
+        엔드포인트를 골라 그 제한기의 자리를 얻는 비동기 context manager 입니다. 고른 Endpoint 를 반환합니다.
+
+        예) async with self.limiter.slot(tokens) as endpoint: ... endpoint.params ...
+
+        Args:
+            tokens (int, optional): 요청의 추정 토큰 수 (prompt + completion)
+        """
+        endpoint = self.choose()
+        endpoint.active += 1
+        try:
+            async with endpoint.limiter.slot(tokens):
+                yield endpoint
+        except Exception as e:
+            if is_overload_error(e) or is_server_error(e):
+                self.eject(endpoint, e)
+            raise
+        else:
+            endpoint.failures = 0
+            metrics.inc('endpoint_requests_total', backend=self.name, endpoint=endpoint.name)
+        finally:
+            endpoint.active -= 1
+
+    def eject(self, endpoint: Endpoint, e: BaseException):
+        """엔드포인트를 잠시 제외합니다. 엔드포인트가 하나뿐이면 제한기의 동시성 조절에 맡깁니다."""
+        now = time.monotonic()
+        if len(self.endpoints) == 1 or endpoint.ejected_until > now:
+            return  # 이미 제외된 엔드포인트에 보냈던 요청들의 실패는 한 번만 셉니다.
+        endpoint.failures += 1
+        seconds = min(self.max_eject_seconds, self.eject_seconds * 2 ** (endpoint.failures - 1))
+        endpoint.ejected_until = now + seconds
+        metrics.inc('endpoint_ejections_total', backend=self.name, endpoint=endpoint.name)
+        print(colored(f"[{self.name}] endpoint {endpoint.name} ejected for {seconds:.0f}s ({type(e).__name__})", 'red'))
+
+
+def configure_endpoints(backend: str, endpoints: List[dict]):
+    """
+    백엔드('openai', 'deepl')가 사용할 엔드포인트 목록을 설정합니다. 백엔드 객체를 만들기 전에 호출해야 합니다.
+
+    예) configure_endpoints('openai', [
+            {'name': 'key1', 'api_key': 'sk-...', 'weight': 2, 'rpm': 3500, 'tpm': 90000},
+            {'name': 'azure', 'api_key': '...', 'api_base': 'https://x.openai.azure.com', 'api_type': 'azure',
+             'api_version': '2023-05-15', 'deployment_id': 'gpt-4', 'models': ['gpt-4']},
+        ])
+
+    Args:
+        backend (str): 백엔드 이름
+        endpoints (List[dict]): 엔드포인트 설정 목록. name, weight, models(사용할 모델 이름 목록), rpm, tpm, concurrency 외의 키는 요청 파라미터로 전달됩니다.
+    """
+    ENDPOINTS[backend] = endpoints
+    for name in [name for name in pools if name.split(':', 1)[0] == backend]:
+        del pools[name]
+
+
+def load_endpoints(backend: str) -> Optional[List[dict]]:
+    """
+    configure_endpoints 로 설정한 목록, 또는 환경변수 <BACKEND>_ENDPOINTS (JSON 배열 또는 JSON 파일 경로) 를 읽습니다. 없으면 None 을 반환합니다.
+    """
+    if backend in ENDPOINTS:
+        return ENDPOINTS[backend]
+    value = os.getenv(f'{backend.upper()}_ENDPOINTS')
+    if not value:
+        return None
+    if not value.lstrip().startswith('['):
+        with open(value, encoding='utf-8') as f:
+            value = f.read()
+    return json.loads(value)
+
+
+# 프로세스 전체에서 공유하는 백엔드/모델별 엔드포인트 풀
+pools = {}
+
+
+def get_pool(name: str) -> EndpointPool:
+    """
+    이름(예: 'openai:gpt-4')에 해당하는 엔드포인트 풀을 반환합니다. 없으면 새로 만듭니다.
+    엔드포인트 설정이 없으면 환경변수의 키를 사용하는 엔드포인트 하나와 get_limiter(name) 제한기로 풀을 만들므로, 기존과 같이 동작합니다.
+    """
+    pool = pools.get(name)
+    if pool is not None and all(limiters.get(endpoint.limiter.name) is endpoint.limiter for endpoint in pool.endpoints):
+        return pool
+    backend, _, model_name = name.partition(':')
+    configs = [config for config in load_endpoints(backend) or [] if model_name in config.get('models', [model_name])]
+    if not configs:
+        endpoints = [Endpoint('default', get_limiter(name), {})]
+    else:
+        endpoints = []
+        for idx, config in enumerate(configs):
+            endpoint_name = config.get('name', str(idx))
+            limiter_name = f'{name}@{endpoint_name}'
+            limiter = limiters.get(limiter_name)
+            if limiter is None:
+                # 엔드포인트(키)마다 백엔드 기본 한도를 따로 가집니다.
+                limits = {**DEFAULT_LIMITS.get(name, {}), **{k: v for k, v in config.items() if k in LIMIT_KEYS}}
+                limiter = configure_limiter(limiter_name, **limits)
+            params = {k: v for k, v in config.items() if k not in POOL_KEYS}
+            endpoints.append(Endpoint(endpoint_name, limiter, params, weight=config.get('weight', 1.0)))
+    pools[name] = EndpointPool(name, endpoints)
+    return pools[name]
+
+
+def chat_models(pool: EndpointPool, model_name: str, **options) -> Dict[str, 'ChatOpenAI']:
+    """풀의 엔드포인트마다 ChatOpenAI 객체를 만듭니다. 엔드포인트의 파라미터(api_key 등)는 요청마다 openai 라이브러리에 전달됩니다."""
+    return {endpoint.name: ChatOpenAI(model_name=model_name, model_kwargs=dict(endpoint.params), **options) for endpoint in pool.endpoints}
+
+
+def chains(chats: Dict[str, 'ChatOpenAI'], prompt) -> Dict[str, 'LLMChain']:
+    """엔드포인트별 ChatOpenAI 객체로 같은 프롬프트의 LLMChain 들을 만듭니다."""
+    return {name: LLMChain(llm=chat, prompt=prompt) for name, chat in chats.items()}
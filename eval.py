@@ -1,17 +1,14 @@
 # python
 from abc import ABC
-from typing import Callable
-import os
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator
 from functools import partial
 # 비동기
 import asyncio
-from tqdm.asyncio import tqdm_asyncio
-# jsonl 파일 핸들링
-import jsonlines
-from aiofile import async_open
-import json
-# 유틸리티 함수
-from termcolor import colored
+# framework
+from pipeline import arun_jsonl
+from background import get_loop
+from planner import Planner, report
 
 
 class Evaluate(ABC):
@@ -22,12 +19,26 @@ class Evaluate(ABC):
         pass
     
 
+    def submit(self, instruction, input) -> Future:
+        """백그라운드 이벤트 루프에서 추론을 시작하고 concurrent.futures.Future 를 바로 반환합니다. 여러 스레드에서 동시에 호출할 수 있습니다."""
+        return get_loop().submit(self.__call__(instruction, input))
+
+    def map(self, instructions: Iterable[str], inputs: Iterable[str], max_concurrency=256) -> Iterator[str]:
+        """(instruction, input) 쌍들을 동시에 추론하고, 결과를 입력 순서대로 돌려주는 동기 메소드입니다."""
+        return get_loop().map(self.__call__, instructions, inputs, max_concurrency=max_concurrency)
+
     def run(self, obj: dict) -> dict:
+        """
+        객체 하나를 추론하는 동기 메소드입니다. instances 가 있으면 모든 instance 를 동시에 추론하여 output 에 저장하고 obj 를 반환하며,
+        없으면 추론 결과 문자열을 반환합니다.
+        """
         if 'instances' in obj.keys():
-            for idx, instance in enumerate(obj['instances']):
-                obj['instances'][idx]['output'] = asyncio.run(self.__call__(obj['instruction'], instance['input']))
+            outputs = self.map([obj['instruction']] * len(obj['instances']), [instance['input'] for instance in obj['instances']])
+            for instance, output in zip(obj['instances'], outputs):
+                instance['output'] = output
+            return obj
         else:
-            return asyncio.run(self.__call__(obj['instruction'], obj['input']))
+            return get_loop().run(self.__call__(obj['instruction'], obj['input']))
     
     async def aeval_jsonl(
             self,
@@ -37,52 +48,64 @@ class Evaluate(ABC):
             max_concurrency=10,
             verbose=True,
             dev=False,
-            increment=True):
+            increment=True,
+            schedule='file',
+            dry_run=False,
+            paths=None,
+            **kwargs):
         """이 함수는 입력 파일 경로와 출력 파일 경로를 받아서, 입력 파일에서 모든 객체들을 가져와 각 객체에 대해서 비동기 처리를 해주고, 결과를 출력 파일에 저장하는 함수입니다.
+        입력 파일은 스트리밍으로 읽으며, 처리가 끝난 객체부터 바로 출력 파일에 기록합니다.
 
         Args:
             in_filepath (str): 입력 파일 경로
             out_filepath (str): 출력 파일 경로
-            max_concurrency (int, optional): 최대 동시성 개수. Defaults to 10.
+            max_concurrency (int, optional): 동시에 실행되는 worker 수. Defaults to 10.
             verbose (bool, optional): verbose 여부. Defaults to True.
             dev (bool, optional): 개발자 모드 여부. Defaults to False.
             increment (bool, optional): 증분 모드 여부. Defaults to True.
+            schedule (str, optional): 'file' 이면 입력 순서대로, 'longest' 이면 예상 처리 시간이 긴 레코드부터 처리합니다. Defaults to 'file'.
+            dry_run (bool, optional): True 이면 추론하지 않고 예상 토큰 수, 비용, 소요 시간만 출력하고 그 계획(dict)을 반환합니다. Defaults to False.
+            paths (Sequence[str], optional): input 필드 경로. dry_run 이나 schedule='longest' 에서 사용합니다.
+                None 이면 evaluate_fields 로 만든 run_func 에서 읽고, 읽을 수 없으면 ValueError 가 발생합니다.
+            **kwargs: pipeline.arun_jsonl 에 전달할 추가 옵션 (retry_policy, dead_letter_filepath 등)
         """
 
+        # 예상 처리량은 dry_run 과 schedule='longest' 에서만 필요합니다.
+        planner = Planner.of(self, run_func, 'eval', paths) if dry_run or schedule == 'longest' else None
+        if dry_run:
+            plan = planner.plan(in_filepath)
+            report(plan)
+            return plan
+
         run_func = partial(run_func, self)  # run_func self를 인자로 고정하여 새로운 함수(run_func)를 생성합니다. 
 
-        async def run_task(sem, afp, obj):
-            async with sem:  # semaphore lock을 사용하여 동시에 실행되는 coroutine의 개수를 제한합니다.
-                result = await run_func(obj)  # __call__ 함수를 실행하여 결과를 반환합니다.
-                await afp.write(json.dumps(result, ensure_ascii=False)+'\n')
-
-        with jsonlines.open(in_filepath) as reader:
-            data = [obj for obj in reader]  # 입력 파일에서 모든 객체들을 리스트에 저장합니다.
-        
-        if increment and os.path.exists(out_filepath):  # increment 가 True 이고 out_filepath 가 존재하는 경우
-            afp = await async_open(out_filepath, 'a')  # 파일을 추가 모드로 열기 (이어서 쓰기 가능)
-            with jsonlines.open(out_filepath) as reader:  # jsonlines 로 읽기
-                processed_ids = [obj['id'] for obj in reader]  # 이미 처리한 id 들을 processed_ids 리스트에 저장
-            data = [obj for obj in data if obj['id'] not in processed_ids]  # data 의 id 가 이미 processed_ids 리스트에 있는 경우 제외한 데이터만 data 리스트에 저장
-        else:
-            afp = await async_open(out_filepath, "w")
+        # 입력 파일을 스트리밍으로 읽어 처리하고, 끝나는 대로 출력 파일에 저장합니다.
+        await arun_jsonl(in_filepath, out_filepath, run_func,
+                         max_concurrency=max_concurrency,
+                         verbose=verbose,
+                         dev=dev,
+                         increment=increment,
+                         schedule=schedule,
+                         weigh=planner.weight if planner else None,
+                         **kwargs)
 
-        if dev:
-            data = data[:5]  # 개발자 모드인 경우, 데이터의 일부만 변환하도록 하여 테스트할 수 있습니다.
 
-        semaphore = asyncio.Semaphore(max_concurrency)  # 최대 max_concurrency 수만큼의 태스크가 동시에 실행됩니다.
+class EvaluateWrapper(Evaluate):
+    """
+    다른 Evaluate 객체를 감싸 기능(캐시 등)을 덧붙이는 클래스입니다.
+    감싼 객체의 속성(backend, model_name 등)은 그대로 노출됩니다.
+    """
 
-        tasks = [asyncio.ensure_future(run_task(semaphore, afp, obj)) for obj in data]  # 모든 객체들에 대해서 비동기 태스크를 생성합니다.
+    def __init__(self, inner: Evaluate):
+        self.inner = inner
 
-        if verbose:
-            print(colored(f"in_filepath: {in_filepath}", 'yellow'))  # 입력 파일 경로 출력
-            print(colored(f"out_filepath: {out_filepath}", 'yellow'))  # 출력 파일 경로 출력
-            print(colored(f"max_concurrency: {max_concurrency}", 'yellow'))  # 최대 max_concurrency 수 출력
-            await tqdm_asyncio.gather(*tasks)  # 결과값들을 모아서 반환합니다.
-        else:
-            await asyncio.gather(*tasks)  # 결과값들을 모아서 반환합니다.
+    def __getattr__(self, name):
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
 
-        await afp.close()
+    async def __call__(self, instruction, input) -> str:
+        return await self.inner(instruction, input)
 
 
 # 현재 모듈의 이름이 __main__일 경우, 아래 코드를 실행합니다.
@@ -1,55 +1,50 @@
-import asyncio
 from chatgpt import ChatGPTEval
 from gpt4 import GPT4Eval
+from cache import TranslationCache
+from fanout import evaluate_fields
+from jobs import Job, run_jobs
+from hedging import HedgedEvaluate
+from dataset_prepare import translate_jobs
+
+# 동시에 처리할 레코드 수의 상한입니다. 실제 동시 요청 수는 백엔드별 AdaptiveLimiter 가 한도에 맞춰 조절합니다.
+MAX_WORKERS = 256
+
+# 평가 모델 이름과 평가 클래스
+EVALUATORS = {
+    'chatgpt': ChatGPTEval,
+    'gpt4': GPT4Eval,
+}
+
+# instances 의 input 들을 동시에 추론하여 output 에 저장하는 함수
+run_instances = evaluate_fields('instances[].input', 'output')
+# arun 이 추론하는 input 필드 경로. dry_run 이나 schedule='longest' 로 실행할 때 paths 로 넘깁니다.
+INPUT_PATHS = ['instances[].input', 'input']
 
 
 async def arun(self, obj: dict) -> dict:
     if 'instances' in obj.keys():
-        for idx, instance in enumerate(obj['instances']):
-            obj['instances'][idx]['output'] = await self.__call__(obj['instruction'], instance['input'])
+        return await run_instances(self, obj)
     else:
         obj['answer'] = await self.__call__(obj['instruction'], obj['input'])
     return obj
 
 
-# ChatGPT API를 사용하여 'user_oriented_instructions_deepl_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_deepl_ko_eval_chatgpt.jsonl' 파일에 저장합니다.
-asyncio.run(ChatGPTEval().aeval_jsonl(in_filepath='user_oriented_instructions_deepl_ko.jsonl',
-                    out_filepath='user_oriented_instructions_deepl_ko_eval_chatgpt.jsonl',
-                    run_func=arun,
-                    max_concurrency=100,
-                    dev=False))
-
-# GPT4 API를 사용하여 'user_oriented_instructions_deepl_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_deepl_ko_eval_gpt4.jsonl' 파일에 저장합니다.
-asyncio.run(GPT4Eval().aeval_jsonl(in_filepath='user_oriented_instructions_deepl_ko.jsonl',
-                    out_filepath='user_oriented_instructions_deepl_ko_eval_gpt4.jsonl',
-                    run_func=arun,
-                    max_concurrency=50,
-                    dev=False))
-
-# ChatGPT API를 사용하여 'user_oriented_instructions_chatgpt_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_chatgpt_ko_eval_chatgpt.jsonl' 파일에 저장합니다.
-asyncio.run(ChatGPTEval().aeval_jsonl(in_filepath='user_oriented_instructions_chatgpt_ko.jsonl',
-                    out_filepath='user_oriented_instructions_chatgpt_ko_eval_chatgpt.jsonl',
-                    run_func=arun,
-                    max_concurrency=100,
-                    dev=False))
-
-# GPT4 API를 사용하여 'user_oriented_instructions_chatgpt_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_chatgpt_ko_eval_gpt4.jsonl' 파일에 저장합니다.
-asyncio.run(GPT4Eval().aeval_jsonl(in_filepath='user_oriented_instructions_chatgpt_ko.jsonl',
-                    out_filepath='user_oriented_instructions_chatgpt_ko_eval_gpt4.jsonl',
-                    run_func=arun,
-                    max_concurrency=50,
-                    dev=False))
-
-# ChatGPT API를 사용하여 'user_oriented_instructions_gpt4_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_gpt4_ko_eval_chatgpt.jsonl' 파일에 저장합니다.
-asyncio.run(ChatGPTEval().aeval_jsonl(in_filepath='user_oriented_instructions_gpt4_ko.jsonl',
-                    out_filepath='user_oriented_instructions_gpt4_ko_eval_chatgpt.jsonl',
-                    run_func=arun,
-                    max_concurrency=100,
-                    dev=False))
-
-# GPT4 API를 사용하여 'user_oriented_instructions_gpt4_ko.jsonl' 파일에 답변하고, 'user_oriented_instructions_gpt4_ko_eval_gpt4.jsonl' 파일에 저장합니다.
-asyncio.run(GPT4Eval().aeval_jsonl(in_filepath='user_oriented_instructions_gpt4_ko.jsonl',
-                    out_filepath='user_oriented_instructions_gpt4_ko_eval_gpt4.jsonl',
-                    run_func=arun,
-                    max_concurrency=50,
-                    dev=False))
+if __name__ == '__main__':
+    cache = TranslationCache('translation_cache.sqlite')
+    jobs = translate_jobs(cache)  # 이미 번역이 끝난 파일은 increment 모드로 곧바로 끝납니다.
+    # 평가 모델마다 객체 하나를 모든 작업이 함께 사용합니다.
+    # 최근 p95 보다 오래 걸리는 요청은 한 번 더 보내(요청 수의 5% 이내), 멈춘 연결 하나가 레코드를 오래 붙잡지 않도록 합니다.
+    evaluators = {name: HedgedEvaluate(evaluator()) for name, evaluator in EVALUATORS.items()}
+    # 각 번역 파일(user_oriented_instructions_<번역기>_ko.jsonl)을 각 평가 모델로 답변하여 '..._ko_eval_<모델>.jsonl' 파일에 저장합니다.
+    # 평가 작업은 번역 작업이 끝나기를 기다리지 않고, 번역이 끝난 레코드부터 바로 답변합니다.
+    for translate_job in list(jobs):
+        for name, evaluator in evaluators.items():
+            jobs.append(Job(f'{translate_job.name}_eval_{name}', evaluator,
+                            in_filepath=translate_job.out_filepath,
+                            out_filepath=translate_job.out_filepath.replace('.jsonl', f'_eval_{name}.jsonl'),
+                            func=arun,
+                            after=translate_job.name,
+                            max_concurrency=MAX_WORKERS,
+                            dev=False))
+    run_jobs(jobs)
+    cache.close()
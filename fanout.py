@@ -0,0 +1,113 @@
+# python
+from contextvars import ContextVar
+from functools import partial
+from typing import Awaitable, Callable, Iterator, List, Tuple
+import time
+# 비동기
+import asyncio
+# framework
+from metrics import metrics
+
+
+# arun_jsonl 이 설정하는 전역 요청 슬롯. 레코드 안의 하위 요청들도 같은 동시성 제한을 공유합니다.
+request_slots: ContextVar = ContextVar('request_slots', default=None)
+
+
+async def fanout(calls: List[Callable[[], Awaitable]]) -> list:
+    """
+    하위 요청들을 동시에 실행하고 결과를 입력 순서대로 반환하는 함수입니다.
+    arun_jsonl 안에서 호출되면 각 하위 요청은 전역 요청 슬롯(max_concurrency)을 하나씩 차지합니다.
+
+    Args:
+        calls (List[Callable[[], Awaitable]]): 인자 없이 호출하면 코루틴을 반환하는 함수 리스트
+
+    Returns:
+        list: calls 와 같은 순서의 결과 리스트
+    """
+    slots = request_slots.get()
+
+    async def run(call):
+        if slots is None:
+            return await call()
+        waited = time.perf_counter()
+        async with slots:
+            metrics.observe('slot_wait_seconds', time.perf_counter() - waited)  # max_concurrency 요청 슬롯을 기다린 시간
+            return await call()
+
+    return await asyncio.gather(*[run(call) for call in calls])
+
+
+def resolve(obj: dict, path: str) -> Iterator[Tuple[dict, str]]:
+    """
+    'instruction', 'context', 'instances[].input' 과 같은 경로가 가리키는 (부모 객체, 키) 를 순서대로 반환합니다.
+    '[]' 로 끝나는 부분은 리스트의 모든 원소를 뜻합니다. 경로에 해당하는 값이 없으면 건너뜁니다.
+
+    Args:
+        obj (dict): 레코드
+        path (str): 점(.)으로 구분된 필드 경로
+
+    Yields:
+        Tuple[dict, str]: (부모 객체, 키)
+    """
+    *parents, key = path.split('.')
+    containers = [obj]
+    for part in parents:
+        if part.endswith('[]'):
+            containers = [item for c in containers for item in (c.get(part[:-2]) or [])]
+        else:
+            containers = [c[part] for c in containers if part in c]
+    for container in containers:
+        if key in container:
+            yield container, key
+
+
+def translate_fields(*paths: str):
+    """
+    번역할 필드를 선언하여 atranslate_jsonl 에 넘길 translate_func 를 만들어 주는 함수입니다.
+    선언한 필드들은 동시에 번역된 뒤 원래 위치에 다시 채워집니다.
+    반환값은 pickle 할 수 있으므로 다른 프로세스(shard)에도 넘길 수 있습니다.
+
+    예) translate_fields('instruction', 'instances[].input')
+
+    Args:
+        *paths (str): 번역할 필드 경로
+
+    Returns:
+        Callable: translate_func(translator, obj)
+    """
+    return partial(_translate_fields, paths=paths)
+
+
+def evaluate_fields(input_path: str, output_key: str, instruction_path: str = 'instruction'):
+    """
+    추론할 필드를 선언하여 aeval_jsonl 에 넘길 run_func 를 만들어 주는 함수입니다.
+    input_path 가 가리키는 값마다 (instruction, input) 으로 동시에 추론하고, 결과를 같은 부모 객체의 output_key 에 저장합니다.
+
+    예) evaluate_fields('instances[].input', 'output'), evaluate_fields('context', 'response')
+
+    Args:
+        input_path (str): 입력 필드 경로
+        output_key (str): 결과를 저장할 키
+        instruction_path (str, optional): instruction 필드 경로. Defaults to 'instruction'.
+
+    Returns:
+        Callable: run_func(self, obj)
+    """
+    return partial(_evaluate_fields, input_path=input_path, output_key=output_key, instruction_path=instruction_path)
+
+
+async def _translate_fields(translator, obj: dict, paths) -> dict:
+    targets = [target for path in paths for target in resolve(obj, path)]
+    results = await fanout([lambda c=c, k=k: translator(c[k]) for c, k in targets])
+    for (container, key), result in zip(targets, results):
+        container[key] = result
+    return obj
+
+
+async def _evaluate_fields(self, obj: dict, input_path, output_key, instruction_path) -> dict:
+    instruction = next(c[k] for c, k in resolve(obj, instruction_path))
+    targets = list(resolve(obj, input_path))
+    results = await fanout([lambda c=c, k=k: self.__call__(instruction, c[k]) for c, k in targets])
+    for (container, _), result in zip(targets, results):
+        container[output_key] = result
+    return obj
@@ -1,6 +1,4 @@
 # OpenAI ChatGPT를 langchain 라이브러리를 이용하여 번역
-from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts.chat import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
@@ -8,14 +6,25 @@ from langchain.prompts.chat import (
 )
 # framework
 from translate import Translate
+from packing import PackedTranslate
 from eval import Evaluate
+from streaming import StreamingEval
+from limiter import estimate_tokens, DEFAULT_COMPLETION_TOKENS
+from endpoints import get_pool, chat_models, chains
+from metrics import record_tokens
 
 
 # gpt4 번역
-class GPT4(Translate):
-    def __init__(self, model_name='gpt-4'):
-        # ChatOpenAI 객체를 생성합니다.
-        chat = ChatOpenAI(model_name=model_name, request_timeout=600)
+class GPT4(PackedTranslate, Translate):
+    def __init__(self, model_name='gpt-4', pack=False, max_pack_segments=20, max_pack_tokens=1500, pack_delay=0.01):
+        """
+        Args:
+          model_name (str): OpenAI 모델 이름
+          pack, max_pack_segments, max_pack_tokens, pack_delay: 여러 문자열을 한 요청으로 묶어 번역하는 설정 (PackedTranslate.init_packing 참고)
+        """
+        # 같은 모델을 사용하는 모든 객체가 공유하는 엔드포인트(API 키) 풀과, 엔드포인트별 ChatOpenAI 객체를 생성합니다.
+        self.limiter = get_pool(f'openai:{model_name}')
+        chats = chat_models(self.limiter, model_name, request_timeout=600)
         # 사용자에게 보낼 시스템 메시지와 인간의 응답 메시지 템플릿을 정의합니다.
         template = "You are a helpful assistant that translates English to {target_lang}. Please paraphrase as much as possible when translating. Do not add expressions that are not in the source sentences. Do not add pronunciations for the target language. Please provide the {target_lang} translation for these sentences:"
         system_message_prompt = SystemMessagePromptTemplate.from_template(
@@ -26,10 +35,16 @@ class GPT4(Translate):
         chat_prompt = ChatPromptTemplate.from_messages(
             [system_message_prompt, human_message_prompt])
 
-        # LLMChain 객체를 생성
-        self.translate_chain = LLMChain(llm=chat, prompt=chat_prompt)
+        # 엔드포인트별 LLMChain 객체를 생성
+        self.translate_chains = chains(chats, chat_prompt)
+        # 캐시 키 등에 사용하는 백엔드 정보
+        self.backend = 'openai'
+        self.model_name = model_name
+        self.template = template + '\n' + human_template
+        # 동시에 들어온 짧은 문자열들을 한 요청으로 묶어 번역합니다.
+        self.init_packing(chats, template, pack, max_pack_segments, max_pack_tokens, pack_delay)
 
-    async def __call__(self, original_text: str, target_lang: str = 'Korean') -> str:
+    async def translate_one(self, original_text: str, target_lang: str = 'Korean') -> str:
         """
         입력된 original_text를 GPT-4 모델을 이용하여 target_lang으로 번역하는 함수입니다. 
 
@@ -44,33 +59,59 @@ class GPT4(Translate):
         if not original_text or original_text.strip() == "":
             return original_text
 
-        # translate_chain 객체의 arun 비동기 메소드를 사용하여 번역을 진행한 후, 반환합니다.
-        return await self.translate_chain.arun({'text': '', 'original_text': original_text, 'target_lang': target_lang})
+        # 고른 엔드포인트의 LLMChain 객체의 arun 비동기 메소드를 사용하여 번역을 진행한 후, 반환합니다.
+        # 번역 결과는 원문과 비슷한 길이라고 보고 토큰 수를 추정합니다.
+        async with self.limiter.slot(2 * estimate_tokens(original_text)) as endpoint:
+            result = await self.translate_chains[endpoint.name].arun({'text': '', 'original_text': original_text, 'target_lang': target_lang})
+        record_tokens(self.limiter.name, estimate_tokens(original_text), estimate_tokens(result))
+        return result
 
 
 # chatgpt inference
-class GPT4Eval(Evaluate):
-    def __init__(self, model_name='gpt-4'):
-        chat = ChatOpenAI(model_name=model_name, request_timeout=600)
+class GPT4Eval(StreamingEval, Evaluate):
+    def __init__(self, model_name='gpt-4', stream=False, max_output_tokens=None, max_seconds=None, partial_outputs=True):
+        """
+        Args:
+          model_name (str): OpenAI 모델 이름
+          stream, max_output_tokens, max_seconds, partial_outputs: streaming 생성 설정 (StreamingEval.init_streaming 참고)
+        """
+        # 같은 모델을 사용하는 모든 객체가 공유하는 엔드포인트(API 키) 풀과, 엔드포인트별 ChatOpenAI 객체를 생성합니다.
+        self.limiter = get_pool(f'openai:{model_name}')
+        chats = chat_models(self.limiter, model_name, request_timeout=600)
         system_messsage_prompt = SystemMessagePromptTemplate.from_template("당신은 유용한 어시시턴트입니다.")
         
         input_human_message_prompt = HumanMessagePromptTemplate.from_template("##Instruction:\n\n{instruction}\n\n##Input:\n\n{input}\n\n##Output:\n\n")
         input_chat_prompt = ChatPromptTemplate.from_messages(
             [system_messsage_prompt, input_human_message_prompt]
         )
-        self.input_chain = LLMChain(llm=chat, prompt=input_chat_prompt)
+        self.input_chains = chains(chats, input_chat_prompt)
+        self.input_prompt = input_chat_prompt
 
         instruct_human_message_prompt = HumanMessagePromptTemplate.from_template("##Instruction:\n\n{instruction}\n\n##Output:\n\n")
         instruct_chat_prompt = ChatPromptTemplate.from_messages(
             [system_messsage_prompt, instruct_human_message_prompt]
         )
-        self.instruct_chain = LLMChain(llm=chat, prompt=instruct_chat_prompt)
+        self.instruct_chains = chains(chats, instruct_chat_prompt)
+        self.instruct_prompt = instruct_chat_prompt
+        # 캐시 키 등에 사용하는 백엔드 정보
+        self.backend = 'openai'
+        self.model_name = model_name
+        self.template = '\n'.join(p.prompt.template for p in input_chat_prompt.messages + instruct_chat_prompt.messages[1:])
+        # streaming 모드에서는 토큰이 도착하는 대로 읽고, 한도를 넘으면 생성을 끊습니다.
+        self.init_streaming(stream, max_output_tokens, max_seconds, partial_outputs)
     
     async def __call__(self, instruction: str, input: str) -> str:
-        if input.strip() == '':
-            return await self.instruct_chain.arun({'text': '', 'instruction': instruction})
-        else:
-            return await self.input_chain.arun({'text': '', 'instruction': instruction, 'input': input})
+        if self.stream:
+            return await self.stream_eval(instruction, input)
+        prompt_tokens = estimate_tokens(instruction) + estimate_tokens(input)
+        async with self.limiter.slot(prompt_tokens + DEFAULT_COMPLETION_TOKENS) as endpoint:
+            if input.strip() == '':
+                result = await self.instruct_chains[endpoint.name].arun({'text': '', 'instruction': instruction})
+            else:
+                result = await self.input_chains[endpoint.name].arun({'text': '', 'instruction': instruction, 'input': input})
+        # langchain 의 arun 은 실제 usage 를 돌려주지 않으므로 추정한 토큰 수를 기록합니다.
+        record_tokens(self.limiter.name, prompt_tokens, estimate_tokens(result))
+        return result
 
 
 if __name__ == '__main__':
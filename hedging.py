@@ -0,0 +1,168 @@
+# python
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import time
+# 비동기
+import asyncio
+# framework
+from translate import TranslateWrapper
+from eval import EvaluateWrapper
+from metrics import metrics
+
+
+class LatencyWindow:
+    """
+    최근 size 개 요청의 지연 시간으로 분위수(p95 등)를 계산합니다.
+
+    Args:
+        size (int, optional): 기억할 지연 시간 수. Defaults to 200.
+    """
+
+    def __init__(self, size=200):
+        self.values = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.values.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# 백엔드(제한기 이름)별 지연 시간 기록. 같은 백엔드를 감싼 객체들이 함께 사용합니다.
+windows = {}
+
+
+def get_window(name: str) -> LatencyWindow:
+    if name not in windows:
+        windows[name] = LatencyWindow()
+    return windows[name]
+
+
+class HedgePolicy:
+    """
+    요청이 백엔드의 최근 지연 시간 분위수(p95 등)보다 오래 걸리면 같은 요청을 하나 더 보내는(hedging) 정책입니다.
+    요청 하나마다 budget 만큼의 예산이 쌓이고 추가 요청 하나에 1 을 쓰므로, 추가 요청 수는 전체 요청 수의 budget 비율을 넘지 않습니다.
+
+    Args:
+        quantile (float, optional): 추가 요청을 보내기까지 기다릴 지연 시간 분위수. Defaults to 0.95.
+        budget (float, optional): 전체 요청 대비 추가 요청의 최대 비율. Defaults to 0.05.
+        min_delay (float, optional): 추가 요청을 보내기까지 기다리는 최소 시간(초). Defaults to 1.
+        min_samples (int, optional): 분위수를 계산하기 위한 최소 지연 시간 수. 이보다 적으면 추가 요청을 보내지 않습니다. Defaults to 20.
+        max_burst (float, optional): 쌓아 둘 수 있는 최대 예산. Defaults to 10.
+    """
+
+    def __init__(self, quantile=0.95, budget=0.05, min_delay=1.0, min_samples=20, max_burst=10.0):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self.credits = 0.0
+
+    def delay(self, window: LatencyWindow) -> Optional[float]:
+        """추가 요청을 보내기까지 기다릴 시간을 반환합니다. 아직 지연 시간 기록이 부족하면 None 을 반환합니다."""
+        if len(window.values) < self.min_samples:
+            return None
+        return max(self.min_delay, window.quantile(self.quantile))
+
+    def earn(self):
+        self.credits = min(self.max_burst, self.credits + self.budget)
+
+    def spend(self) -> bool:
+        if self.credits < 1:
+            return False
+        self.credits -= 1
+        return True
+
+
+async def hedge(call: Callable[[], Awaitable], name: str, policy: HedgePolicy, limiter=None):
+    """
+    call() 을 실행하고, policy 가 정한 시간 안에 끝나지 않으면 call() 을 한 번 더 실행하여 먼저 성공한 결과를 반환합니다.
+    진 쪽 요청은 취소하므로 동시성 슬롯과 연결을 바로 돌려줍니다. 제한기가 이미 가득 찬 경우에는 추가 요청을 보내지 않습니다.
+
+    Args:
+        call (Callable[[], Awaitable]): 인자 없이 호출하면 요청 코루틴을 반환하는 함수
+        name (str): 지연 시간 기록과 지표에 사용할 백엔드 이름
+        policy (HedgePolicy): hedging 정책
+        limiter (AdaptiveLimiter, optional): 백엔드의 제한기
+
+    Returns:
+        먼저 성공한 요청의 결과. 모두 실패하면 첫 번째 예외를 발생시킵니다.
+    """
+    policy.earn()
+    window = get_window(name)
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(call())
+    tasks = [primary]
+    try:
+        delay = policy.delay(window)
+        if delay is not None:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            saturated = limiter is not None and limiter.inflight >= int(limiter.limit)
+            if not done and not saturated and policy.spend():
+                metrics.inc('hedges_issued_total', backend=name)
+                tasks.append(asyncio.ensure_future(call()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        metrics.inc('hedges_won_total', backend=name)
+                    window.observe(time.perf_counter() - started)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()  # 진 쪽 요청을 취소합니다.
+            elif not task.cancelled():
+                task.exception()  # 결과를 읽지 않은 예외의 경고를 남기지 않습니다.
+
+
+def _backend_name(wrapper) -> str:
+    limiter = getattr(wrapper, 'limiter', None)
+    return limiter.name if limiter is not None else f"{getattr(wrapper, 'backend', '')}:{getattr(wrapper, 'model_name', '')}"
+
+
+class HedgedTranslate(TranslateWrapper):
+    """
+    번역 객체를 감싸 느린 요청을 hedging 합니다.
+
+    Args:
+        inner (Translate): 감쌀 번역 객체
+        policy (HedgePolicy, optional): hedging 정책. 여러 객체가 예산을 공유하려면 같은 정책을 넘깁니다.
+    """
+
+    def __init__(self, inner, policy: Optional[HedgePolicy] = None):
+        super().__init__(inner)
+        self.policy = policy if policy is not None else HedgePolicy()
+
+    async def __call__(self, original_text, target_lang=None):
+        # original_text가 빈 문자열인 경우 바로 반환합니다.
+        if not original_text or original_text.strip() == "":
+            return original_text
+        call = super().__call__
+        return await hedge(lambda: call(original_text, target_lang), _backend_name(self), self.policy, getattr(self, 'limiter', None))
+
+
+class HedgedEvaluate(EvaluateWrapper):
+    """
+    추론 객체를 감싸 느린 요청을 hedging 합니다. 한 요청이 request_timeout(600초)까지 레코드를 붙잡는 일을 줄입니다.
+
+    Args:
+        inner (Evaluate): 감쌀 추론 객체
+        policy (HedgePolicy, optional): hedging 정책
+    """
+
+    def __init__(self, inner, policy: Optional[HedgePolicy] = None):
+        super().__init__(inner)
+        self.policy = policy if policy is not None else HedgePolicy()
+
+    async def __call__(self, instruction, input) -> str:
+        call = super().__call__
+        return await hedge(lambda: call(instruction, input), _backend_name(self), self.policy, getattr(self, 'limiter', None))
@@ -0,0 +1,89 @@
+# python
+from contextlib import asynccontextmanager
+# 비동기
+import asyncio
+import aiohttp
+try:
+    import openai
+except ImportError:  # DeepL 만 사용하는 경우
+    openai = None
+
+
+# 공유 연결 풀 설정. configure_http 로 바꿀 수 있습니다.
+HTTP_OPTIONS = dict(
+    limit=512,  # 전체 동시 연결 수
+    limit_per_host=256,  # 호스트(api.openai.com, api.deepl.com)별 동시 연결 수
+    keepalive_timeout=60,  # 유휴 연결을 유지하는 시간(초)
+    ttl_dns_cache=300,  # DNS 조회 결과를 캐시하는 시간(초)
+)
+
+# 이벤트 루프별 공유 세션과 사용 중인 곳의 수
+sessions = {}
+
+
+def configure_http(**kwargs):
+    """공유 연결 풀 설정(limit, limit_per_host, keepalive_timeout, ttl_dns_cache)을 바꿉니다. 세션을 만들기 전에 호출해야 합니다."""
+    HTTP_OPTIONS.update(kwargs)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    현재 이벤트 루프에서 모든 백엔드가 함께 쓰는 aiohttp 세션을 반환합니다.
+    연결을 재사용(keep-alive)하므로 요청마다 TCP/TLS 연결을 새로 맺지 않습니다.
+    세션은 shared_session 블록(with_session, pipeline.arun_jsonl, background.BackgroundLoop 등)이 닫으므로, 그 안에서만 호출할 수 있습니다.
+
+    Raises:
+        RuntimeError: 현재 이벤트 루프에 열려 있는 shared_session 블록이 없는 경우
+    """
+    entry = sessions.get(asyncio.get_running_loop())
+    if entry is None or entry['users'] == 0:
+        raise RuntimeError("get_session() requires an open shared_session() on this event loop (use with_session(coro) with asyncio.run)")
+    if entry['session'].closed:
+        entry['session'] = _new_session()
+    return entry['session']
+
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit=HTTP_OPTIONS['limit'],
+                                     limit_per_host=HTTP_OPTIONS['limit_per_host'],
+                                     keepalive_timeout=HTTP_OPTIONS['keepalive_timeout'],
+                                     ttl_dns_cache=HTTP_OPTIONS['ttl_dns_cache'],
+                                     use_dns_cache=True)
+    return aiohttp.ClientSession(connector=connector)
+
+
+@asynccontextmanager
+async def shared_session():
+    """
+    블록 안에서 공유 세션을 사용하도록 하는 비동기 context manager 입니다.
+    openai 라이브러리는 openai.aiosession 이 없으면 요청마다 세션을 새로 만들므로, 블록 안에서는 공유 세션을 쓰도록 설정합니다.
+    중첩하여 사용할 수 있으며(run_jobs 안의 여러 arun_jsonl 등), 가장 바깥 블록이 끝날 때 세션을 닫습니다.
+    """
+    loop = asyncio.get_running_loop()
+    entry = sessions.get(loop)
+    if entry is None:
+        entry = sessions[loop] = {'session': _new_session(), 'users': 0}
+    entry['users'] += 1
+    session = get_session()
+    token = openai.aiosession.set(session) if openai is not None else None
+    try:
+        yield session
+    finally:
+        if token is not None:
+            openai.aiosession.reset(token)
+        entry['users'] -= 1
+        if entry['users'] == 0:
+            await close_session()
+
+
+async def with_session(coro):
+    """공유 세션 안에서 코루틴을 실행합니다. asyncio.run 으로 한 번만 실행하는 경우에 사용합니다."""
+    async with shared_session():
+        return await coro
+
+
+async def close_session():
+    """현재 이벤트 루프의 공유 세션을 닫습니다."""
+    entry = sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None and not entry['session'].closed:
+        await entry['session'].close()
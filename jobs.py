@@ -0,0 +1,159 @@
+# python
+from typing import AsyncIterator, Callable, Dict, Optional, Sequence
+import json
+import os
+import time
+# 비동기
+import asyncio
+# 유틸리티 함수
+from termcolor import colored
+# framework
+from translate import Translate
+from metrics import export_periodically
+from httppool import shared_session
+
+
+class Job:
+    """
+    run_jobs 로 실행할 작업 하나를 선언합니다. (백엔드 하나로 입력 파일 하나를 번역 또는 평가)
+
+    after 에 다른 작업의 이름을 주면 그 작업의 출력을 입력으로 사용하는 하위 작업이 됩니다.
+    stream=True 이면 상위 작업이 끝나기를 기다리지 않고, 상위 작업의 manifest 에 기록된 레코드부터 바로 처리합니다.
+
+    Args:
+        name (str): 작업 이름 (after 에서 참조)
+        backend (Translate | Evaluate): 번역기 또는 평가기 객체
+        in_filepath (str): 입력 파일 경로. after 가 있으면 상위 작업의 out_filepath 와 같아야 합니다.
+        out_filepath (str): 출력 파일 경로
+        func (Callable): translate_func 또는 run_func
+        after (str, optional): 상위 작업 이름
+        stream (bool, optional): 상위 작업의 출력을 기록되는 대로 읽을지 여부. Defaults to True.
+        **options: atranslate_jsonl / aeval_jsonl 에 전달할 추가 옵션 (max_concurrency, dev 등)
+
+    상위 작업을 increment=False 로 처음부터 다시 실행하는 경우에는, 이전 실행의 출력을 읽지 않도록 stream=False 를 사용합니다.
+    """
+
+    def __init__(self, name: str, backend, in_filepath: str, out_filepath: str, func: Callable,
+                 after: Optional[str] = None, stream=True, **options):
+        self.name = name
+        self.backend = backend
+        self.in_filepath = in_filepath
+        self.out_filepath = out_filepath
+        self.func = func
+        self.after = after
+        self.stream = stream
+        self.options = options
+
+    def run(self, source: Optional[AsyncIterator[dict]] = None):
+        """작업을 실행하는 코루틴을 반환합니다. source 가 있으면 입력 파일 대신 source 에서 레코드를 읽습니다."""
+        if source is not None:
+            self.options['source'] = source
+        if isinstance(self.backend, Translate):
+            return self.backend.atranslate_jsonl(self.in_filepath, self.out_filepath, self.func, **self.options)
+        return self.backend.aeval_jsonl(self.in_filepath, self.out_filepath, self.func, **self.options)
+
+
+async def follow_jsonl(out_filepath: str, done: asyncio.Event, poll_interval=0.5) -> AsyncIterator[dict]:
+    """
+    다른 작업이 기록 중인 출력 파일을 manifest(out_filepath + '.ckpt') 를 따라가며 읽는 비동기 제너레이터입니다.
+    manifest 에 추가된 줄만 읽으므로, 기록 도중인(잘린) 줄을 읽는 일이 없습니다.
+    done 이 설정되고 manifest 를 끝까지 읽으면 종료합니다.
+
+    Args:
+        out_filepath (str): 따라갈 출력 파일 경로
+        done (asyncio.Event): 기록하는 작업이 끝나면 설정되는 이벤트
+        poll_interval (float, optional): 새 줄이 없을 때 다시 확인하는 간격(초). Defaults to 0.5.
+
+    Yields:
+        dict: 출력 파일에 기록이 끝난 객체
+    """
+    manifest_filepath = out_filepath + '.ckpt'
+    position = 0  # manifest 에서 읽은 바이트 위치
+    seen = set()  # manifest 가 다시 만들어져 처음부터 읽을 때 이미 넘긴 id 는 건너뜁니다.
+    while True:
+        finished = done.is_set()  # 마지막으로 한 번 더 읽은 뒤 종료하도록, 읽기 전에 확인합니다.
+        if os.path.exists(manifest_filepath):
+            if os.path.getsize(manifest_filepath) < position:
+                position = 0  # 상위 작업이 manifest 를 비우거나 잘라냈습니다.
+            with open(manifest_filepath, 'rb') as manifest, open(out_filepath, 'rb') as out:
+                manifest.seek(position)
+                for line in manifest:
+                    if not line.endswith(b'\n'):
+                        break  # 아직 기록 중인 줄
+                    position += len(line)
+                    offset, nbytes, obj_id = line.decode('utf-8').split('\t', 2)
+                    key = obj_id.rstrip('\n')
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    out.seek(int(offset))
+                    yield json.loads(out.read(int(nbytes)))
+        if finished:
+            return
+        try:
+            await asyncio.wait_for(done.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def arun_jobs(jobs: Sequence[Job], poll_interval=0.5, metrics_filepath: Optional[str] = None, metrics_interval=10.0) -> Dict[str, BaseException]:
+    """
+    여러 작업을 하나의 이벤트 루프에서 동시에 실행합니다.
+    서로 의존하지 않는 작업은 함께 시작하고, 하위 작업은 상위 작업의 출력을 기록되는 대로(stream) 또는 끝난 뒤에 처리합니다.
+    동시 요청 수와 rpm/tpm 은 작업별이 아니라 백엔드별 제한기(limiter.get_limiter)가 관리하므로,
+    같은 백엔드를 쓰는 작업들은 한도를 나눠 쓰고 서로 다른 백엔드는 서로 기다리지 않습니다.
+    백엔드별 한도를 바꾸려면 백엔드 객체를 만들기 전에 limiter.configure_limiter 를 호출합니다.
+
+    Args:
+        jobs (Sequence[Job]): 실행할 작업 목록
+        poll_interval (float, optional): stream 하위 작업이 상위 작업의 manifest 를 확인하는 간격(초). Defaults to 0.5.
+        metrics_filepath (str, optional): 모든 작업의 지표를 함께 기록할 json 파일 경로 (.prom 파일도 함께 기록)
+        metrics_interval (float, optional): 지표를 기록하는 간격(초). Defaults to 10.
+
+    Returns:
+        Dict[str, BaseException]: 실패한 작업 이름과 예외
+    """
+    by_name = {job.name: job for job in jobs}
+    for job in jobs:
+        if job.after is not None and job.after not in by_name:
+            raise ValueError(f"job {job.name!r} depends on unknown job {job.after!r}")
+    done = {job.name: asyncio.Event() for job in jobs}
+    errors = {}
+
+    async def run(job: Job):
+        start = time.monotonic()
+        try:
+            source = None
+            if job.after is not None:
+                if not job.stream:
+                    await done[job.after].wait()
+                if job.after in errors:
+                    raise RuntimeError(f"upstream job {job.after!r} failed")
+                if job.stream:
+                    source = follow_jsonl(by_name[job.after].out_filepath, done[job.after], poll_interval)
+            await job.run(source)
+            if job.after in errors:  # 상위 작업이 도중에 실패하면 하위 작업의 출력도 완전하지 않습니다.
+                raise RuntimeError(f"upstream job {job.after!r} failed")
+            print(colored(f"job {job.name} finished in {time.monotonic() - start:.1f}s", 'green'))
+        except Exception as e:
+            errors[job.name] = e
+            print(colored(f"job {job.name} failed: {type(e).__name__}: {e}", 'red'))
+        finally:
+            done[job.name].set()
+
+    exporter = asyncio.ensure_future(export_periodically(metrics_filepath, metrics_interval)) if metrics_filepath else None
+    try:
+        async with shared_session():  # 모든 작업이 하나의 연결 풀을 함께 사용합니다.
+            await asyncio.gather(*[run(job) for job in jobs])
+    finally:
+        if exporter is not None:
+            exporter.cancel()
+            await asyncio.gather(exporter, return_exceptions=True)
+    return errors
+
+
+def run_jobs(jobs: Sequence[Job], **kwargs):
+    """arun_jobs 를 실행하는 동기 함수입니다. 실패한 작업이 있으면 RuntimeError 를 발생시킵니다."""
+    errors = asyncio.run(arun_jobs(jobs, **kwargs))
+    if errors:
+        raise RuntimeError(f"jobs {sorted(errors)} failed; rerun to resume them")
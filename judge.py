@@ -0,0 +1,313 @@
+# python
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+# 비동기
+import asyncio
+# 유틸리티 함수
+from termcolor import colored
+import fire
+import tqdm
+# framework
+from eval import Evaluate
+from pipeline import iter_jsonl
+from store import parse_filename, flatten
+from translate import Translate
+from metrics import metrics
+
+
+# 심판 모델에게 보내는 프롬프트. 마지막 줄의 [[A]], [[B]], [[C]] 로 판정을 읽습니다.
+JUDGE_TEMPLATE = """아래 지시문(과 입력)에 대한 두 어시스턴트의 답변 중 더 나은 답변을 고르세요.
+지시를 잘 따랐는지, 정확하고 유용한지, 한국어가 자연스러운지를 기준으로 판단하고, 답변의 순서나 길이에 영향을 받지 마세요.
+먼저 짧게 이유를 쓰고, 마지막 줄에 A 가 낫다면 [[A]], B 가 낫다면 [[B]], 비슷하다면 [[C]] 라고만 쓰세요.
+
+##Instruction:
+
+{instruction}
+
+##Input:
+
+{input}
+
+##Answer A:
+
+{first}
+
+##Answer B:
+
+{second}"""
+VERDICT = re.compile(r'\[\[([ABC])\]\]')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,  -- (심판 모델, 프롬프트, instruction, input, 첫 번째 답변, 두 번째 답변) 의 해시
+    verdict TEXT NOT NULL,  -- 'first', 'second', 'tie'
+    raw TEXT NOT NULL  -- 심판 모델의 답변
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    comparison TEXT NOT NULL,
+    id TEXT NOT NULL,
+    instance INTEGER NOT NULL,
+    key TEXT,  -- 판정한 내용의 해시. 판정하지 못했으면 NULL 이며 다음 실행에서 다시 판정합니다.
+    winner TEXT,  -- 'a', 'b', 'tie'
+    PRIMARY KEY (comparison, id, instance)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS totals (
+    comparison TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (comparison, winner)
+) WITHOUT ROWID;
+'''
+
+
+def parse_verdict(text: str) -> Optional[str]:
+    """심판 모델의 답변에서 마지막 판정을 읽어 'first', 'second', 'tie' 중 하나를 반환합니다. 판정이 없으면 None 을 반환합니다."""
+    found = VERDICT.findall(text or '')
+    return {'A': 'first', 'B': 'second', 'C': 'tie'}[found[-1]] if found else None
+
+
+def content_key(*parts) -> str:
+    """parts 를 sha256 으로 해시합니다."""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class JudgmentStore:
+    """
+    판정 결과를 저장하는 SQLite 저장소입니다.
+    verdicts 는 내용 해시별 판정을, pairs 는 비교(comparison)의 행별 판정 내용 해시와 승자를, totals 는 비교별 승자 수를 담습니다.
+    totals 는 행의 승자가 바뀔 때마다 바뀐 만큼만 갱신하므로, 승률을 다시 계산하기 위해 전체 행을 읽지 않습니다.
+    비동기 코드에서는 run 으로 전용 스레드 하나에서 호출하므로, 기본 executor 를 쓰는 다른 작업(캐시, writer 등)과 스레드를 다투지 않습니다.
+
+    Args:
+        path (str, optional): SQLite 파일 경로. Defaults to 'judgments.sqlite'.
+    """
+
+    def __init__(self, path: str = 'judgments.sqlite'):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='JudgmentStore')
+
+    async def run(self, func, *args):
+        """저장소의 메서드 func 를 전용 스레드에서 실행합니다. 예) await store.run(store.verdict, key)"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def pairs(self, comparison: str) -> Dict[Tuple[str, int], Optional[str]]:
+        """비교의 행별 판정 내용 해시를 반환합니다."""
+        with self.lock:
+            rows = self.conn.execute('SELECT id, instance, key FROM pairs WHERE comparison = ?', (comparison,)).fetchall()
+        return {(obj_id, instance): key for obj_id, instance, key in rows}
+
+    def verdict(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute('SELECT verdict FROM verdicts WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_verdict(self, key: str, verdict: str, raw: str):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO verdicts (key, verdict, raw) VALUES (?, ?, ?)', (key, verdict, raw))
+
+    def set_pair(self, comparison: str, obj_id: str, instance: int, key: Optional[str], winner: Optional[str]):
+        """행의 판정을 기록하고, 이전 승자와 새 승자의 수를 갱신합니다."""
+        with self.lock, self.conn:
+            self._discount(comparison, obj_id, instance)
+            self.conn.execute('''
+                INSERT INTO pairs (comparison, id, instance, key, winner) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (comparison, id, instance) DO UPDATE SET key = excluded.key, winner = excluded.winner
+            ''', (comparison, obj_id, instance, key, winner))
+            if winner is not None:
+                self.conn.execute('''
+                    INSERT INTO totals (comparison, winner, count) VALUES (?, ?, 1)
+                    ON CONFLICT (comparison, winner) DO UPDATE SET count = count + 1
+                ''', (comparison, winner))
+
+    def remove_pair(self, comparison: str, obj_id: str, instance: int):
+        """결과 파일에서 사라진 행을 지우고 승자 수에서 뺍니다."""
+        with self.lock, self.conn:
+            self._discount(comparison, obj_id, instance)
+            self.conn.execute('DELETE FROM pairs WHERE comparison = ? AND id = ? AND instance = ?', (comparison, obj_id, instance))
+
+    def totals(self, comparison: str) -> Dict[str, int]:
+        """비교의 승자('a', 'b', 'tie')별 행 수를 반환합니다."""
+        with self.lock:
+            rows = self.conn.execute('SELECT winner, count FROM totals WHERE comparison = ?', (comparison,)).fetchall()
+        return {winner: count for winner, count in rows}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.conn.close()
+
+    def _discount(self, comparison, obj_id, instance):
+        row = self.conn.execute('SELECT winner FROM pairs WHERE comparison = ? AND id = ? AND instance = ?', (comparison, obj_id, instance)).fetchone()
+        if row and row[0] is not None:
+            self.conn.execute('UPDATE totals SET count = count - 1 WHERE comparison = ? AND winner = ?', (comparison, row[0]))
+
+
+def read_outputs(filepath: str) -> Dict[Tuple[str, int], tuple]:
+    """평가 결과 파일을 읽어 {(id, instance): (instruction, input, output)} 를 반환합니다."""
+    rows = {}
+    for obj in iter_jsonl(filepath, Translate.append_id):
+        for instance, instruction, input, output in flatten(obj):
+            rows[(str(obj['id']), instance)] = (instruction or '', input or '', output)
+    return rows
+
+
+class PairwiseJudge:
+    """
+    두 평가 모델의 답변을 심판 모델(Evaluate 객체)로 비교하는 클래스입니다.
+    답변의 순서를 바꾼 두 판정을 동시에 요청하고, 두 판정이 같으면 그 승자를, 다르면(순서에 따라 바뀌면) 무승부로 봅니다.
+    판정은 (심판 모델, 프롬프트, instruction, input, 답변 A, 답변 B) 의 해시로 저장하므로, 다시 실행하면 내용이 바뀐 행만 판정합니다.
+
+    Args:
+        judge (Evaluate): 심판 모델 (ChatGPTEval, GPT4Eval 등). 판정 프롬프트를 instruction 으로 받습니다.
+        store (JudgmentStore, optional): 판정 저장소. Defaults to JudgmentStore().
+        template (str, optional): 판정 프롬프트 템플릿. Defaults to JUDGE_TEMPLATE.
+        max_concurrency (int, optional): 동시에 비교하는 행 수의 상한. 실제 요청 수는 심판 모델의 제한기가 조절합니다. Defaults to 64.
+    """
+
+    def __init__(self, judge: Evaluate, store: Optional[JudgmentStore] = None, template=JUDGE_TEMPLATE, max_concurrency=64):
+        self.judge = judge
+        self.store = store if store is not None else JudgmentStore()
+        self.template = template
+        self.max_concurrency = max_concurrency
+        self.name = f"{getattr(judge, 'backend', '')}:{getattr(judge, 'model_name', type(judge).__name__)}"
+
+    def pair_key(self, instruction: str, input: str, output_a: str, output_b: str) -> str:
+        """행의 판정 내용 해시. 심판 모델, 프롬프트, 입력, 두 답변 중 하나라도 바뀌면 달라집니다."""
+        return content_key('pair', self.name, self.template, instruction, input, output_a, output_b)
+
+    async def judge_order(self, instruction: str, input: str, first: str, second: str) -> Optional[str]:
+        """
+        first 를 A, second 를 B 로 보여주고 판정합니다. 같은 내용을 판정한 적이 있으면 저장된 판정을 반환합니다.
+
+        Returns:
+            Optional[str]: 'first', 'second', 'tie'. 심판 모델의 답변에서 판정을 읽지 못하면 None (저장하지 않습니다)
+        """
+        key = content_key('order', self.name, self.template, instruction, input, first, second)
+        verdict = await self.store.run(self.store.verdict, key)
+        if verdict is not None:
+            return verdict
+        prompt = self.template.format(instruction=instruction, input=input or '(없음)', first=first, second=second)
+        raw = await self.judge(prompt, '')
+        verdict = parse_verdict(raw)
+        metrics.inc('judgments_total', backend=self.name, verdict=verdict or 'invalid')
+        if verdict is not None:
+            await self.store.run(self.store.put_verdict, key, verdict, raw)
+        return verdict
+
+    async def compare(self, instruction: str, input: str, output_a: str, output_b: str) -> Optional[str]:
+        """
+        두 답변을 순서를 바꿔 두 번 판정합니다.
+
+        Returns:
+            Optional[str]: 'a', 'b', 'tie'. 어느 한 판정이라도 읽지 못하면 None
+        """
+        if output_a.strip() == output_b.strip():
+            return 'tie'  # 같은 답변은 판정하지 않습니다.
+        forward, backward = await asyncio.gather(
+            self.judge_order(instruction, input, output_a, output_b),
+            self.judge_order(instruction, input, output_b, output_a))
+        if forward is None or backward is None:
+            return None
+        forward = {'first': 'a', 'second': 'b'}.get(forward, 'tie')
+        backward = {'first': 'b', 'second': 'a'}.get(backward, 'tie')
+        return forward if forward == backward else 'tie'
+
+    async def ajudge_files(self, filepath_a: str, filepath_b: str, comparison: Optional[str] = None, verbose=True) -> dict:
+        """
+        두 평가 결과 파일(같은 입력 파일을 서로 다른 모델로 답변한 파일)의 답변을 행마다 비교하고, 누적 승률을 반환합니다.
+        지난 실행과 내용이 같은 행은 요청하지 않으며, 결과 파일에서 사라진 행은 승률에서 뺍니다.
+
+        Args:
+            filepath_a, filepath_b (str): '..._eval_<model>.jsonl' 파일 경로
+            comparison (str, optional): 비교 이름. Defaults to '<dataset>_<translator>:<model_a>_vs_<model_b>'.
+            verbose (bool, optional): 진행 상황 출력 여부. Defaults to True.
+
+        Returns:
+            dict: comparison, a, b, judged (이번에 판정한 행 수), reused (재사용한 행 수), wins_a, wins_b, ties, win_rate_a, win_rate_b
+        """
+        names_a, names_b = parse_filename(filepath_a), parse_filename(filepath_b)
+        if comparison is None:
+            comparison = f"{names_a['dataset']}_{names_a['translator']}:{names_a['evaluator']}_vs_{names_b['evaluator']}"
+        rows_a, rows_b = read_outputs(filepath_a), read_outputs(filepath_b)
+        stored = self.store.pairs(comparison)
+
+        changed, reused = [], 0
+        for row, (instruction, input, output_a) in rows_a.items():
+            output_b = rows_b.get(row, (None, None, None))[2]
+            if not isinstance(output_a, str) or not isinstance(output_b, str):
+                continue  # 한쪽 답변이 아직 없는 행
+            key = self.pair_key(instruction, input, output_a, output_b)
+            if stored.pop(row, None) != key:
+                changed.append((row, key, instruction, input, output_a, output_b))
+            else:
+                reused += 1
+        for obj_id, instance in stored:  # 결과 파일에서 사라진 행
+            self.store.remove_pair(comparison, obj_id, instance)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = tqdm.tqdm(total=len(changed), disable=not verbose)
+
+        async def judge_row(row, key, instruction, input, output_a, output_b):
+            async with semaphore:
+                winner = await self.compare(instruction, input, output_a, output_b)
+            await self.store.run(self.store.set_pair, comparison, *row, key if winner else None, winner)
+            progress.update(1)
+
+        try:
+            await asyncio.gather(*[judge_row(*item) for item in changed])
+        finally:
+            progress.close()
+
+        totals = self.store.totals(comparison)
+        wins_a, wins_b, ties = totals.get('a', 0), totals.get('b', 0), totals.get('tie', 0)
+        total = wins_a + wins_b + ties
+        result = dict(comparison=comparison, a=names_a['evaluator'], b=names_b['evaluator'],
+                      judged=len(changed), reused=reused, wins_a=wins_a, wins_b=wins_b, ties=ties,
+                      # 무승부는 양쪽에 반씩 나눕니다.
+                      win_rate_a=(wins_a + ties / 2) / total if total else 0.0,
+                      win_rate_b=(wins_b + ties / 2) / total if total else 0.0)
+        if verbose:
+            report(result)
+        return result
+
+
+def report(result: dict):
+    """비교 결과를 출력합니다."""
+    print(colored(f"[{result['comparison']}] judged {result['judged']} changed pairs, reused {result['reused']}", 'yellow'))
+    print(colored(f"  {result['a']}: {result['wins_a']} wins ({result['win_rate_a']:.1%}), "
+                  f"{result['b']}: {result['wins_b']} wins ({result['win_rate_b']:.1%}), ties: {result['ties']}", 'green'))
+
+
+def main(filepath_a: str = 'user_oriented_instructions_deepl_ko_eval_chatgpt.jsonl',
+         filepath_b: str = 'user_oriented_instructions_deepl_ko_eval_gpt4.jsonl',
+         judge='gpt4', db='judgments.sqlite', max_concurrency=64):
+    """
+    두 평가 결과 파일의 답변을 심판 모델로 비교합니다. 다시 실행하면 답변이 바뀐 행만 판정합니다.
+
+    예) python judge.py user_oriented_instructions_deepl_ko_eval_chatgpt.jsonl user_oriented_instructions_deepl_ko_eval_gpt4.jsonl --judge=gpt4
+    """
+    from chatgpt import ChatGPTEval
+    from gpt4 import GPT4Eval
+    from hedging import HedgedEvaluate
+    from httppool import with_session
+
+    judges = {'chatgpt': ChatGPTEval, 'gpt4': GPT4Eval}
+    store = JudgmentStore(db)
+    try:
+        pairwise = PairwiseJudge(HedgedEvaluate(judges[judge]()), store, max_concurrency=max_concurrency)
+        asyncio.run(with_session(pairwise.ajudge_files(filepath_a, filepath_b)))
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
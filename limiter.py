@@ -0,0 +1,251 @@
+# python
+from contextlib import asynccontextmanager
+import time
+# 비동기
+import asyncio
+# 유틸리티 함수
+from termcolor import colored
+# framework
+from metrics import metrics
+
+
+# 백엔드별 기본 한도 (requests-per-minute, tokens-per-minute). configure_limiter 로 바꿀 수 있습니다.
+DEFAULT_LIMITS = {
+    'openai:gpt-3.5-turbo': dict(rpm=3500, tpm=90000),
+    'openai:gpt-4': dict(rpm=200, tpm=40000),
+    'deepl:deepl': dict(),
+}
+
+# 한도 초과(429), 과부하(503), 타임아웃으로 볼 예외 이름들
+OVERLOAD_ERRORS = {
+    'RateLimitError',
+    'ServiceUnavailableError',
+    'Timeout',
+    'TimeoutError',
+    'TooManyRequestsException',
+    'QuotaExceededException',
+}
+
+
+def is_overload_error(e: BaseException) -> bool:
+    """예외가 한도 초과, 과부하 또는 타임아웃에 의한 것인지 판단합니다."""
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    status = getattr(e, 'status', None) or getattr(e, 'http_status', None)
+    if status in (429, 503):
+        return True
+    return type(e).__name__ in OVERLOAD_ERRORS
+
+
+# 추론 결과 길이를 미리 알 수 없을 때 사용하는 completion 토큰 추정치
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 대략적인 토큰 수를 추정합니다.
+    영문 등 ASCII 문자는 4글자에 1토큰, 한글 등 그 외 문자는 1글자에 1토큰으로 계산합니다.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class TokenBucket:
+    """
+    분당 per_minute 개의 토큰이 채워지는 토큰 버킷입니다. 최대 burst 초 분량까지 쌓입니다.
+
+    Args:
+        per_minute (float): 분당 허용량
+        burst (float, optional): 한 번에 쓸 수 있는 최대 분량(초 단위). Defaults to 10.
+    """
+
+    def __init__(self, per_minute: float, burst: float = 10):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._loop = None
+        self._lock = None
+
+    async def acquire(self, n: float = 1):
+        """
+        n 개의 토큰을 사용할 수 있을 때까지 기다린 뒤 차감합니다.
+        n 이 버킷 크기보다 크면 버킷이 가득 찼을 때 차감하여 잔량이 음수가 되도록 합니다.
+        """
+        async with self._get_lock():
+            need = min(n, self.capacity)
+            while True:
+                self._refill()
+                if self.tokens >= need:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((need - self.tokens) / self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _get_lock(self):
+        # asyncio 동기화 객체는 이벤트 루프에 묶이므로, 루프가 바뀌면 새로 만듭니다.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        return self._lock
+
+
+class AdaptiveLimiter:
+    """
+    백엔드별 요청 속도 제한기입니다.
+    requests-per-minute, tokens-per-minute 을 토큰 버킷으로 지키면서,
+    응답이 정상이면 동시성을 조금씩 늘리고(additive increase), 한도 초과/타임아웃이면 크게 줄입니다(multiplicative decrease).
+
+    Args:
+        name (str): 제한기 이름 (예: 'openai:gpt-4')
+        rpm (float, optional): 분당 최대 요청 수
+        tpm (float, optional): 분당 최대 토큰 수 (추정치 기준)
+        concurrency (int, optional): 시작 동시성. Defaults to 8.
+        min_concurrency (int, optional): 최소 동시성. Defaults to 1.
+        max_concurrency (int, optional): 최대 동시성. Defaults to 256.
+        backoff (float, optional): 한도 초과 시 동시성에 곱할 값. Defaults to 0.5.
+        cooldown (float, optional): 연속된 감소 사이의 최소 간격(초). Defaults to 5.
+
+    Attributes:
+        limit (float): 현재 동시성 한도
+    """
+
+    def __init__(self, name: str, rpm=None, tpm=None, concurrency=8, min_concurrency=1, max_concurrency=256, backoff=0.5, cooldown=5.0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.inflight = 0
+        self.successes = 0
+        self.overloads = 0
+        self.last_backoff = 0.0
+        self._loop = None
+        self._cond = None
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """
+        요청 하나를 보낼 자리를 얻는 비동기 context manager 입니다.
+        블록 안에서 한도 초과/타임아웃 예외가 발생하면 동시성을 줄이고, 정상 종료되면 동시성을 늘립니다.
+
+        Args:
+            tokens (int, optional): 요청의 추정 토큰 수 (prompt + completion)
+        """
+        cond = self._get_condition()
+        waited = time.perf_counter()
+        async with cond:
+            await cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+        metrics.add('inflight_requests', 1, backend=self.name)
+        try:
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+            started = time.perf_counter()
+            metrics.observe('limiter_wait_seconds', started - waited, backend=self.name)  # 동시성/rpm/tpm 한도로 기다린 시간
+            yield
+        except BaseException as e:
+            metrics.inc('request_errors_total', backend=self.name, kind='overload' if is_overload_error(e) else type(e).__name__)
+            if is_overload_error(e):
+                self._decrease()
+            raise
+        else:
+            metrics.observe('request_seconds', time.perf_counter() - started, backend=self.name)
+            self._increase()
+        finally:
+            metrics.add('inflight_requests', -1, backend=self.name)
+            async with cond:
+                self.inflight -= 1
+                cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'concurrency': int(self.limit),
+            'inflight': self.inflight,
+            'successes': self.successes,
+            'overloads': self.overloads,
+        }
+
+    def _increase(self):
+        self.successes += 1
+        # 동시성 한도만큼 요청이 성공할 때마다 한도를 1 늘립니다.
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self):
+        self.overloads += 1
+        now = time.monotonic()
+        if now - self.last_backoff < self.cooldown:
+            return  # 같은 과부하 구간에서 여러 번 줄이지 않습니다.
+        self.last_backoff = now
+        before = int(self.limit)
+        self.limit = max(self.min_concurrency, self.limit * self.backoff)
+        print(colored(f"[{self.name}] rate limited: concurrency {before} -> {int(self.limit)}", 'red'))
+
+    def _get_condition(self):
+        # asyncio 동기화 객체는 이벤트 루프에 묶이므로, 루프가 바뀌면 새로 만듭니다.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._cond = loop, asyncio.Condition()
+        return self._cond
+
+
+# 프로세스 전체에서 공유하는 백엔드별 제한기
+limiters = {}
+# 이 프로세스가 사용할 rpm/tpm 비율. 여러 프로세스(shard)가 한도를 나눠 쓸 때 1/shard 수로 설정합니다.
+rate_share = 1.0
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """
+    이름(예: 'openai:gpt-4')에 해당하는 제한기를 반환합니다. 없으면 DEFAULT_LIMITS 로 새로 만듭니다.
+    같은 백엔드/모델을 사용하는 모든 객체는 하나의 제한기를 공유합니다.
+    """
+    if name not in limiters:
+        limiters[name] = AdaptiveLimiter(name, **_shared(DEFAULT_LIMITS.get(name, {})))
+    return limiters[name]
+
+
+def configure_limiter(name: str, **kwargs) -> AdaptiveLimiter:
+    """
+    이름에 해당하는 제한기를 주어진 설정(rpm, tpm, concurrency 등)으로 새로 만듭니다.
+    백엔드 객체는 생성 시점에 제한기를 가져가므로, 백엔드 객체를 만들기 전에 호출해야 합니다.
+    """
+    limiters[name] = AdaptiveLimiter(name, **_shared({**DEFAULT_LIMITS.get(name, {}), **kwargs}))
+    return limiters[name]
+
+
+def set_rate_share(share: float):
+    """
+    이 프로세스가 사용할 rpm/tpm 비율을 설정합니다. 이미 만들어진 제한기는 버리므로, 백엔드 객체를 만들기 전에 호출해야 합니다.
+
+    Args:
+        share (float): 전체 한도 중 이 프로세스의 몫 (0 < share <= 1)
+    """
+    global rate_share
+    rate_share = share
+    limiters.clear()
+
+
+def _shared(limits: dict) -> dict:
+    return {k: v * rate_share if k in ('rpm', 'tpm') and v else v for k, v in limits.items()}
+
+
+def report_limiters():
+    """각 제한기가 도달한 동시성 수준을 출력합니다."""
+    for limiter in limiters.values():
+        stats = limiter.stats()
+        latency = metrics.histograms.get(('request_seconds', (('backend', limiter.name),)))
+        timing = f", p50: {latency.quantile(0.5):.2f}s, p99: {latency.quantile(0.99):.2f}s" if latency else ''
+        print(colored(f"[{stats['name']}] concurrency: {stats['concurrency']} (successes: {stats['successes']}, overloads: {stats['overloads']}{timing})", 'yellow'))
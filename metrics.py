@@ -0,0 +1,191 @@
+# python
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+# 비동기
+import asyncio
+
+
+# 지연 시간(초) 히스토그램의 버킷 경계. Prometheus 기본값보다 긴 LLM 응답 시간을 고려했습니다.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """
+    고정된 버킷 경계로 값을 세는 히스토그램입니다. observe 는 버킷 탐색 한 번과 덧셈 몇 번이므로 초당 수백~수천 번 호출해도 부담이 없습니다.
+
+    Args:
+        buckets (Tuple[float, ...], optional): 오름차순 버킷 상한. Defaults to LATENCY_BUCKETS.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 마지막 칸은 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """버킷 안에서 선형 보간하여 q 분위수를 추정합니다."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    프로세스 전체의 카운터, 게이지, 히스토그램 모음입니다. 각 값은 (이름, 라벨) 으로 구분합니다.
+    메인 이벤트 루프 외에도 background.BackgroundLoop, translate_jsonl 의 worker 스레드 등 여러 스레드에서 갱신하므로,
+    읽고 더하는 갱신과 요약은 잠금 하나로 묶습니다. (갱신은 dict 조회와 덧셈뿐이라 잠금을 오래 잡지 않습니다)
+
+    예) metrics.observe('request_seconds', 0.8, backend='openai:gpt-4')
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """게이지에 value 를 더합니다. (in-flight 수 등)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self._clear()
+
+    def summary(self) -> dict:
+        """모든 값을 json 으로 직렬화할 수 있는 dict 로 반환합니다."""
+        def rows(values, convert=lambda v: v):
+            return [{'name': name, 'labels': dict(labels), 'value': convert(value)} for (name, labels), value in sorted(values.items())]
+        with self.lock:
+            return {
+                'time': time.time(),
+                'uptime': time.time() - self.started,
+                'counters': rows(self.counters),
+                'gauges': rows(self.gauges),
+                'histograms': rows(self.histograms, Histogram.summary),
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus textfile collector 형식의 문자열을 반환합니다."""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                declare(f'selfinstruct_{name}', 'counter')
+                lines.append(f'selfinstruct_{name}{_labels(labels)} {value}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                declare(f'selfinstruct_{name}', 'gauge')
+                lines.append(f'selfinstruct_{name}{_labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'selfinstruct_{name}'
+                declare(metric, 'histogram')
+                cumulative = 0
+                for bound, n in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{metric}_sum{_labels(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_filepath: Optional[str] = None, prometheus_filepath: Optional[str] = None):
+        """
+        json 요약과 Prometheus textfile 을 기록합니다. 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 이름을 바꿉니다.
+        """
+        if json_filepath:
+            _write_atomic(json_filepath, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+        if prometheus_filepath:
+            _write_atomic(prometheus_filepath, self.prometheus())
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(filepath: str, text: str):
+    tmp = filepath + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, filepath)
+
+
+# 프로세스 전체에서 공유하는 지표
+metrics = Metrics()
+
+
+def record_tokens(backend: str, prompt_tokens: int, completion_tokens: int):
+    """백엔드별 prompt/completion 토큰 수를 기록합니다."""
+    metrics.inc('prompt_tokens_total', prompt_tokens, backend=backend)
+    metrics.inc('completion_tokens_total', completion_tokens, backend=backend)
+
+
+async def export_periodically(metrics_filepath: str, interval=10.0):
+    """
+    interval 초마다 metrics_filepath (json) 와 확장자를 .prom 으로 바꾼 Prometheus textfile 을 기록하는 코루틴입니다.
+    취소되면 마지막으로 한 번 더 기록합니다.
+    """
+    prometheus_filepath = os.path.splitext(metrics_filepath)[0] + '.prom'
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            metrics.export(metrics_filepath, prometheus_filepath)
+    finally:
+        metrics.export(metrics_filepath, prometheus_filepath)
@@ -0,0 +1,130 @@
+# python
+from functools import partial
+from typing import List, Optional, Tuple
+import json
+# 비동기
+import asyncio
+# OpenAI ChatGPT를 langchain 라이브러리를 이용하여 번역
+from langchain.prompts.chat import (
+    ChatPromptTemplate,
+    SystemMessagePromptTemplate,
+    HumanMessagePromptTemplate,
+)
+# framework
+from batching import MicroBatcher
+from endpoints import chains
+from limiter import estimate_tokens
+from metrics import metrics, record_tokens
+
+
+# 여러 문자열을 한 번에 번역할 때 시스템 메시지 뒤에 덧붙이는 지시문
+PACK_INSTRUCTION = ("You will receive a JSON array of strings. Translate every element independently and reply with only a JSON array "
+                    "of the translations: the same number of elements, in the same order, with no other text.")
+
+
+def pack_segments(texts: List[str]) -> str:
+    """문자열들을 JSON 배열 하나로 묶습니다. 문자열 안의 따옴표나 개행은 JSON 이스케이프로 구분되므로 경계가 섞이지 않습니다."""
+    return json.dumps(texts, ensure_ascii=False)
+
+
+def unpack_segments(response: str, count: int) -> Optional[List[str]]:
+    """
+    모델의 응답에서 JSON 배열을 꺼내 count 개의 문자열 리스트로 반환합니다.
+    코드 블록(```json) 이나 앞뒤 설명이 붙어 있어도 첫 '[' 와 마지막 ']' 사이를 읽으며, 형식이나 개수가 맞지 않으면 None 을 반환합니다.
+    """
+    start, end = response.find('['), response.rfind(']')
+    if start < 0 or end < start:
+        return None
+    try:
+        segments = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(segments, list) or len(segments) != count or not all(isinstance(s, str) for s in segments):
+        return None
+    return segments
+
+
+class PackedTranslate:
+    """
+    ChatGPT/GPT4 번역기가 동시에 들어온 짧은 문자열 여러 개를 하나의 chat completion 으로 번역하도록 하는 mixin 입니다.
+    시스템 프롬프트를 한 번만 보내고 왕복 횟수도 줄어들므로, 같은 TPM/RPM 한도에서 더 많은 문자열을 번역할 수 있습니다.
+    응답의 문자열 개수가 맞지 않으면 해당 묶음은 하나씩 따로 번역합니다.
+    묶어서 번역하면 프롬프트가 달라져 번역 결과도 달라질 수 있으므로 기본값은 꺼져 있습니다. (pack=True 로 켭니다)
+
+    사용하는 클래스는 translate_one(original_text, target_lang) 코루틴과 limiter(endpoints.EndpointPool), template 속성을 가져야 합니다.
+    """
+
+    def init_packing(self, chats: dict, system_template: str, pack=False, max_pack_segments=20, max_pack_tokens=1500, pack_delay=0.01):
+        """
+        Args:
+          chats (dict): 엔드포인트 이름별 ChatOpenAI 객체 (endpoints.chat_models 참고)
+          system_template (str): 번역기의 시스템 메시지 템플릿 ({target_lang} 포함)
+          pack (bool): 여러 문자열을 묶어서 번역할지 여부 (default: False)
+          max_pack_segments (int): 한 요청에 묶을 최대 문자열 수 (default: 20)
+          max_pack_tokens (int): 한 요청에 묶을 원문의 최대 추정 토큰 수. 응답도 비슷한 길이이므로 completion 한도를 넘지 않도록 합니다. (default: 1500)
+          pack_delay (float): 묶음을 모으기 위해 기다리는 최대 시간(초) (default: 0.01)
+        """
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(system_template + ' ' + PACK_INSTRUCTION),
+            HumanMessagePromptTemplate.from_template('{segments}'),
+        ])
+        self.packed_chains = chains(chats, prompt)
+        self.pack = pack
+        # 묶어서 번역한 결과의 캐시 키에 쓰는 템플릿. 묶음 방식과 지시문을 포함하여 따로 번역한 결과(template)와 구분합니다.
+        self.packed_template = f"{self.template}\n[packed] {PACK_INSTRUCTION}"
+        self.pack_options = dict(max_items=max_pack_segments, max_bytes=max_pack_tokens, max_delay=pack_delay, size_func=estimate_tokens)
+        self.packers = {}  # target_lang 별 MicroBatcher
+
+    async def __call__(self, original_text: str, target_lang: str = 'Korean') -> str:
+        """
+        입력된 original_text를 target_lang으로 번역하는 함수입니다. pack 이 켜져 있으면 동시에 들어온 문자열들과 묶어서 번역합니다.
+
+        Args:
+          original_text (str): 번역할 영어 텍스트
+          target_lang (str): 목표 언어 (default: 'Korean')
+
+        Returns:
+          str: 입력된 original_text가 target_lang으로 번역된 결과
+        """
+        return (await self.translate_with_mode(original_text, target_lang))[0]
+
+    async def translate_with_mode(self, original_text: str, target_lang: str = 'Korean') -> Tuple[str, bool]:
+        """
+        __call__ 과 같이 번역하고, 실제로 묶어서 번역했는지도 함께 반환합니다.
+        pack 이 켜져 있어도 혼자 모인 문자열이나 응답을 나눌 수 없었던 묶음은 따로 번역되므로, 캐시 키는 이 값으로 정합니다.
+
+        Returns:
+          Tuple[str, bool]: (번역 결과, 묶어서 번역했는지 여부)
+        """
+        # original_text가 빈 문자열인 경우 바로 반환합니다.
+        if not original_text or original_text.strip() == "":
+            return original_text, False
+        if not self.pack:
+            return await self.translate_one(original_text, target_lang), False
+        if target_lang not in self.packers:
+            self.packers[target_lang] = MicroBatcher(partial(self.translate_packed, target_lang=target_lang), **self.pack_options)
+        return await self.packers[target_lang].submit(original_text)
+
+    async def translate_packed(self, texts: List[str], target_lang: str = 'Korean') -> List[Tuple[str, bool]]:
+        """
+        여러 문자열을 한 번의 요청으로 번역합니다. 응답을 나눌 수 없으면 하나씩 따로 번역합니다.
+
+        Args:
+          texts (List[str]): 번역할 텍스트 리스트
+          target_lang (str): 목표 언어
+
+        Returns:
+          List[Tuple[str, bool]]: texts 와 같은 순서의 (번역된 텍스트, 묶어서 번역했는지 여부) 리스트
+        """
+        if len(texts) == 1:
+            return [(await self.translate_one(texts[0], target_lang), False)]
+        segments = pack_segments(texts)
+        async with self.limiter.slot(2 * estimate_tokens(segments)) as endpoint:
+            response = await self.packed_chains[endpoint.name].arun({'text': '', 'segments': segments, 'target_lang': target_lang})
+        record_tokens(self.limiter.name, estimate_tokens(segments), estimate_tokens(response))
+        metrics.inc('packed_segments_total', len(texts), backend=self.limiter.name)
+        results = unpack_segments(response, len(texts))
+        if results is None:
+            metrics.inc('packing_fallbacks_total', backend=self.limiter.name)
+            return [(result, False) for result in await asyncio.gather(*[self.translate_one(text, target_lang) for text in texts])]
+        return [(result, True) for result in results]
@@ -0,0 +1,255 @@
+# python
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import time
+# 비동기
+import asyncio
+# jsonl 파일 핸들링
+import jsonlines
+# 유틸리티 함수
+from termcolor import colored
+import tqdm
+# framework
+from checkpoint import Checkpoint
+from fanout import request_slots
+from limiter import report_limiters
+from httppool import shared_session
+from metrics import metrics, export_periodically
+from retry import RetryPolicy, DeadLetters
+from writer import JsonlWriter
+
+
+def shard_of(obj_id, count: int) -> int:
+    """id 를 count 개의 shard 중 하나에 배정합니다. 프로세스나 기계가 달라도 같은 결과를 얻도록 해시를 사용합니다."""
+    digest = hashlib.md5(json.dumps(obj_id, ensure_ascii=False).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def iter_jsonl(in_filepath: str, prepare: Optional[Callable[[int, dict], dict]] = None) -> Iterator[dict]:
+    """
+    jsonl 파일을 한 줄씩 읽어 객체를 하나씩 돌려주는 제너레이터입니다. 파일 전체를 메모리에 올리지 않습니다.
+
+    Args:
+        in_filepath (str): 입력 jsonl 파일 경로
+        prepare (Callable[[int, dict], dict], optional): (줄 번호, 객체)를 받아 전처리된 객체를 반환하는 함수
+
+    Yields:
+        dict: 입력 파일의 객체
+    """
+    with jsonlines.open(in_filepath) as reader:
+        for idx, obj in enumerate(reader):
+            yield prepare(idx, obj) if prepare else obj
+
+
+async def _aiter(iterable: Iterable) -> AsyncIterator:
+    for item in iterable:
+        yield item
+
+
+async def arun_jsonl(
+        in_filepath: str,
+        out_filepath: str,
+        task: Callable[[dict], Awaitable[dict]],
+        max_concurrency=10,
+        verbose=True,
+        dev=False,
+        increment=True,
+        prepare: Optional[Callable[[int, dict], dict]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        dead_letter_filepath: Optional[str] = None,
+        ordered=False,
+        flush_interval=0.5,
+        fsync='close',
+        shard: Optional[Tuple[int, int]] = None,
+        source: Optional[AsyncIterator[dict]] = None,
+        metrics_filepath: Optional[str] = None,
+        metrics_interval=10.0,
+        schedule='file',
+        weigh: Optional[Callable[[dict], float]] = None):
+    """
+    입력 jsonl 파일을 스트리밍으로 읽어 각 객체에 task를 적용하고, 끝나는 대로 출력 파일에 기록하는 비동기 함수입니다.
+
+    reader 코루틴이 크기가 제한된 큐를 채우고, max_concurrency 개의 worker가 큐를 비웁니다.
+    따라서 입력 파일의 크기와 상관없이 메모리에 올라가는 객체 수와 태스크 수는 O(max_concurrency)로 유지됩니다.
+
+    task 가 실패한 레코드는 retry_policy 에 따라 잠시 뒤 다시 큐에 들어가며, 그동안 worker 는 다른 레코드를 처리합니다.
+    끝내 실패한 레코드는 dead-letter 파일에 기록되고, 출력 파일에는 기록되지 않으므로 increment 모드로 다시 실행하면 재처리됩니다.
+
+    Args:
+        in_filepath (str): 입력 파일 경로
+        out_filepath (str): 출력 파일 경로
+        task (Callable[[dict], Awaitable[dict]]): 객체 하나를 처리하여 결과 객체를 반환하는 코루틴 함수
+        max_concurrency (int, optional): 동시에 실행되는 worker 수. Defaults to 10.
+        verbose (bool, optional): verbose 여부. Defaults to True.
+        dev (bool, optional): 개발자 모드 여부 (앞의 5개 객체만 처리). Defaults to False.
+        increment (bool, optional): 증분 모드 여부. Defaults to True.
+            out_filepath + '.ckpt' manifest 를 이용하여 이미 처리된 id 는 건너뜁니다.
+        prepare (Callable[[int, dict], dict], optional): 읽은 객체를 task 에 넘기기 전에 적용할 함수
+        retry_policy (RetryPolicy, optional): 레코드 단위 재시도 정책. 기본값은 RetryPolicy()
+        dead_letter_filepath (str, optional): 끝내 실패한 레코드를 기록할 파일 경로. 기본값은 out_filepath + '.dead.jsonl'
+        ordered (bool, optional): 출력 파일을 입력 순서대로 기록할지 여부. Defaults to False.
+        flush_interval (float, optional): 결과를 모아 기록하는 최대 간격(초). Defaults to 0.5.
+        fsync (str, optional): 출력 파일 fsync 정책 ('never', 'close', 'flush'). Defaults to 'close'.
+        shard (Tuple[int, int], optional): (index, count). id 의 해시로 나눈 count 개의 shard 중 index 번째만 처리합니다.
+        source (AsyncIterator[dict], optional): in_filepath 대신 객체를 읽어 올 비동기 이터레이터 (예: jobs.follow_jsonl)
+        metrics_filepath (str, optional): 지표를 기록할 json 파일 경로. 같은 이름의 .prom 파일에 Prometheus textfile 도 기록합니다.
+        metrics_interval (float, optional): 지표를 기록하는 간격(초). Defaults to 10.
+        schedule (str, optional): 레코드를 처리하는 순서. Defaults to 'file'.
+            'file' 은 입력 순서대로, 'longest' 는 weigh 가 큰(오래 걸리는) 레코드부터 처리합니다. (LPT 스케줄링)
+            'longest' 는 처리할 레코드를 모두 읽어 정렬하므로 source 로 다른 작업의 결과를 따라 읽는 경우에는 입력 순서를 따릅니다.
+        weigh (Callable[[dict], float], optional): 'longest' 에서 레코드의 예상 처리 시간에 비례하는 값을 반환하는 함수
+    """
+    if schedule not in ('file', 'longest'):
+        raise ValueError(f"unknown schedule: {schedule!r}")
+    if schedule == 'longest' and weigh is None:
+        raise ValueError("schedule='longest' requires weigh")
+    checkpoint = Checkpoint(out_filepath)  # 처리 완료된 id 와 바이트 위치를 기록하는 manifest
+    processed_ids = set()
+    if increment and os.path.exists(out_filepath):  # increment 가 True 이고 out_filepath 가 존재하는 경우
+        processed_ids = checkpoint.recover()  # manifest 로부터 이미 처리한 id 집합을 얻고, 잘린 꼬리는 제거합니다.
+        mode = 'a'  # 파일을 추가 모드로 열기 (이어서 쓰기 가능)
+    else:
+        checkpoint.reset()
+        mode = 'w'
+
+    async def filtered():
+        records = source if source is not None else _aiter(iter_jsonl(in_filepath))
+        idx = taken = 0
+        async for obj in records:
+            if prepare is not None:
+                obj = prepare(idx, obj)
+            idx += 1
+            if processed_ids and obj['id'] in processed_ids:
+                continue  # 이미 처리한 id 는 건너뜁니다.
+            if shard is not None and shard_of(obj['id'], shard[1]) != shard[0]:
+                continue  # 이 shard 에 속한 id 만 처리합니다.
+            if dev and taken >= 5:
+                break  # 개발자 모드인 경우, 데이터의 일부만 변환하도록 하여 테스트할 수 있습니다.
+            taken += 1
+            yield obj
+
+    async def select():
+        if schedule == 'file' or source is not None:
+            async for obj in filtered():
+                yield obj
+            return
+        # 긴 레코드를 먼저 시작하면, 끝부분에 남은 긴 레코드 하나가 전체 소요 시간을 늘리는 일이 줄어듭니다.
+        records = [obj async for obj in filtered()]
+        records.sort(key=weigh, reverse=True)
+        for obj in records:
+            yield obj
+
+    if verbose:
+        print(colored(f"in_filepath: {in_filepath}", 'yellow'))  # 입력 파일 경로 출력
+        print(colored(f"out_filepath: {out_filepath}", 'yellow'))  # 출력 파일 경로 출력
+        print(colored(f"max_concurrency: {max_concurrency}", 'yellow'))  # 최대 max_concurrency 수 출력
+
+    job = os.path.basename(out_filepath)  # 지표 라벨
+    policy = retry_policy if retry_policy is not None else RetryPolicy()
+    dead_letters = DeadLetters(dead_letter_filepath or out_filepath + '.dead.jsonl')
+
+    queue = asyncio.Queue()
+    # reader 가 worker 보다 너무 앞서 나가지 않도록 처리 중인(대기, 실행, 재시도 대기) 레코드 수를 제한합니다.
+    # 재시도를 기다리는 레코드도 이 안에 포함되므로, 재시도가 쌓이면 새 레코드를 덜 읽을 뿐 worker 는 막히지 않습니다.
+    window = asyncio.Semaphore(max_concurrency * 2 + (policy.max_pending or max_concurrency))
+    retry_tasks = set()
+    progress = tqdm.tqdm(disable=not verbose)
+    pending = {'count': 0, 'read_done': False}  # 읽었지만 아직 writer 로 넘어가지 않은(성공 또는 dead-letter) 레코드 수
+    finished = asyncio.Event()
+
+    def settle(n):
+        # writer 가 n 개 레코드의 순서를 확정하여 기록 버퍼로 넘긴(또는 건너뛴) 뒤 호출합니다.
+        for _ in range(n):
+            window.release()
+        progress.update(n)
+        pending['count'] -= n
+        if pending['read_done'] and pending['count'] == 0:
+            finished.set()
+
+    # 결과는 하나의 writer 가 모아서 기록하고, 기록이 끝난 줄만 manifest 에 추가합니다.
+    writer = JsonlWriter(out_filepath, mode, checkpoint, ordered=ordered, flush_interval=flush_interval, fsync=fsync, on_settled=settle)
+
+    async def reader():
+        seq = 0
+        async for obj in select():
+            await window.acquire()  # 처리 중인 레코드가 많으면 끝날 때까지 기다립니다.
+            pending['count'] += 1
+            queue.put_nowait((seq, obj, 1, time.perf_counter()))
+            seq += 1
+        pending['read_done'] = True
+        if pending['count'] == 0:
+            finished.set()
+        await finished.wait()  # 재시도 중인 레코드까지 모두 끝나면 worker 를 종료합니다.
+        for _ in range(max_concurrency):
+            queue.put_nowait(None)  # worker 종료 신호
+
+    async def retry_later(seq, obj, attempt, delay):
+        await asyncio.sleep(delay)
+        queue.put_nowait((seq, obj, attempt, time.perf_counter()))
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            seq, obj, attempt, enqueued = item
+            started = time.perf_counter()
+            metrics.observe('queue_wait_seconds', started - enqueued, job=job)  # 큐에서 worker 를 기다린 시간
+            metrics.add('inflight_records', 1, job=job)
+            try:
+                # task 가 객체를 고친 뒤 실패할 수 있으므로, 재시도할 수 있도록 복사본을 넘깁니다.
+                result = await task(copy.deepcopy(obj) if policy.max_attempts > 1 else obj)
+            except Exception as e:
+                metrics.add('inflight_records', -1, job=job)
+                delay = policy.next_delay(e, attempt)
+                if delay is None:
+                    metrics.inc('dead_letters_total', job=job)
+                    dead_letters.write(obj, e, attempt)  # 재시도할 수 없으면 dead-letter 파일에 기록합니다.
+                    progress.set_postfix(failed=dead_letters.count)
+                    writer.skip(seq)
+                else:
+                    metrics.inc('retries_total', job=job)
+                    retry = asyncio.ensure_future(retry_later(seq, obj, attempt + 1, delay))
+                    retry_tasks.add(retry)
+                    retry.add_done_callback(retry_tasks.discard)
+                continue
+            metrics.add('inflight_records', -1, job=job)
+            metrics.observe('record_seconds', time.perf_counter() - started, job=job)
+            writer.put(seq, result)  # 처리가 끝난 객체는 writer 에 넘깁니다.
+
+    # 모든 백엔드가 하나의 연결 풀(keep-alive)을 함께 사용합니다.
+    async with shared_session():
+        # fanout 으로 나뉜 하위 요청들도 전체 max_concurrency 제한을 함께 사용하도록 요청 슬롯을 설정합니다.
+        slots_token = request_slots.set(asyncio.Semaphore(max_concurrency))
+        writer_task = asyncio.ensure_future(writer.run())
+        tasks = [asyncio.ensure_future(reader())] + [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+        exporter = asyncio.ensure_future(export_periodically(metrics_filepath, metrics_interval)) if metrics_filepath else None
+        try:
+            # writer 가 기록 중에 실패하면(디스크 가득 참 등) 더 이상 settle 이 불리지 않아 reader 가 멈추므로, writer 도 함께 기다립니다.
+            running = asyncio.gather(*tasks)
+            running.add_done_callback(lambda f: f.cancelled() or f.exception())  # 취소한 뒤의 예외 경고를 남기지 않습니다.
+            await asyncio.wait([running, writer_task], return_when=asyncio.FIRST_COMPLETED)
+            if writer_task.done():
+                running.cancel()
+                writer_task.result()  # 기록 오류를 호출한 쪽에 그대로 전달합니다.
+                raise RuntimeError(f"writer for {out_filepath} stopped before the run finished")
+            running.result()
+            writer.close()
+            await writer_task
+            if verbose:
+                report_limiters()  # 백엔드별 제한기가 도달한 동시성 수준과 요청 지연을 출력합니다.
+                if dead_letters.count:
+                    print(colored(f"failed: {dead_letters.count} records -> {dead_letters.filepath}", 'red'))
+        finally:
+            for t in tasks + list(retry_tasks) + [writer_task]:
+                t.cancel()  # 하나라도 실패하면 나머지 태스크를 정리합니다.
+            if exporter is not None:
+                exporter.cancel()
+                await asyncio.gather(exporter, return_exceptions=True)  # 마지막 지표를 기록합니다.
+            progress.close()
+            checkpoint.close()
+            dead_letters.close()
+            request_slots.reset(slots_token)
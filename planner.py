@@ -0,0 +1,251 @@
+# python
+from typing import Callable, List, Optional, Sequence
+import functools
+import heapq
+import math
+# 유틸리티 함수
+from termcolor import colored
+import fire
+try:
+    import tiktoken
+except ImportError:  # tiktoken 이 없으면 estimate_tokens 로 추정합니다.
+    tiktoken = None
+# framework
+from fanout import resolve
+from limiter import DEFAULT_LIMITS, DEFAULT_COMPLETION_TOKENS, estimate_tokens
+from pipeline import iter_jsonl
+
+
+# 백엔드별 가격(USD). OpenAI 는 1K 토큰당, DeepL 은 1글자당 가격입니다.
+PRICES = {
+    'openai:gpt-3.5-turbo': dict(prompt=0.0015, completion=0.002),
+    'openai:gpt-4': dict(prompt=0.03, completion=0.06),
+    'deepl:deepl': dict(character=0.00002),
+}
+
+# 한국어 번역문의 토큰 수는 영어 원문의 약 2배입니다.
+TRANSLATION_TOKEN_RATIO = 2.0
+# 요청 하나가 완료 토큰을 생성하는 속도(초당 토큰 수) 추정치
+TOKENS_PER_SECOND = 40
+# 레코드 처리 시간은 대부분 생성(completion)에 걸리므로, 스케줄링 가중치에서 prompt 토큰은 이 비율만큼만 셉니다.
+PROMPT_WEIGHT = 0.1
+
+encoders = {}
+
+
+@functools.lru_cache(maxsize=None)
+def warn_heuristic():
+    """tiktoken 이 없어 추정치를 사용한다는 것을 한 번만 알립니다."""
+    print(colored("tiktoken is not installed; token counts are estimated from characters", 'red'))
+
+
+def field_paths(func: Callable, kind: str) -> Optional[List[str]]:
+    """
+    translate_fields/evaluate_fields 로 만든 func 가 처리하는 필드 경로를 반환합니다. 다른 함수이면 None 을 반환합니다.
+    """
+    keywords = getattr(func, 'keywords', None) or {}
+    if kind == 'translate':
+        return list(keywords['paths']) if 'paths' in keywords else None
+    return [keywords['input_path']] if 'input_path' in keywords else None
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """
+    text 의 토큰 수를 셉니다. tiktoken 이 설치되어 있으면 모델의 토크나이저를, 없으면 estimate_tokens 의 추정치를 사용합니다.
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        warn_heuristic()
+        return estimate_tokens(text)
+    if model_name not in encoders:
+        try:
+            encoders[model_name] = tiktoken.encoding_for_model(model_name)
+        except KeyError:  # deepl 등 OpenAI 모델이 아닌 경우
+            encoders[model_name] = tiktoken.get_encoding('cl100k_base')
+    return len(encoders[model_name].encode(text, disallowed_special=()))
+
+
+class Planner:
+    """
+    레코드마다 요청 수, prompt/completion 토큰 수, 글자 수를 추정하여 실행 전에 전체 비용과 시간을 계산하고,
+    긴 레코드를 먼저 시작하는(LPT) 스케줄링에 쓸 가중치를 제공하는 클래스입니다.
+
+    Args:
+        kind (str): 'translate' 또는 'eval'
+        backend (str): 제한기 이름 (예: 'openai:gpt-4', 'deepl:deepl')
+        paths (Sequence[str]): 처리할 필드 경로 (fanout.resolve 형식). eval 에서는 input 필드 경로입니다.
+        template (str, optional): 요청마다 덧붙는 프롬프트 템플릿
+        completion_tokens (int, optional): eval 요청 하나의 completion 토큰 수. Defaults to DEFAULT_COMPLETION_TOKENS.
+        instruction_path (str, optional): eval 의 instruction 필드 경로. Defaults to 'instruction'.
+        split (Callable[[str], List[str]], optional): 번역 문자열을 요청 단위 조각으로 나누는 함수 (SegmentedTranslate.pieces)
+        pack_segments (int, optional): 한 요청에 묶이는 번역 문자열 수 (PackedTranslate). Defaults to 1.
+    """
+
+    def __init__(self, kind: str, backend: str, paths: Sequence[str], template='', completion_tokens: Optional[int] = None, instruction_path='instruction',
+                 split: Optional[Callable[[str], List[str]]] = None, pack_segments=1):
+        if kind not in ('translate', 'eval'):
+            raise ValueError(f"unknown kind: {kind!r}")
+        if paths is None:
+            raise ValueError("paths is required (e.g. ['instruction', 'instances[].input'])")
+        self.kind = kind
+        self.backend = backend
+        self.model_name = backend.split(':', 1)[-1]
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.overhead = count_tokens(template, self.model_name)
+        self.completion_tokens = completion_tokens or DEFAULT_COMPLETION_TOKENS
+        self.instruction_path = instruction_path
+        self.split = split
+        self.pack_segments = max(1, pack_segments)
+
+    @classmethod
+    def of(cls, model, func: Callable, kind: str, paths: Optional[Sequence[str]] = None) -> 'Planner':
+        """
+        번역/추론 객체와 translate_func/run_func 에서 Planner 를 만듭니다.
+        SegmentedTranslate 로 감싼 번역기는 조각 단위로, packing 이 켜진 번역기는 묶음 단위로 요청 수와 프롬프트 토큰 수를 셉니다.
+
+        Args:
+            model: 번역/추론 객체
+            func (Callable): translate_func 또는 run_func
+            kind (str): 'translate' 또는 'eval'
+            paths (Sequence[str], optional): 처리할 필드 경로. None 이면 translate_fields/evaluate_fields 로 만든 func 에서 읽습니다.
+
+        Raises:
+            ValueError: paths 가 없고 func 에서도 읽을 수 없는 경우
+        """
+        if paths is None:
+            paths = field_paths(func, kind)
+        if paths is None:
+            raise ValueError(f"cannot tell which fields {func!r} processes; pass paths (e.g. paths=['instances[].input'])")
+        keywords = getattr(func, 'keywords', None) or {}
+        limiter = getattr(model, 'limiter', None)
+        backend = limiter.name if limiter is not None else f"{getattr(model, 'backend', '')}:{getattr(model, 'model_name', '')}"
+        # 동시에 들어온 문자열이 최대 개수까지 묶인다고 가정하므로, 요청 수는 하한에 가깝습니다.
+        pack_segments = getattr(model, 'pack_options', {}).get('max_items', 1) if kind == 'translate' and getattr(model, 'pack', False) else 1
+        return cls(kind, backend, paths,
+                   template=getattr(model, 'packed_template' if pack_segments > 1 else 'template', ''),
+                   completion_tokens=getattr(model, 'max_output_tokens', None),
+                   instruction_path=keywords.get('instruction_path', 'instruction'),
+                   split=getattr(model, 'pieces', None) if kind == 'translate' else None,
+                   pack_segments=pack_segments)
+
+    def texts(self, obj: dict) -> list:
+        return [container[key] for path in self.paths for container, key in resolve(obj, path) if isinstance(container[key], str)]
+
+    def estimate(self, obj: dict) -> dict:
+        """
+        레코드 하나의 요청 수, prompt/completion 토큰 수, 글자 수와 가장 긴 요청의 completion 토큰 수를 추정합니다.
+
+        Args:
+            obj (dict): 레코드
+
+        Returns:
+            dict: requests, prompt_tokens, completion_tokens, characters, longest
+        """
+        estimate = dict(requests=0, prompt_tokens=0, completion_tokens=0, characters=0, longest=0)
+        if self.kind == 'translate':
+            # 빈 문자열은 요청하지 않습니다. 조각 단위로 번역하면 조각마다 요청합니다. (실행 중 중복 제거는 반영하지 않습니다)
+            texts = [piece for text in self.texts(obj) if text.strip() for piece in (self.split(text) if self.split else [text])]
+            for text in texts:
+                tokens = count_tokens(text, self.model_name)
+                completion = int(tokens * TRANSLATION_TOKEN_RATIO)
+                # 묶어서 번역하면 요청 하나와 프롬프트 템플릿을 pack_segments 개의 문자열이 나누어 씁니다.
+                estimate['requests'] += 1 / self.pack_segments
+                estimate['prompt_tokens'] += self.overhead / self.pack_segments + tokens
+                estimate['completion_tokens'] += completion
+                estimate['characters'] += len(text)
+                estimate['longest'] = max(estimate['longest'], completion)
+        else:
+            instruction = next((c[k] for c, k in resolve(obj, self.instruction_path)), '')
+            for text in self.texts(obj):
+                estimate['requests'] += 1
+                estimate['prompt_tokens'] += self.overhead + count_tokens(instruction, self.model_name) + count_tokens(text, self.model_name)
+                estimate['completion_tokens'] += self.completion_tokens
+                estimate['characters'] += len(instruction) + len(text)
+                estimate['longest'] = self.completion_tokens
+        return estimate
+
+    def weight(self, obj: dict) -> float:
+        """스케줄링 가중치(예상 처리 시간에 비례하는 값)를 반환합니다. DeepL 은 글자 수, LLM 은 토큰 수를 사용합니다."""
+        estimate = self.estimate(obj)
+        if 'character' in PRICES.get(self.backend, {}):
+            return estimate['characters']
+        return estimate['completion_tokens'] + PROMPT_WEIGHT * estimate['prompt_tokens']
+
+    def plan(self, in_filepath: str, prepare: Optional[Callable[[int, dict], dict]] = None, rpm=None, tpm=None, tokens_per_second=TOKENS_PER_SECOND, top=5) -> dict:
+        """
+        입력 파일 전체를 요청 없이 읽어 총 토큰 수, 예상 비용, 예상 소요 시간을 계산합니다. (dry-run)
+
+        Args:
+            in_filepath (str): 입력 jsonl 파일 경로
+            prepare (Callable[[int, dict], dict], optional): 읽은 객체에 적용할 함수 (예: Translate.append_id)
+            rpm, tpm (float, optional): 분당 요청/토큰 한도. 기본값은 limiter.DEFAULT_LIMITS 의 값입니다.
+            tokens_per_second (float, optional): 요청 하나의 생성 속도. 가장 긴 레코드의 처리 시간을 추정하는 데 씁니다.
+            top (int, optional): 보고할 가장 무거운 레코드 수. Defaults to 5.
+
+        Returns:
+            dict: records, requests, prompt_tokens, completion_tokens, characters, cost, seconds, heaviest
+        """
+        limits = DEFAULT_LIMITS.get(self.backend, {})
+        rpm = rpm if rpm is not None else limits.get('rpm')
+        tpm = tpm if tpm is not None else limits.get('tpm')
+        totals = dict(records=0, requests=0, prompt_tokens=0, completion_tokens=0, characters=0)
+        heaviest, longest = [], 0
+        for obj in iter_jsonl(in_filepath, prepare):
+            estimate = self.estimate(obj)
+            totals['records'] += 1
+            for key in ('requests', 'prompt_tokens', 'completion_tokens', 'characters'):
+                totals[key] += estimate[key]
+            longest = max(longest, estimate['longest'])
+            item = (self.weight(obj), totals['records'], obj.get('id'))
+            if len(heaviest) < top:
+                heapq.heappush(heaviest, item)
+            else:
+                heapq.heappushpop(heaviest, item)
+
+        totals['requests'] = math.ceil(totals['requests'])
+        totals['prompt_tokens'] = round(totals['prompt_tokens'])
+
+        prices = PRICES.get(self.backend, {})
+        if 'character' in prices:
+            cost = totals['characters'] * prices['character']
+        else:
+            cost = totals['prompt_tokens'] / 1000 * prices.get('prompt', 0) + totals['completion_tokens'] / 1000 * prices.get('completion', 0)
+        # 한도가 허용하는 속도로 모든 요청을 보내는 시간과 가장 긴 요청을 처리하는 시간 중 큰 값이 전체 소요 시간의 하한입니다.
+        minutes = max(totals['requests'] / rpm if rpm else 0, (totals['prompt_tokens'] + totals['completion_tokens']) / tpm if tpm else 0)
+        seconds = max(minutes * 60, longest / tokens_per_second if tokens_per_second else 0)
+        return dict(totals, backend=self.backend, rpm=rpm, tpm=tpm, cost=cost, seconds=seconds,
+                    heaviest=[(obj_id, weight) for weight, _, obj_id in sorted(heaviest, reverse=True)])
+
+
+def report(plan: dict):
+    """dry-run 계획을 출력합니다."""
+    print(colored(f"[{plan['backend']}] records: {plan['records']}, requests: {plan['requests']}", 'yellow'))
+    print(colored(f"  tokens: prompt {plan['prompt_tokens']}, completion {plan['completion_tokens']} (estimated), characters: {plan['characters']}", 'yellow'))
+    limits = f"rpm {plan['rpm'] or '-'}, tpm {plan['tpm'] or '-'}"
+    print(colored(f"  estimated cost: ${plan['cost']:.2f}, estimated wall time: {plan['seconds'] / 60:.1f} min at {limits}", 'yellow'))
+    for obj_id, weight in plan['heaviest']:
+        print(colored(f"  heaviest: {obj_id} ({weight:.0f})", 'blue'))
+
+
+def main(in_filepath: str, paths: Sequence[str], kind='eval', model_name='gpt-4', rpm=None, tpm=None, max_output_tokens=None):
+    """
+    API 를 호출하지 않고 입력 파일을 처리하는 데 필요한 토큰 수, 비용, 시간을 추정합니다.
+
+    예) python planner.py user_oriented_instructions_deepl_ko.jsonl --kind=eval --model_name=gpt-4 --paths='["instances[].input"]'
+
+    Args:
+        in_filepath (str): 입력 jsonl 파일 경로
+        paths (Sequence[str]): 처리할 필드 경로 (예: '["instances[].input"]')
+        kind (str): 'translate' 또는 'eval'
+        model_name (str): 'deepl' 또는 OpenAI 모델 이름
+        rpm, tpm (float, optional): 분당 요청/토큰 한도
+        max_output_tokens (int, optional): eval 요청 하나의 completion 토큰 수
+    """
+    backend = 'deepl:deepl' if model_name == 'deepl' else f'openai:{model_name}'
+    planner = Planner(kind, backend, paths, completion_tokens=max_output_tokens)
+    report(planner.plan(in_filepath, rpm=rpm, tpm=tpm))
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
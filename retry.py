@@ -0,0 +1,105 @@
+# python
+import json
+import os
+import random
+from typing import Iterator, Optional
+# framework
+from limiter import is_overload_error
+
+
+# 다시 시도해도 성공할 수 없는 예외 이름들 (잘못된 요청, 인증 실패, 코드 오류 등)
+FATAL_ERRORS = {
+    'InvalidRequestError',
+    'AuthenticationError',
+    'PermissionError',
+    'AuthorizationException',
+    'KeyError',
+    'TypeError',
+    'AttributeError',
+    'GenerationCapExceeded',
+}
+
+
+def classify_error(e: BaseException) -> str:
+    """
+    예외를 재시도 정책에 따라 분류합니다.
+
+    Returns:
+        str: 'overload' (한도 초과/과부하/타임아웃), 'fatal' (재시도 불가), 'transient' (그 외 일시적인 오류)
+    """
+    if is_overload_error(e):
+        return 'overload'
+    status = getattr(e, 'status', None) or getattr(e, 'http_status', None)
+    if status in (400, 401, 403, 404, 422) or type(e).__name__ in FATAL_ERRORS:
+        return 'fatal'
+    return 'transient'
+
+
+class RetryPolicy:
+    """
+    레코드 단위 재시도 정책입니다. 지터(jitter)가 있는 지수 백오프로 다음 시도까지의 대기 시간을 정합니다.
+
+    Args:
+        max_attempts (int, optional): 레코드당 최대 시도 횟수. 1 이면 재시도하지 않습니다. Defaults to 5.
+        base_delay (float, optional): 일시적인 오류의 첫 대기 시간(초). Defaults to 1.
+        overload_delay (float, optional): 한도 초과/타임아웃 오류의 첫 대기 시간(초). Defaults to 5.
+        max_delay (float, optional): 최대 대기 시간(초). Defaults to 120.
+        max_pending (int, optional): 재시도를 기다리는 레코드를 위해 추가로 허용할 처리 중 레코드 수. 기본값은 max_concurrency 입니다.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=1.0, overload_delay=5.0, max_delay=120.0, max_pending=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.overload_delay = overload_delay
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+    def next_delay(self, e: BaseException, attempt: int) -> Optional[float]:
+        """
+        attempt 번째 시도가 e 로 실패했을 때 다음 시도까지 기다릴 시간을 반환합니다. 재시도하지 않으면 None 을 반환합니다.
+        """
+        kind = classify_error(e)
+        if kind == 'fatal' or attempt >= self.max_attempts:
+            return None
+        base = self.overload_delay if kind == 'overload' else self.base_delay
+        return random.uniform(0, min(self.max_delay, base * 2 ** (attempt - 1)))  # full jitter
+
+
+class DeadLetters:
+    """
+    끝내 실패한 레코드를 jsonl 파일에 기록합니다. 실패한 레코드가 없으면 파일을 만들지 않습니다.
+    실행을 시작할 때(객체를 만들 때) 이전 실행의 파일을 지우므로, 파일에는 항상 마지막 실행에서 실패한 레코드만 남습니다.
+    (이전 실행에서 실패한 레코드는 출력 파일에 없으므로 increment 모드에서 다시 처리됩니다)
+    각 줄은 {"id", "attempts", "error", "record"} 형식이며, load_dead_letters 로 원래 레코드를 다시 읽을 수 있습니다.
+
+    Args:
+        filepath (str): dead-letter jsonl 파일 경로
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.count = 0
+        self.fp = None
+        if os.path.exists(filepath):
+            os.remove(filepath)  # 이번 실행에서 성공할 레코드가 이전 실행의 실패로 남아 있지 않도록 합니다.
+
+    def write(self, obj: dict, e: BaseException, attempts: int):
+        if self.fp is None:
+            self.fp = open(self.filepath, 'w', encoding='utf-8')
+        line = {'id': obj.get('id'), 'attempts': attempts, 'error': f'{type(e).__name__}: {e}', 'record': obj}
+        self.fp.write(json.dumps(line, ensure_ascii=False)+'\n')
+        self.fp.flush()
+        self.count += 1
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def load_dead_letters(filepath: str) -> Iterator[dict]:
+    """dead-letter 파일에서 실패한 원래 레코드들을 읽어 반환합니다."""
+    with open(filepath, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)['record']
@@ -0,0 +1,355 @@
+# python
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import math
+import os
+import re
+# 유틸리티 함수
+from termcolor import colored
+import fire
+try:
+    import numpy as np
+except ImportError:  # numpy 가 없으면 같은 계산을 파이썬으로 합니다. (느립니다)
+    np = None
+# framework
+from pipeline import iter_jsonl
+from segment import CODE_BLOCK
+from store import parse_filename, flatten
+from translate import Translate
+
+
+# chrF 의 문자 n-gram 최대 길이와 재현율 가중치 (sacrebleu 의 기본값과 같습니다)
+CHRF_ORDER = 6
+CHRF_BETA = 2.0
+# 번역문에 원문 그대로 남은 영어 구간: 4 단어 이상 이어진 라틴 문자 단어
+UNTRANSLATED_SPAN = re.compile(r"[A-Za-z][A-Za-z'’-]*(?:[ \t]+[A-Za-z][A-Za-z'’-]*){3,}")
+# 이 행 수보다 적으면 프로세스 풀을 쓰지 않습니다.
+MIN_PARALLEL_ROWS = 2000
+
+if np is not None:
+    # n-gram 해시(FNV-1a + 섞기)와 (행 번호, 해시) 키를 만드는 상수. 행 번호는 상위 24 비트, 해시는 하위 40 비트입니다.
+    FNV_OFFSET, FNV_PRIME, MIX = np.uint64(0xcbf29ce484222325), np.uint64(0x100000001b3), np.uint64(0xbf58476d1ce4e5b9)
+    ROW_SHIFT, HASH_SHIFT = np.uint64(40), np.uint64(24)
+    # str.isspace() 가 참인 코드 포인트
+    SPACES = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint64)
+
+
+def _codepoints(texts: List[str]):
+    # 모든 텍스트를 이어 붙인 코드 포인트 배열과 텍스트별 길이를 반환합니다.
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    cps = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    return cps, lengths
+
+
+def _per_text(mask, lengths):
+    # 이어 붙인 배열의 mask 를 텍스트별로 셉니다.
+    ends = np.cumsum(lengths)
+    cumsum = np.concatenate(([0], np.cumsum(mask)))
+    return cumsum[ends] - cumsum[ends - lengths]
+
+
+def _profiles(texts: List[str], order: int) -> list:
+    """
+    텍스트들의 문자 n-gram (n = 1..order) 빈도를 한 번에 계산합니다. (공백은 chrF 와 같이 제거합니다)
+
+    Returns:
+        list: n 마다 (정렬된 (행, n-gram) 키, 빈도, 행별 n-gram 수)
+    """
+    size = len(texts)
+    if np is None:
+        texts = [''.join(text.split()) for text in texts]
+        profiles = []
+        for n in range(1, order + 1):
+            counters = [Counter(text[i:i + n] for i in range(len(text) - n + 1)) for text in texts]
+            profiles.append((counters, None, [sum(c.values()) for c in counters]))
+        return profiles
+
+    cps, lengths = _codepoints(texts)
+    keep = ~np.isin(cps, SPACES)
+    cps, lengths = cps[keep], _per_text(keep, lengths)
+    rows = np.repeat(np.arange(size, dtype=np.uint64), lengths) << ROW_SHIFT
+    ends = np.repeat(np.cumsum(lengths), lengths)
+    positions = np.arange(len(cps))
+    h = np.full(len(cps), FNV_OFFSET, dtype=np.uint64)
+    profiles = []
+    for n in range(1, order + 1):
+        m = len(cps) - n + 1
+        if m <= 0:
+            profiles.append((np.empty(0, np.uint64), np.empty(0, np.int64), np.zeros(size)))
+            continue
+        # h[i] 는 i 에서 시작하는 n-gram 의 해시입니다. 이전 차수의 해시에 코드 포인트 하나를 더합니다.
+        h = (h[:m] ^ cps[n - 1:n - 1 + m]) * FNV_PRIME
+        valid = positions[:m] + n <= ends[:m]  # 텍스트 경계를 넘는 n-gram 은 제외합니다.
+        z = h[valid]
+        z ^= z >> np.uint64(31)
+        z *= MIX
+        z >>= HASH_SHIFT
+        z |= rows[:m][valid]
+        keys, counts = np.unique(z, return_counts=True)
+        totals = np.bincount((keys >> ROW_SHIFT).astype(np.int64), weights=counts, minlength=size)
+        profiles.append((keys, counts, totals))
+    return profiles
+
+
+def _matches(a, b, size: int):
+    # 두 텍스트 묶음의 같은 행끼리 겹치는 n-gram 수 (빈도는 작은 쪽으로 자릅니다)
+    (ka, ca, _), (kb, cb, _) = a, b
+    if len(ka) == 0 or len(kb) == 0:
+        return np.zeros(size)
+    # 두 정렬된 키 배열을 병합하면 같은 키가 이웃합니다. (stable 정렬은 정렬된 두 구간을 한 번의 병합으로 처리합니다)
+    keys = np.concatenate((ka, kb))
+    order = np.argsort(keys, kind='stable')
+    keys, counts = keys[order], np.concatenate((ca, cb))[order]
+    hit = np.flatnonzero(keys[1:] == keys[:-1])
+    return np.bincount((keys[hit] >> ROW_SHIFT).astype(np.int64), weights=np.minimum(counts[hit], counts[hit + 1]), minlength=size)
+
+
+def _chrf(a: list, b: list, size: int, beta: float):
+    # sacrebleu 의 chrF 와 같이 n 마다 F-score 를 구해 유효한 n 들의 평균을 0~100 으로 반환합니다. b 가 참조입니다.
+    factor = beta ** 2
+    if np is None:
+        scores = []
+        for row in range(size):
+            total = effective = 0
+            for pa, pb in zip(a, b):
+                hyp, ref, match = pa[2][row], pb[2][row], sum((pa[0][row] & pb[0][row]).values())
+                precision, recall = match / hyp if hyp else 0, match / ref if ref else 0
+                total += (1 + factor) * precision * recall / (factor * precision + recall) if precision + recall else 0
+                effective += hyp > 0 and ref > 0
+            scores.append(100 * total / effective if effective else 0.0)
+        return scores
+    total, effective = np.zeros(size), np.zeros(size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for pa, pb in zip(a, b):
+            match = _matches(pa, pb, size)
+            precision = np.where(pa[2] > 0, match / pa[2], 0)
+            recall = np.where(pb[2] > 0, match / pb[2], 0)
+            denom = factor * precision + recall
+            total += np.where(denom > 0, (1 + factor) * precision * recall / denom, 0)
+            effective += (pa[2] > 0) & (pb[2] > 0)
+        return np.where(effective > 0, 100 * total / effective, 0)
+
+
+def _char_counts(texts: List[str]) -> Tuple:
+    # 텍스트별 (글자 수, 한글 글자 수, 한글과 라틴 문자 수)
+    if np is None:
+        hangul = [sum('가' <= c <= '힣' or 'ᄀ' <= c <= 'ᇿ' or '㄰' <= c <= '㆏' for c in text) for text in texts]
+        latin = [sum('a' <= c <= 'z' or 'A' <= c <= 'Z' for c in text) for text in texts]
+        return [len(text) for text in texts], hangul, [h + l for h, l in zip(hangul, latin)]
+    cps, lengths = _codepoints(texts)
+    hangul = ((cps >= 0xAC00) & (cps <= 0xD7A3)) | ((cps >= 0x1100) & (cps <= 0x11FF)) | ((cps >= 0x3130) & (cps <= 0x318F))
+    lower = cps | np.uint64(0x20)
+    latin = (lower >= ord('a')) & (lower <= ord('z'))
+    return lengths, _per_text(hangul, lengths), _per_text(hangul | latin, lengths)
+
+
+def _untranslated(text: str, source: Optional[str], latin: int) -> int:
+    # 코드 블록 밖에서 원문에 그대로 있는 영어 구간의 수 (원문이 없으면 모든 영어 구간)
+    if latin < 7:  # 네 단어를 이룰 라틴 문자가 없습니다.
+        return 0
+    if '```' in text or '~~~' in text:
+        text = CODE_BLOCK.sub('', text)
+    spans = UNTRANSLATED_SPAN.findall(text)
+    return sum(source is None or span in source for span in spans)
+
+
+def _ratio(num, den):
+    if np is None:
+        return [n / d if d else math.nan for n, d in zip(num, den)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / np.maximum(den, 1), np.nan)
+
+
+def _mask(values, present):
+    # 텍스트가 없는(None) 행의 점수를 nan 으로 바꿉니다.
+    if np is None:
+        return [v if p else math.nan for v, p in zip(values, present)]
+    return np.where(present, values, np.nan)
+
+
+def _score_rows(columns: List[List[Optional[str]]], sources: Optional[List[Optional[str]]], order: int, beta: float) -> dict:
+    """score_matrix 의 한 shard 를 계산합니다. 프로세스 풀에서 실행됩니다."""
+    size = len(columns[0]) if columns else 0
+    present = [[text is not None for text in column] for column in columns]
+    texts = [[text or '' for text in column] for column in columns]
+    result = {'systems': [], 'pairs': {}}
+    if sources is not None:
+        source_lengths = _char_counts([text or '' for text in sources])[0]
+    for column, mask in zip(texts, present):
+        lengths, hangul, letters = _char_counts(column)
+        metrics = {
+            'hangul_ratio': _mask(_ratio(hangul, letters), mask),
+            'untranslated': _mask([_untranslated(text, source, int(total - korean))
+                                   for text, source, korean, total in zip(column, sources or [None] * size, hangul, letters)], mask),
+        }
+        if sources is not None:
+            metrics['length_ratio'] = _mask(_ratio(lengths, source_lengths), mask)
+        result['systems'].append(metrics)
+
+    profiles = [_profiles(column, order) for column in texts]
+    for i, j in combinations(range(len(columns)), 2):
+        both = [a and b for a, b in zip(present[i], present[j])]
+        exact = [float(a.strip() == b.strip()) for a, b in zip(texts[i], texts[j])]
+        result['pairs'][(i, j)] = {
+            'chrf': _mask(_chrf(profiles[i], profiles[j], size, beta), both),
+            'exact': _mask(exact, both),
+        }
+    return result
+
+
+def _concat(parts: list):
+    if np is None:
+        return [value for part in parts for value in part]
+    return np.concatenate([np.asarray(part, dtype=float) for part in parts])
+
+
+def score_matrix(columns: Sequence[Sequence[Optional[str]]], sources: Optional[Sequence[Optional[str]]] = None, workers: Optional[int] = None,
+                 order=CHRF_ORDER, beta=CHRF_BETA) -> dict:
+    """
+    행이 맞춰진 여러 시스템(번역기 또는 평가 모델)의 텍스트 열들을 한꺼번에 채점합니다.
+    n-gram 추출과 집계는 numpy 배열 연산으로 모든 행을 한 번에 처리하고, 행을 나누어 여러 프로세스에서 계산합니다.
+
+    Args:
+        columns (Sequence[Sequence[Optional[str]]]): 시스템별 텍스트 열. 텍스트가 없는 행은 None 입니다.
+        sources (Sequence[Optional[str]], optional): 원문 열. 있으면 길이 비율과 원문에 그대로 남은 영어 구간을 계산합니다.
+        workers (int, optional): 프로세스 수. Defaults to os.cpu_count().
+        order (int, optional): chrF 의 문자 n-gram 최대 길이. Defaults to 6.
+        beta (float, optional): chrF 의 재현율 가중치. Defaults to 2.
+
+    Returns:
+        dict: 'systems' - 시스템별 {'hangul_ratio', 'untranslated', 'length_ratio'} 행별 점수,
+              'pairs' - (i, j) 별 {'chrf' (j 를 참조로 한 i 의 chrF), 'exact' (완전 일치 여부)} 행별 점수.
+              계산할 수 없는 행의 점수는 nan 입니다.
+    """
+    columns = [list(column) for column in columns]
+    sources = list(sources) if sources is not None else None
+    size = len(columns[0]) if columns else 0
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or size < MIN_PARALLEL_ROWS:
+        return _score_rows(columns, sources, order, beta)
+
+    step = math.ceil(size / workers)
+    shards = [([column[start:start + step] for column in columns], sources[start:start + step] if sources is not None else None, order, beta)
+              for start in range(0, size, step)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(_score_rows, *zip(*shards)))
+    return {
+        'systems': [{name: _concat([part['systems'][idx][name] for part in parts]) for name in parts[0]['systems'][idx]} for idx in range(len(columns))],
+        'pairs': {pair: {name: _concat([part['pairs'][pair][name] for part in parts]) for name in metrics} for pair, metrics in parts[0]['pairs'].items()},
+    }
+
+
+def load_texts(filepaths: Sequence[str]) -> Dict[tuple, Dict[tuple, str]]:
+    """
+    결과 파일들을 읽어 (dataset, translator, evaluator) 별로 {(id, instance, field): text} 를 반환합니다.
+    평가 결과 파일은 모델의 답변을 'output' 필드로 읽습니다.
+    """
+    systems = {}
+    for filepath in filepaths:
+        names = parse_filename(filepath)
+        texts = systems.setdefault((names['dataset'], names['translator'], names['evaluator']), {})
+        for obj in iter_jsonl(filepath, Translate.append_id):
+            for instance, instruction, input, output in flatten(obj):
+                fields = {'output': output} if names['evaluator'] else {'instruction': instruction, 'input': input, 'output': output}
+                for field, text in fields.items():
+                    if isinstance(text, str):
+                        texts[(str(obj['id']), instance, field)] = text
+    return systems
+
+
+def _nan_to_none(value) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
+
+
+def _mean(values) -> float:
+    values = [v for v in map(float, values) if not math.isnan(v)]
+    return sum(values) / len(values) if values else math.nan
+
+
+def score_files(filepaths: Sequence[str], out_filepath: Optional[str] = None, workers: Optional[int] = None, order=CHRF_ORDER, beta=CHRF_BETA) -> List[dict]:
+    """
+    번역 결과 파일(<dataset>_<translator>_ko.jsonl)과 평가 결과 파일(..._eval_<evaluator>.jsonl)을 채점합니다.
+
+    - 번역: 번역기별 한글 비율, 원문 대비 길이 비율, 원문에 그대로 남은 영어 구간 수 (원문 파일이 함께 주어진 경우), 번역기 간 chrF
+    - 평가: 같은 번역본에 대한 평가 모델 간, 그리고 참조 출력(reference)과의 chrF 와 완전 일치율
+
+    Args:
+        filepaths (Sequence[str]): 결과 파일 경로들 (원문 파일을 포함할 수 있습니다)
+        out_filepath (str, optional): 행별 점수를 저장할 jsonl 파일 경로
+        workers (int, optional): 프로세스 수
+        order, beta: chrF 설정
+
+    Returns:
+        List[dict]: 그룹(dataset, translator)별 시스템/쌍 평균 점수
+    """
+    systems = load_texts(filepaths)
+    groups = []
+    for dataset in sorted({key[0] for key in systems}):
+        translators = sorted(t for d, t, e in systems if d == dataset and t and not e)
+        if translators:
+            source = systems.get((dataset, '', ''))
+            groups.append((dataset, '', translators, [systems[(dataset, t, '')] for t in translators], source))
+        for translator in sorted({t for d, t, e in systems if d == dataset and e}):
+            evaluators = sorted(e for d, t, e in systems if d == dataset and t == translator and e)
+            columns = [systems[(dataset, translator, e)] for e in evaluators]
+            reference = systems.get((dataset, translator, ''))
+            if reference is not None:
+                # 참조 출력은 평가 모델이 답한 행(output 필드)만 비교합니다.
+                evaluators.append('reference')
+                columns.append({key: text for key, text in reference.items() if key[2] == 'output'})
+            if len(evaluators) >= 2:
+                groups.append((dataset, translator, evaluators, columns, None))
+
+    summaries = []
+    out = open(out_filepath, 'w', encoding='utf-8') if out_filepath else None
+    try:
+        for dataset, translator, names, columns, source in groups:
+            keys = sorted(set().union(*columns))
+            scores = score_matrix([[column.get(key) for key in keys] for column in columns],
+                                  [source.get(key) for key in keys] if source is not None else None, workers, order, beta)
+            pairs = {f'{names[i]}/{names[j]}': metrics for (i, j), metrics in scores['pairs'].items()}
+            summary = {'dataset': dataset, 'translator': translator, 'rows': len(keys),
+                       'systems': {name: {metric: _mean(values) for metric, values in metrics.items()} for name, metrics in zip(names, scores['systems'])},
+                       'pairs': {pair: {metric: _mean(values) for metric, values in metrics.items()} for pair, metrics in pairs.items()}}
+            summaries.append(summary)
+            report(summary)
+            if out is None:
+                continue
+            for row, (obj_id, instance, field) in enumerate(keys):
+                record = {'dataset': dataset, 'translator': translator, 'id': obj_id, 'instance': instance, 'field': field}
+                for name, metrics in zip(names, scores['systems']):
+                    record[name] = {metric: _nan_to_none(values[row]) for metric, values in metrics.items()}
+                for pair, metrics in pairs.items():
+                    record[pair] = {metric: _nan_to_none(values[row]) for metric, values in metrics.items()}
+                out.write(json.dumps(record, ensure_ascii=False)+'\n')
+    finally:
+        if out is not None:
+            out.close()
+    return summaries
+
+
+def report(summary: dict):
+    """그룹의 평균 점수를 출력합니다."""
+    group = summary['dataset'] + (f" ({summary['translator']} eval)" if summary['translator'] else ' (translation)')
+    print(colored(f"[{group}] rows: {summary['rows']}", 'yellow'))
+    for name, metrics in summary['systems'].items():
+        print(colored(f"  {name}: " + ', '.join(f"{metric} {value:.3f}" for metric, value in sorted(metrics.items())), 'blue'))
+    for pair, metrics in summary['pairs'].items():
+        print(colored(f"  {pair}: chrF {metrics['chrf']:.1f}, exact {metrics['exact']:.3f}", 'green'))
+
+
+def main(*filepaths: str, out: Optional[str] = None, workers: Optional[int] = None, order=CHRF_ORDER, beta=CHRF_BETA):
+    """
+    결과 파일들을 채점합니다.
+
+    예) python scoring.py user_oriented_instructions*.jsonl --out=scores.jsonl
+    """
+    score_files(filepaths, out, workers, order, beta)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,161 @@
+# python
+from collections import OrderedDict
+from typing import List, Tuple
+import re
+# 비동기
+import asyncio
+# framework
+from translate import TranslateWrapper
+from metrics import metrics
+
+
+# 코드 블록(``` 또는 ~~~ 로 감싼 부분)은 번역하지 않습니다. 닫는 표시가 없으면 문자열 끝까지 코드로 봅니다.
+CODE_BLOCK = re.compile(r'^[ \t]*(```|~~~)[^\n]*\n.*?(?:^[ \t]*\1[^\n]*$|\Z)', re.MULTILINE | re.DOTALL)
+# 줄 앞의 들여쓰기와 마크다운 표시(제목, 인용, 목록 번호/기호, 체크박스)
+LINE_PREFIX = re.compile(r'^[ \t]*(?:(?:#{1,6}|>|[-*+]|\d{1,3}[.)])[ \t]+(?:\[[ xX]\][ \t]+)?)*')
+# 문장 경계: 문장 부호(와 닫는 따옴표/괄호) 뒤의 공백, 다음 문장은 대문자/숫자/여는 따옴표로 시작합니다.
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])["\')\]]*([ \t]+)(?=["\'(\[]?[A-Z0-9])')
+# 마침표로 끝나지만 문장의 끝이 아닌 약어
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'no', 'fig', 'inc', 'ltd', 'co', 'u.s', 'a.m', 'p.m'}
+# 번역할 글자가 없는 조각(구분선, 숫자, 기호 등)은 그대로 둡니다.
+WORD = re.compile(r'[^\W\d_]')
+
+
+def split_sentences(text: str) -> List[str]:
+    """공백을 포함하여 text 를 문장 단위로 나눕니다. 나눈 조각을 이으면 text 와 같습니다."""
+    parts, start = [], 0
+    for match in SENTENCE_BREAK.finditer(text):
+        words = text[start:match.start(1)].split()
+        last = words[-1].rstrip('.!?"\')]').lower() if words else ''
+        if last in ABBREVIATIONS or len(last) == 1:  # 약어나 이니셜(J. R. R. Tolkien) 뒤에서는 나누지 않습니다.
+            continue
+        parts += [text[start:match.start(1)], match.group(1)]
+        start = match.end(1)
+    parts.append(text[start:])
+    return parts
+
+
+def split_segments(text: str, sentences=True) -> List[Tuple[str, bool]]:
+    """
+    text 를 번역할 조각과 그대로 둘 조각으로 나눕니다.
+    코드 블록, 줄바꿈, 들여쓰기, 마크다운 표시, 앞뒤 공백은 그대로 둘 조각이 되므로, 번역한 조각을 순서대로 이으면 원문의 서식이 유지됩니다.
+
+    예) '# Title\\n\\nHello. World!' -> [('# ', False), ('Title', True), ('\\n\\n', False), ('Hello.', True), (' ', False), ('World!', True)]
+
+    Args:
+        text (str): 나눌 텍스트
+        sentences (bool, optional): True 이면 문장 단위로, False 이면 줄 단위로 나눕니다. Defaults to True.
+
+    Returns:
+        List[Tuple[str, bool]]: (조각, 번역 여부) 리스트. 조각을 모두 이으면 text 와 같습니다.
+    """
+    segments = []
+
+    def add(piece, translate):
+        if not piece:
+            return
+        translate = translate and WORD.search(piece) is not None
+        if segments and not translate and not segments[-1][1]:
+            segments[-1] = (segments[-1][0] + piece, False)  # 그대로 둘 조각은 이어 붙입니다.
+        else:
+            segments.append((piece, translate))
+
+    def add_prose(prose):
+        for line in prose.splitlines(keepends=True):
+            body = line.rstrip('\r\n')
+            prefix = LINE_PREFIX.match(body).group(0)
+            content = body[len(prefix):]
+            stripped = content.rstrip()
+            add(prefix, False)
+            for i, part in enumerate(split_sentences(stripped) if sentences else [stripped]):
+                add(part, i % 2 == 0)  # split_sentences 는 (문장, 공백, 문장, ...) 순서입니다.
+            add(content[len(stripped):] + line[len(body):], False)
+
+    start = 0
+    for match in CODE_BLOCK.finditer(text):
+        add_prose(text[start:match.start()])
+        add(match.group(0), False)
+        start = match.end()
+    add_prose(text[start:])
+    return segments
+
+
+class SegmentedTranslate(TranslateWrapper):
+    """
+    번역 객체를 감싸 텍스트를 문장(또는 줄) 단위로 나누어 번역하고 다시 이어 붙입니다.
+    레코드마다 반복되는 문장은 실행 중 한 번만 번역하고, 동시에 들어온 같은 문장의 요청은 하나의 요청으로 합칩니다.
+    코드 블록과 마크다운 서식은 번역하지 않고 그대로 둡니다.
+
+    Args:
+        inner (Translate): 감쌀 번역 객체 (CachedTranslate, DeepL 등)
+        sentences (bool, optional): True 이면 문장 단위로, False 이면 줄 단위로 나눕니다.
+            LLM 번역기는 문맥이 필요하므로 False 를 권장합니다. Defaults to True.
+        max_items (int, optional): 기억할 번역 결과의 최대 개수. Defaults to 100000.
+    """
+
+    def __init__(self, inner, sentences=True, max_items=100000):
+        super().__init__(inner)
+        self.sentences = sentences
+        self.max_items = max_items
+        self.results = OrderedDict()  # (target_lang, 조각) -> 번역 결과
+        self.inflight = {}  # (target_lang, 조각) -> 번역 중인 Future
+
+    def pieces(self, text: str) -> List[str]:
+        """text 를 번역할 때 요청하는 조각들을 반환합니다. (planner.Planner 가 요청 수를 추정하는 데 씁니다)"""
+        return [piece for piece, translate in split_segments(text, self.sentences) if translate]
+
+    async def __call__(self, original_text, target_lang=None):
+        # original_text가 빈 문자열인 경우 바로 반환합니다.
+        if not original_text or original_text.strip() == "":
+            return original_text
+        segments = split_segments(original_text, self.sentences)
+        translated = await asyncio.gather(*[self.translate_segment(piece, target_lang) for piece, translate in segments if translate])
+        translated = iter(translated)
+        return ''.join(next(translated) if translate else piece for piece, translate in segments)
+
+    async def translate_segment(self, segment: str, target_lang=None) -> str:
+        """
+        조각 하나를 번역합니다. 이미 번역한 조각이면 결과를 재사용하고, 번역 중인 조각이면 그 결과를 기다립니다.
+
+        Args:
+            segment (str): 번역할 조각
+            target_lang (str, optional): 목표 언어. None 이면 감싼 객체의 기본값을 사용합니다.
+
+        Returns:
+            str: 번역된 조각
+        """
+        key = (target_lang, segment)
+        metrics.inc('segments_total', backend=self.backend)
+        while True:
+            if key in self.results:
+                self.results.move_to_end(key)
+                metrics.inc('segments_deduped_total', backend=self.backend)
+                return self.results[key]
+            future = self.inflight.get(key)
+            if future is None:
+                break
+            metrics.inc('requests_coalesced_total', backend=self.backend)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # 이 호출이 취소되었습니다.
+                # 먼저 요청한 쪽이 취소되었으므로 다시 시도합니다.
+
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # 기다리는 쪽이 없어도 예외 경고를 남기지 않습니다.
+        try:
+            result = await super().__call__(segment, target_lang)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)  # 같은 조각을 기다리던 요청도 실패하며, 각 레코드의 재시도 정책을 따릅니다.
+            raise
+        finally:
+            del self.inflight[key]
+        self.results[key] = result
+        while len(self.results) > self.max_items:
+            self.results.popitem(last=False)  # 가장 오래 사용하지 않은 결과를 제거합니다.
+        future.set_result(result)
+        return result
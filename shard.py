@@ -0,0 +1,116 @@
+# python
+from typing import Callable, Optional
+import json
+import multiprocessing
+import os
+# 비동기
+import asyncio
+# 유틸리티 함수
+from termcolor import colored
+# framework
+from translate import Translate
+from checkpoint import Checkpoint
+from limiter import set_rate_share
+from pipeline import iter_jsonl
+
+
+def shard_filepath(out_filepath: str, index: int, count: int) -> str:
+    """index 번째 shard 의 출력 파일 경로를 반환합니다."""
+    return f'{out_filepath}.shard{index}of{count}'
+
+
+def run_shard(factory: Callable, in_filepath: str, out_filepath: str, func: Callable, index: int, count: int, **kwargs):
+    """
+    count 개의 shard 중 index 번째 shard 를 현재 프로세스에서 실행합니다.
+    여러 기계가 같은 디렉토리를 공유한다면, 각 기계에서 서로 다른 index 로 이 함수를 호출한 뒤 merge_shards 로 합칠 수 있습니다.
+
+    Args:
+        factory (Callable): 백엔드 객체(Translate 또는 Evaluate)를 만드는 함수 (예: DeepL, GPT4Eval)
+        in_filepath (str): 입력 파일 경로
+        out_filepath (str): 최종 출력 파일 경로 (shard 출력은 shard_filepath 로 정해집니다)
+        func (Callable): translate_func 또는 run_func
+        index (int): 이 shard 의 번호
+        count (int): 전체 shard 수
+        **kwargs: atranslate_jsonl / aeval_jsonl 에 전달할 추가 옵션
+    """
+    set_rate_share(1 / count)  # 전체 rpm/tpm 한도를 shard 수만큼 나눠 씁니다.
+    backend = factory()
+    run = backend.atranslate_jsonl if isinstance(backend, Translate) else backend.aeval_jsonl
+    asyncio.run(run(in_filepath, shard_filepath(out_filepath, index, count), func, shard=(index, count), **kwargs))
+
+
+def run_sharded(factory: Callable, in_filepath: str, out_filepath: str, func: Callable, num_shards: int, **kwargs):
+    """
+    입력 파일을 id 해시로 num_shards 개로 나누어 각각 별도의 프로세스에서 실행한 뒤, 하나의 출력 파일로 합칩니다.
+    각 프로세스는 자신의 이벤트 루프와 rpm/tpm 한도의 1/num_shards 를 사용합니다.
+
+    Args:
+        factory (Callable): 백엔드 객체를 만드는 함수. 각 프로세스에서 호출되므로 pickle 할 수 있어야 합니다.
+        in_filepath (str): 입력 파일 경로
+        out_filepath (str): 출력 파일 경로
+        func (Callable): translate_func 또는 run_func. pickle 할 수 있어야 합니다. (모듈 수준 함수, translate_fields 등)
+        num_shards (int): shard(프로세스) 수
+        **kwargs: atranslate_jsonl / aeval_jsonl 에 전달할 추가 옵션
+    """
+    ctx = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=run_shard, args=(factory, in_filepath, out_filepath, func, index, num_shards), kwargs=kwargs)
+             for index in range(num_shards)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    failed = [index for index, proc in enumerate(procs) if proc.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"shards {failed} failed; rerun to resume them before merging")
+    merge_shards(in_filepath, out_filepath, num_shards)
+
+
+def merge_shards(in_filepath: str, out_filepath: str, num_shards: int, prepare: Optional[Callable[[int, dict], dict]] = Translate.append_id):
+    """
+    shard 출력 파일들을 입력 파일의 순서대로 합쳐 하나의 출력 파일(과 manifest)을 만듭니다.
+    각 shard 의 manifest 에서 id 별 바이트 위치를 읽어 필요한 줄만 읽으므로, shard 출력을 다시 파싱하지 않습니다.
+
+    Args:
+        in_filepath (str): 입력 파일 경로 (출력 순서를 정합니다)
+        out_filepath (str): 합친 출력 파일 경로
+        num_shards (int): shard 수
+        prepare (Callable[[int, dict], dict], optional): 입력 객체에 id 를 붙이는 함수. Defaults to Translate.append_id.
+    """
+    locations = {}  # id -> (shard 파일, offset, length)
+    for index in range(num_shards):
+        path = shard_filepath(out_filepath, index, num_shards)
+        if not os.path.exists(path):
+            continue
+        checkpoint = Checkpoint(path)
+        checkpoint.recover()  # manifest 를 정리하고(필요하면 다시 만들고) 잘린 꼬리를 제거합니다.
+        checkpoint.close()
+        with open(checkpoint.manifest_filepath, encoding='utf-8') as f:
+            for line in f:
+                offset, nbytes, obj_id = line.rstrip('\n').split('\t', 2)
+                locations[json.dumps(json.loads(obj_id))] = (index, int(offset), int(nbytes))
+
+    paths = [shard_filepath(out_filepath, index, num_shards) for index in range(num_shards)]
+    shard_fps = [open(path, 'rb') if os.path.exists(path) else None for path in paths]
+    merged = Checkpoint(out_filepath)
+    merged.reset()
+    missing = 0
+    try:
+        with open(out_filepath, 'wb') as out:
+            for obj in iter_jsonl(in_filepath, prepare):
+                location = locations.get(json.dumps(obj['id']))
+                if location is None:
+                    missing += 1  # 실패하여 dead-letter 로 간 레코드 등
+                    continue
+                index, offset, nbytes = location
+                shard_fps[index].seek(offset)
+                line = shard_fps[index].read(nbytes)
+                out.write(line)
+                merged.add(obj['id'], len(line))
+        merged.flush()
+    finally:
+        merged.close()
+        for fp in shard_fps:
+            if fp is not None:
+                fp.close()
+    if missing:
+        print(colored(f"merge: {missing} records missing from shards (see *.dead.jsonl)", 'red'))
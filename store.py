@@ -0,0 +1,262 @@
+# python
+from typing import Iterator, List, Optional
+import hashlib
+import json
+import os
+import re
+import sqlite3
+# 유틸리티 함수
+from termcolor import colored
+import fire
+# framework
+from checkpoint import read_index
+
+
+# 파일 이름 규칙: <dataset>[_<translator>_ko][_eval_<evaluator>].jsonl
+FILENAME_PATTERN = re.compile(r'^(?P<dataset>.+?)(?:_(?P<translator>[^_]+)_ko)?(?:_eval_(?P<evaluator>[^_]+))?\.jsonl$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    dataset TEXT NOT NULL,
+    translator TEXT NOT NULL,  -- 원문은 ''
+    id TEXT NOT NULL,
+    instance INTEGER NOT NULL,  -- instances 의 순번 (instances 가 없는 레코드는 0)
+    instruction TEXT,
+    input TEXT,
+    reference TEXT,  -- 데이터셋의 참조 출력 (번역 결과 파일의 output)
+    PRIMARY KEY (dataset, translator, id, instance)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_by_id ON items (dataset, id);
+CREATE TABLE IF NOT EXISTS evaluators (
+    name TEXT PRIMARY KEY,
+    col TEXT NOT NULL  -- items 테이블에서 이 평가 모델의 출력을 담는 열 이름
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    filepath TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,  -- 이 위치까지 읽은 줄을 적재했습니다.
+    identity TEXT  -- 적재할 때의 파일 식별값 (file_identity)
+);
+'''
+
+
+def parse_filename(filepath: str) -> dict:
+    """
+    파이프라인 출력 파일 이름에서 (dataset, translator, evaluator) 를 읽습니다.
+
+    예) user_oriented_instructions_deepl_ko_eval_gpt4.jsonl -> ('user_oriented_instructions', 'deepl', 'gpt4')
+    """
+    match = FILENAME_PATTERN.match(os.path.basename(filepath))
+    if match is None:
+        raise ValueError(f"cannot parse dataset/translator/evaluator from {filepath!r}; pass them explicitly")
+    return {k: v or '' for k, v in match.groupdict().items()}
+
+
+def file_identity(filepath: str, index: dict, end: int) -> str:
+    """
+    파일의 앞부분 [0, end) 가 새로 쓰였는지 알아보기 위한 식별값을 반환합니다.
+    inode 와 함께 그 범위의 색인(id, 위치, 길이)과 첫 줄, 마지막 줄의 해시를 사용하므로, 뒤에 줄이 추가되어도 값이 바뀌지 않고
+    같은 inode 에 다시 썼다면(JsonlWriter 의 'w' 모드) 첫 줄이 같아도 줄의 순서나 길이가 달라져 다른 값이 됩니다.
+
+    Args:
+        filepath (str): jsonl 파일 경로
+        index (dict): read_index 의 결과 (파일 순서대로 정렬되어 있습니다)
+        end (int): 식별값을 계산할 범위의 끝 (이전에 적재한 위치)
+    """
+    stat = os.stat(filepath)
+    entries = [(obj_id, offset, nbytes) for obj_id, (offset, nbytes) in index.items() if offset + nbytes <= end]
+    digest = hashlib.md5(json.dumps(entries, ensure_ascii=False).encode('utf-8'))
+    if entries:
+        with open(filepath, 'rb') as f:
+            for _, offset, nbytes in (entries[0], entries[-1]):
+                f.seek(offset)
+                digest.update(f.read(nbytes))
+    return f'{stat.st_dev}:{stat.st_ino}:{digest.hexdigest()}'
+
+
+def flatten(obj: dict) -> Iterator[tuple]:
+    """
+    레코드를 (instance, instruction, input, output) 행들로 펼칩니다.
+    user_oriented_instructions 는 instances 마다, dolly 는 context/response 로 한 행을 만듭니다.
+    """
+    if 'instances' in obj:
+        for idx, instance in enumerate(obj['instances']):
+            yield idx, obj.get('instruction'), instance.get('input'), instance.get('output')
+    elif 'answer' in obj:  # evalset_prepare 의 instances 가 없는 레코드
+        yield 0, obj.get('instruction'), obj.get('input'), obj.get('answer')
+    else:
+        yield 0, obj.get('instruction'), obj.get('context', obj.get('input')), obj.get('response', obj.get('output'))
+
+
+class ResultStore:
+    """
+    파이프라인의 번역/평가 결과를 (dataset, translator, id, instance) 로 색인한 SQLite 저장소입니다.
+    평가 모델마다 출력 열을 하나씩 두므로(열 지향), 모델 간 비교는 조인 없이 한 번의 색인 범위 스캔으로 끝납니다.
+
+    Args:
+        path (str, optional): SQLite 파일 경로. Defaults to 'results.sqlite'.
+    """
+
+    def __init__(self, path: str = 'results.sqlite'):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')  # 적재하는 동안에도 app 등에서 읽을 수 있도록 합니다.
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        if 'identity' not in {row['name'] for row in self.conn.execute('PRAGMA table_info(ingested)')}:
+            self.conn.execute('ALTER TABLE ingested ADD COLUMN identity TEXT')  # 이전 버전에서 만든 저장소
+        self.conn.commit()
+        self.columns = {row['name']: row['col'] for row in self.conn.execute('SELECT name, col FROM evaluators')}
+
+    def column(self, evaluator: str) -> str:
+        """평가 모델의 출력 열 이름을 반환합니다. 처음 보는 모델이면 열을 추가합니다. 빈 문자열은 참조 출력(reference) 열입니다."""
+        if not evaluator:
+            return 'reference'
+        if evaluator not in self.columns:
+            col = 'out_' + re.sub(r'\W', '_', evaluator)
+            while col in self.columns.values():
+                col += '_'
+            with self.conn:
+                self.conn.execute(f'ALTER TABLE items ADD COLUMN "{col}" TEXT')
+                self.conn.execute('INSERT INTO evaluators (name, col) VALUES (?, ?)', (evaluator, col))
+            self.columns[evaluator] = col
+        return self.columns[evaluator]
+
+    def ingest(self, filepath: str, dataset: Optional[str] = None, translator: Optional[str] = None, evaluator: Optional[str] = None) -> int:
+        """
+        출력 파일을 적재합니다. 이전에 적재한 위치 이후의 줄만 읽으므로, 실행 중인 파일을 여러 번 적재해도 됩니다. (upsert)
+        파일이 처음부터 다시 쓰였으면(이전 위치보다 작아졌거나 file_identity 가 바뀌었으면) 그 파일의 열을 비우고 처음부터 적재합니다.
+
+        Args:
+            filepath (str): jsonl 파일 경로
+            dataset, translator, evaluator (str, optional): 지정하지 않으면 파일 이름에서 읽습니다.
+
+        Returns:
+            int: 적재한 레코드 수
+        """
+        names = parse_filename(filepath) if None in (dataset, translator, evaluator) else {}
+        dataset = dataset if dataset is not None else names['dataset']
+        translator = translator if translator is not None else names['translator']
+        evaluator = evaluator if evaluator is not None else names['evaluator']
+        col = self.column(evaluator)
+
+        key = os.path.abspath(filepath)
+        row = self.conn.execute('SELECT offset, identity FROM ingested WHERE filepath = ?', (key,)).fetchone()
+        start = row['offset'] if row else 0
+        # manifest 에 기록된(쓰기가 끝난) 줄만 적재합니다. 결과 디렉터리에는 아무것도 쓰지 않습니다.
+        index = read_index(filepath, write_manifest=False)
+        end = max((offset + nbytes for offset, nbytes in index.values()), default=0)
+        # 이전에 적재한 범위가 그대로인지 확인합니다.
+        if end < start or (row is not None and row['identity'] != file_identity(filepath, index, start)):
+            start = 0
+            self.conn.execute(f'UPDATE items SET "{col}" = NULL WHERE dataset = ? AND translator = ?', (dataset, translator))
+
+        count = 0
+        rows = []
+        with open(filepath, 'rb') as f:
+            for obj_id, (offset, nbytes) in index.items():
+                if offset < start:
+                    continue
+                f.seek(offset)
+                obj = json.loads(f.read(nbytes))
+                for instance, instruction, input, output in flatten(obj):
+                    rows.append((dataset, translator, str(obj_id), instance, instruction, input, output))
+                count += 1
+        with self.conn:
+            self.conn.executemany(f'''
+                INSERT INTO items (dataset, translator, id, instance, instruction, input, "{col}") VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dataset, translator, id, instance) DO UPDATE SET
+                    instruction = COALESCE(items.instruction, excluded.instruction),
+                    input = COALESCE(items.input, excluded.input),
+                    "{col}" = excluded."{col}"
+            ''', rows)
+            self.conn.execute('INSERT OR REPLACE INTO ingested (filepath, offset, identity) VALUES (?, ?, ?)', (key, end, file_identity(filepath, index, end)))
+        if rows:
+            self.conn.execute('PRAGMA analysis_limit=1000')
+            self.conn.execute('ANALYZE items')  # 통계를 갱신하여 id 조회가 items_by_id 색인을 사용하도록 합니다.
+        return count
+
+    def get(self, dataset: str, id: str, translator: Optional[str] = None) -> List[dict]:
+        """id 에 해당하는 모든 행(번역기, instance 별)을 평가 모델별 출력과 함께 반환합니다."""
+        sql = 'SELECT * FROM items WHERE dataset = ? AND id = ?'
+        params = [dataset, str(id)]
+        if translator is not None:
+            sql += ' AND translator = ?'
+            params.append(translator)
+        return [self._row(row) for row in self.conn.execute(sql + ' ORDER BY translator, instance', params)]
+
+    def evaluators(self) -> List[str]:
+        """적재된 평가 모델 목록을 반환합니다."""
+        return list(self.columns)
+
+    def compare(self, dataset: str, translator: str, a: str, b: str, differ=True, limit: Optional[int] = None) -> List[dict]:
+        """
+        같은 입력에 대한 두 평가 모델 a, b 의 출력을 나란히 반환합니다. 두 모델의 출력이 모두 있는 행만 비교합니다.
+
+        예) store.compare('user_oriented_instructions', 'deepl', 'gpt4', 'chatgpt')  # GPT4 와 ChatGPT 의 출력이 다른 행
+
+        Args:
+            dataset (str): 데이터셋 이름
+            translator (str): 번역기 이름
+            a, b (str): 평가 모델 이름 (빈 문자열은 참조 출력)
+            differ (bool, optional): True 이면 출력이 다른 행만, False 이면 같은 행만 반환합니다. Defaults to True.
+            limit (int, optional): 최대 행 수
+
+        Returns:
+            List[dict]: id, instance, instruction, input, output_a, output_b
+        """
+        x, y = self.column(a), self.column(b)
+        sql = f'''
+            SELECT id, instance, instruction, input, "{x}" AS output_a, "{y}" AS output_b FROM items
+            WHERE dataset = ? AND translator = ? AND "{x}" IS NOT NULL AND "{y}" IS NOT NULL AND "{x}" {'!=' if differ else '='} "{y}"
+        '''
+        params = [dataset, translator]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def export_jsonl(self, filepath: str, sql: str, params: tuple = ()) -> int:
+        """SQL 질의 결과를 jsonl 파일로 내보내고, 내보낸 행 수를 반환합니다."""
+        count = 0
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for row in self.conn.execute(sql, params):
+                f.write(json.dumps(self._row(row), ensure_ascii=False)+'\n')
+                count += 1
+        return count
+
+    def close(self):
+        self.conn.close()
+
+    def _row(self, row: sqlite3.Row) -> dict:
+        # out_<열> 을 평가 모델 이름으로 바꿔 반환합니다.
+        names = {col: name for name, col in self.columns.items()}
+        return {names.get(k, k): row[k] for k in row.keys()}
+
+
+def ingest(*filepaths: str, db='results.sqlite'):
+    """출력 파일들을 저장소에 적재합니다. 예) python store.py ingest user_oriented_instructions_*.jsonl"""
+    store = ResultStore(db)
+    try:
+        for filepath in filepaths:
+            count = store.ingest(filepath)
+            print(colored(f"{filepath}: {count} records", 'yellow'))
+    finally:
+        store.close()
+
+
+def differ(dataset: str, translator: str, a: str, b: str, db='results.sqlite', out: Optional[str] = None):
+    """두 평가 모델의 출력이 다른 행 수를 출력하고, out 이 있으면 jsonl 로 저장합니다."""
+    store = ResultStore(db)
+    try:
+        rows = store.compare(dataset, translator, a, b)
+        print(colored(f"{len(rows)} rows differ between {a} and {b}", 'yellow'))
+        if out:
+            with open(out, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False)+'\n')
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    fire.Fire({'ingest': ingest, 'differ': differ})
@@ -0,0 +1,124 @@
+# python
+import time
+from typing import Optional
+# 비동기
+import asyncio
+import openai
+# framework
+from limiter import estimate_tokens, DEFAULT_COMPLETION_TOKENS
+from metrics import metrics, record_tokens
+
+
+# langchain 메시지 타입 -> OpenAI chat completions role
+ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+# HTTP 클라이언트의 타임아웃을 max_seconds 보다 이만큼(초) 길게 두어, 시간 한도는 항상 stream_eval 의 deadline 이 판단하도록 합니다.
+HTTP_TIMEOUT_MARGIN = 10
+
+
+class GenerationCapExceeded(Exception):
+    """streaming 생성이 토큰 수 또는 시간 한도에 걸렸고, 부분 결과를 쓰지 않도록 설정된 경우 발생합니다."""
+
+
+class GenerationStalled(Exception):
+    """첫 토큰이 오기 전에 시간 한도에 걸린 경우 발생합니다. 빈 답변을 결과로 쓰지 않고 레코드를 다시 시도합니다."""
+
+
+class StreamingEval:
+    """
+    ChatGPTEval/GPT4Eval 이 응답을 streaming 으로 받도록 하는 mixin 입니다.
+    토큰이 도착하는 대로 읽으므로 첫 토큰까지의 시간(TTFT)과 초당 토큰 수를 요청마다 기록할 수 있고,
+    출력 토큰 수나 경과 시간이 한도를 넘으면 생성을 끊고 동시성 슬롯을 바로 돌려줍니다.
+
+    사용하는 클래스는 model_name, limiter(endpoints.EndpointPool), input_prompt, instruct_prompt 속성을 가져야 합니다.
+    """
+
+    def init_streaming(self, stream=False, max_output_tokens: Optional[int] = None, max_seconds: Optional[float] = None, partial_outputs=True):
+        """
+        Args:
+          stream (bool): streaming 모드 사용 여부 (default: False)
+          max_output_tokens (int): 요청당 최대 출력 토큰 수. 서버에도 max_tokens 로 전달합니다. (default: None, 제한 없음)
+          max_seconds (float): 요청당 최대 경과 시간(초) (default: None, 제한 없음)
+          partial_outputs (bool): 한도에 걸린 경우 그때까지의 출력을 결과로 쓸지 여부.
+            False 이면 GenerationCapExceeded 를 발생시켜 레코드를 dead-letter 로 보냅니다. (default: True)
+            출력이 하나도 없이 시간 한도에 걸리면 이 값과 상관없이 GenerationStalled 를 발생시켜 다시 시도합니다.
+        """
+        self.stream = stream
+        self.max_output_tokens = max_output_tokens
+        self.max_seconds = max_seconds
+        self.partial_outputs = partial_outputs
+
+    async def stream_eval(self, instruction: str, input: str) -> str:
+        """
+        instruction 과 input 으로 답변을 streaming 으로 생성합니다.
+
+        Args:
+          instruction (str): 지시문
+          input (str): 입력 (빈 문자열이면 instruction 만 사용합니다)
+
+        Returns:
+          str: 생성된 답변 (한도에 걸렸고 partial_outputs 가 True 이면 그때까지의 답변)
+
+        Raises:
+          GenerationStalled: 첫 토큰이 오기 전에 시간 한도에 걸린 경우 (재시도할 수 있습니다)
+          GenerationCapExceeded: 한도에 걸렸고 partial_outputs 가 False 인 경우
+        """
+        if input.strip() == '':
+            messages = self.instruct_prompt.format_messages(instruction=instruction)
+        else:
+            messages = self.input_prompt.format_messages(instruction=instruction, input=input)
+        messages = [{'role': ROLES[m.type], 'content': m.content} for m in messages]
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+        options = {'max_tokens': self.max_output_tokens} if self.max_output_tokens else {}
+
+        parts, tokens, truncated = [], 0, None
+        async with self.limiter.slot(prompt_tokens + (self.max_output_tokens or DEFAULT_COMPLETION_TOKENS)) as endpoint:
+            start = time.perf_counter()
+            deadline = start + self.max_seconds if self.max_seconds else None
+            if self.max_seconds:
+                # 시간 한도는 아래의 wait_for 가 판단합니다. HTTP 클라이언트가 먼저 끊으면 과부하(openai.error.Timeout)로 처리되기 때문입니다.
+                options['request_timeout'] = self.max_seconds + HTTP_TIMEOUT_MARGIN
+            first = response = None
+            try:
+                # 고른 엔드포인트의 파라미터(api_key, api_base 등)로 요청합니다. 응답이 시작되기 전의 지연도 max_seconds 에 포함됩니다.
+                create = openai.ChatCompletion.acreate(model=self.model_name, messages=messages, stream=True, **options, **endpoint.params)
+                try:
+                    response = await asyncio.wait_for(create, self.max_seconds)
+                except asyncio.TimeoutError:
+                    truncated = 'time'
+                while response is not None:
+                    timeout = deadline - time.perf_counter() if deadline else None
+                    try:
+                        chunk = await asyncio.wait_for(response.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        truncated = 'time'
+                        break
+                    delta = chunk['choices'][0].get('delta', {}).get('content')
+                    if not delta:
+                        continue
+                    if first is None:
+                        first = time.perf_counter()
+                        metrics.observe('ttft_seconds', first - start, backend=self.limiter.name)
+                    parts.append(delta)
+                    tokens += 1  # streaming 응답의 content 조각 하나는 대략 토큰 하나입니다.
+                    if self.max_output_tokens and tokens >= self.max_output_tokens:
+                        truncated = 'tokens'
+                        break
+            finally:
+                if response is not None:
+                    await response.aclose()  # 생성을 끊고 연결을 풀에 돌려줍니다.
+            elapsed = time.perf_counter() - (first or start)
+            if first is None and truncated == 'time':
+                # 첫 토큰 전에 시간 한도에 걸린 요청도 TTFT 분포에 남깁니다. (실제 TTFT 는 이보다 깁니다)
+                metrics.observe('ttft_seconds', elapsed, backend=self.limiter.name)
+        if tokens and elapsed > 0:
+            metrics.observe('output_tokens_per_second', tokens / elapsed, backend=self.limiter.name)
+        record_tokens(self.limiter.name, prompt_tokens, tokens)
+        if truncated is not None:
+            metrics.inc('truncated_generations_total', backend=self.limiter.name, reason=truncated)
+            if not tokens:
+                raise GenerationStalled(f"no output within {self.max_seconds}s")
+            if not self.partial_outputs:
+                raise GenerationCapExceeded(f"generation stopped at {tokens} tokens ({truncated} cap)")
+        return ''.join(parts)
@@ -0,0 +1,74 @@
+# python
+import json
+import threading
+# 비동기
+import asyncio
+# framework
+from cache import CachedTranslate, TranslationCache
+from translate import Translate
+
+
+class FakeTranslator(Translate):
+    """API 를 호출하지 않고 대문자로 바꾸는 번역기"""
+
+    def __init__(self):
+        self.backend = 'fake'
+        self.model_name = 'fake'
+        self.template = ''
+
+    async def __call__(self, original_text, target_lang='Korean'):
+        await asyncio.sleep(0.001)
+        return original_text.upper()
+
+
+def translate_record(translate, obj):
+    obj['text'] = translate(obj['text'])
+    return obj
+
+
+def test_translate_jsonl_sync_func_does_not_starve_executor(tmp_path):
+    # 기본 executor 크기(최대 32)보다 많은 worker 가 백그라운드 루프를 기다려도, 캐시와 writer 는 계속 진행되어야 합니다.
+    in_filepath, out_filepath = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    in_filepath.write_text(''.join(json.dumps({'id': i, 'text': f'text {i}'}) + '\n' for i in range(200)))
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite'))
+    translator = CachedTranslate(FakeTranslator(), cache)
+
+    errors = []
+
+    def run():
+        try:
+            translator.translate_jsonl(str(in_filepath), str(out_filepath), translate_record, verbose=False, max_concurrency=40)
+        except Exception as e:  # 실패도 결과로 확인합니다.
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), "translate_jsonl deadlocked"
+    assert not errors
+    results = {obj['id']: obj['text'] for obj in map(json.loads, out_filepath.read_text().splitlines())}
+    assert results == {i: f'TEXT {i}' for i in range(200)}
+    cache.close()
+
+
+def test_background_loop_closes_its_session():
+    import httppool
+    from background import BackgroundLoop
+
+    async def session_of_loop():
+        return httppool.get_session()
+
+    loop = BackgroundLoop()
+    session = loop.run(session_of_loop(), timeout=10)
+    assert not session.closed
+    loop.close()
+    assert session.closed
+    assert loop.loop not in httppool.sessions
+
+    # shared_session 밖에서 세션을 만들면 닫을 주체가 없으므로 거부합니다.
+    try:
+        asyncio.run(session_of_loop())
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("get_session() outside shared_session() must fail")
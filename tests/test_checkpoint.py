@@ -0,0 +1,43 @@
+# python
+import json
+# framework
+from checkpoint import Checkpoint, line_id, read_index
+
+
+def write_jsonl(path, objs):
+    path.write_bytes(b''.join(json.dumps(obj, ensure_ascii=False).encode('utf-8') + b'\n' for obj in objs))
+
+
+def test_line_id_reads_only_the_id():
+    assert line_id(b'{"id": "a \\"b\\"", "text": "x"}\n') == 'a "b"'
+    assert line_id(b'{"text": "x", "id": 3}\n') == 3  # Translate.append_id 는 id 를 마지막에 추가합니다.
+    assert line_id(b'{"text": {"id": 1}, "id": 2}\n') == 2
+    assert line_id(b'{"meta": {"id": 1}, "text": "y", "id": "z"}\n') == 'z'
+    assert line_id(b'{"text": "x", "nested": {"id": 1}, "x": 0, "id": 4.5}\n') == 4.5
+    assert line_id(b'{"text": "x", "id": 7, "z": {"id": 8}}\n') == 7  # 패턴에 맞지 않으면 줄 전체를 파싱합니다.
+
+
+def test_read_index_without_manifest_does_not_write(tmp_path):
+    out = tmp_path / 'out.jsonl'
+    write_jsonl(out, [{'id': i, 'text': 't' * i} for i in range(5)])
+    index = read_index(str(out), write_manifest=False)
+    assert list(index) == list(range(5))
+    assert not (tmp_path / 'out.jsonl.ckpt').exists()
+    with open(out, 'rb') as f:
+        for obj_id, (offset, nbytes) in index.items():
+            f.seek(offset)
+            assert json.loads(f.read(nbytes))['id'] == obj_id
+
+
+def test_stale_manifest_is_rebuilt(tmp_path):
+    out = tmp_path / 'out.jsonl'
+    write_jsonl(out, [{'id': i, 'text': 'short'} for i in range(3)])
+    assert len(read_index(str(out))) == 3  # manifest 를 만듭니다.
+    # 같은 경로에 더 긴 줄들로 다시 쓰면, 이전 manifest 의 위치는 줄 중간을 가리킵니다.
+    write_jsonl(out, [{'id': i, 'text': 'much longer text ' * 3} for i in range(3)])
+    index = read_index(str(out), write_manifest=False)
+    with open(out, 'rb') as f:
+        for obj_id, (offset, nbytes) in index.items():
+            f.seek(offset)
+            assert json.loads(f.read(nbytes))['id'] == obj_id
+    assert Checkpoint(str(out)).recover() == {0, 1, 2}
@@ -0,0 +1,49 @@
+# python
+import json
+# 비동기
+import asyncio
+# framework
+from eval import Evaluate
+from judge import JudgmentStore, PairwiseJudge
+
+
+class FakeJudge(Evaluate):
+    """API 를 호출하지 않고 더 긴 답변을 고르는 심판 모델"""
+
+    def __init__(self):
+        self.backend = 'fake'
+        self.model_name = 'fake'
+        self.calls = 0
+
+    async def __call__(self, instruction, input):
+        self.calls += 1
+        await asyncio.sleep(0)
+        first = instruction.split('##Answer A:\n\n')[1].split('\n\n##Answer B:')[0]
+        second = instruction.split('##Answer B:\n\n')[1]
+        return '[[A]]' if len(first) > len(second) else '[[B]]'
+
+
+def write_jsonl(path, answers):
+    path.write_text(''.join(json.dumps({'id': i, 'instruction': 'q', 'input': '', 'answer': answer}) + '\n' for i, answer in enumerate(answers)))
+
+
+def test_rerun_judges_only_changed_rows(tmp_path):
+    filepath_a, filepath_b = tmp_path / 'ds_deepl_ko_eval_a.jsonl', tmp_path / 'ds_deepl_ko_eval_b.jsonl'
+    write_jsonl(filepath_a, ['long answer 0', 'long answer 1', 'long answer 2'])
+    write_jsonl(filepath_b, ['short 0', 'short 1', 'short 2'])
+    store = JudgmentStore(str(tmp_path / 'judgments.sqlite'))
+    judge = FakeJudge()
+    pairwise = PairwiseJudge(judge, store)
+
+    result = asyncio.run(pairwise.ajudge_files(str(filepath_a), str(filepath_b), verbose=False))
+    assert judge.calls == 6  # 행마다 순서를 바꿔 두 번
+    assert (result['judged'], result['wins_a'], result['wins_b'], result['ties']) == (3, 3, 0, 0)
+
+    # b 의 답변 하나만 바꾸면 그 행의 두 판정만 요청하고, 승자 수는 바뀐 만큼만 갱신합니다.
+    write_jsonl(filepath_b, ['short 0', 'a much longer answer 1', 'short 2'])
+    result = asyncio.run(pairwise.ajudge_files(str(filepath_a), str(filepath_b), verbose=False))
+    assert judge.calls == 8
+    assert (result['judged'], result['reused']) == (1, 2)
+    assert (result['wins_a'], result['wins_b'], result['ties']) == (2, 1, 0)
+    assert store.totals(result['comparison']) == {'a': 2, 'b': 1}
+    store.close()
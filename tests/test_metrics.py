@@ -0,0 +1,26 @@
+# python
+import threading
+# framework
+from metrics import Metrics
+
+
+def test_updates_from_many_threads_are_not_lost():
+    metrics = Metrics()
+
+    def work():
+        for i in range(20000):
+            metrics.inc('requests_total', backend='fake')
+            metrics.observe('request_seconds', 0.1, backend=f'fake{i % 10}')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):  # 갱신 중에 요약해도 dict 크기 변경 오류가 나지 않아야 합니다.
+        metrics.summary()
+        metrics.prometheus()
+    for thread in threads:
+        thread.join()
+
+    summary = metrics.summary()
+    assert summary['counters'] == [{'name': 'requests_total', 'labels': {'backend': 'fake'}, 'value': 160000}]
+    assert sum(row['value']['count'] for row in summary['histograms']) == 160000
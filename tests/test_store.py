@@ -0,0 +1,35 @@
+# python
+import json
+# framework
+from store import ResultStore
+
+
+def write_jsonl(path, answers, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        for obj_id, answer in answers:
+            f.write(json.dumps({'id': obj_id, 'instruction': 'q', 'input': 'x', 'answer': answer}, ensure_ascii=False) + '\n')
+
+
+def outputs(store):
+    return {row['id']: row['out_gpt4'] for row in store.conn.execute('SELECT id, out_gpt4 FROM items')}
+
+
+def test_ingest_appends_and_detects_rewrites(tmp_path):
+    filepath = tmp_path / 'ds_deepl_ko_eval_gpt4.jsonl'
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+
+    write_jsonl(filepath, [(0, 'a'), (1, 'b')])
+    assert store.ingest(str(filepath)) == 2
+    write_jsonl(filepath, [(2, 'c')], mode='a')
+    assert store.ingest(str(filepath)) == 1  # 추가된 줄만 읽습니다.
+    assert outputs(store) == {'0': 'a', '1': 'b', '2': 'c'}
+
+    # 같은 inode 에 첫 줄은 같고 나머지가 다른 결과를 다시 씁니다. (increment=False 로 다시 실행한 경우)
+    with open(filepath, 'r+', encoding='utf-8') as f:
+        f.truncate(0)
+    write_jsonl(filepath, [(0, 'a'), (1, 'bb'), (2, 'cc'), (3, 'dd')], mode='a')
+    assert store.ingest(str(filepath)) == 4
+    assert outputs(store) == {'0': 'a', '1': 'bb', '2': 'cc', '3': 'dd'}
+
+    assert not list(tmp_path.glob('*.ckpt'))  # 적재는 결과 디렉터리를 수정하지 않습니다.
+    store.close()
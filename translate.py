@@ -1,18 +1,14 @@
 # python
 from abc import ABC, abstractmethod
-from typing import Callable
-import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
 # 비동기
 from functools import partial
 import asyncio
-from tqdm.asyncio import tqdm_asyncio
-# jsonl 파일 핸들링
-import jsonlines
-from aiofile import async_open
-import json
-# 유틸리티 함수
-from termcolor import colored
-import tqdm
+# framework
+from pipeline import arun_jsonl
+from background import get_loop
+from planner import Planner, field_paths, report
 
 
 class Translate(ABC):
@@ -44,55 +40,79 @@ class Translate(ABC):
         """
         pass
     
+    def submit(self, original_text) -> Future:
+        """
+        백그라운드 이벤트 루프에서 번역을 시작하고 concurrent.futures.Future 를 바로 반환합니다.
+        여러 스레드에서 동시에 호출해도 모두 같은 이벤트 루프, 세션, 제한기를 사용합니다.
+        """
+        return get_loop().submit(self.__call__(original_text))
+
     def translate(self, original_text):
-        return asyncio.run(self.__call__(original_text))
+        """문자열 하나를 번역하고 결과를 기다려 반환하는 동기 메소드입니다."""
+        return get_loop().run(self.__call__(original_text))
+
+    def map(self, texts: Iterable[str], max_concurrency=256) -> Iterator[str]:
+        """
+        문자열들을 동시에 번역하고, 번역 결과를 입력 순서대로 돌려주는 동기 메소드입니다.
+
+        예) translated = list(DeepL().map(texts))
+
+        Args:
+            texts (Iterable[str]): 번역할 문자열들
+            max_concurrency (int, optional): 동시에 제출하는 번역 수의 상한. Defaults to 256.
+        """
+        return get_loop().map(self.__call__, texts, max_concurrency=max_concurrency)
     
-    def append_id(self, idx, obj):
+    @staticmethod
+    def append_id(idx, obj):
         if 'id' not in obj.keys():
             obj['id'] = idx
         return obj
 
-    def translate_jsonl(self, in_filepath: str, out_filepath: str, translate_func: Callable[[Callable[[str], str], dict], dict], verbose=True, dev=False):
+    def translate_jsonl(self, in_filepath: str, out_filepath: str, translate_func: Callable[[Callable[[str], str], dict], dict], verbose=True, dev=False, max_concurrency=10, increment=False, paths=None, **kwargs):
         """
         JSON 파일에서 데이터를 읽어 번역 함수(translate_func)로 변환한 후 새로운 JSON 파일로 저장하는 메서드입니다.
+        백그라운드 이벤트 루프에서 atranslate_jsonl 을 실행하므로, 처리량은 atranslate_jsonl 과 같습니다.
     
         Args:
             in_filepath (str): 입력할 JSON 파일의 경로와 이름. 확장자는 반드시 .jsonl 이어야 합니다.
             out_filepath (str): 출력할 JSON 파일의 경로와 이름. 확장자는 반드시 .jsonl 이어야 합니다.
-            translate_func (Callable[[dict], dict]): 각각의 객체를 번역하는데 사용될 함수
+            translate_func (Callable[[dict], dict]): 각각의 객체를 번역하는데 사용될 함수.
+                비동기 함수(translator, obj) 이면 atranslate_jsonl 과 같이 사용하고, 동기 함수이면 동기 번역 함수(self.translate)를 받아 스레드에서 실행합니다.
             verbose (bool): 진행 상황 메시지 출력 여부 (기본값: True)
             dev (bool): 개발자 모드 사용 여부 (기본값: False)
+            max_concurrency (int): 동시에 실행될 worker 수 (기본값: 10)
+            increment (bool): 증분 모드 여부. 기본값은 출력 파일을 새로 쓰는 것입니다. (기본값: False)
+            paths (Sequence[str], optional): 번역할 필드 경로. dry_run 이나 schedule='longest' 에서 예상 처리량을 계산하는 데 씁니다.
+                None 이면 translate_fields 로 만든 translate_func 에서 읽습니다.
+            **kwargs: atranslate_jsonl 에 전달할 추가 옵션
     
         Returns:
-            None
+            dict: dry_run 인 경우 planner.Planner.plan 의 결과, 그 외에는 None
         """
-      
-        # 입력 및 출력 파일을 처리하기 위해 jsonl 라이브러리 사용
-        with jsonlines.open(in_filepath) as reader:
-            with jsonlines.open(out_filepath, mode='w') as writer:
-                if dev:
-                    print(colored("DEV MODE IS ON, only 5 objs are converted", 'red'))
-                # verbose 옵션이 True인 경우 for loop에서 tqdm 라이브러리를 사용하여 진행 상황을 표시
-                if verbose:
-                    print(colored(f"in_filepath: {in_filepath}", 'yellow'))
-                    print(colored(f"out_filepath: {out_filepath}", 'yellow'))
-                    iterator = tqdm.tqdm(reader)
-                # verbose가 False인 경우, 진행 상황 메시지를 출력하지 않고 원래의 iterable한 객체를 반환
-                else:
-                    iterator = reader
-                  
-                # JSON 파일 안의 모든 객체에 대해 입력받은 번역 함수(translate_func)로 번역 작업을 수행하고, 새로운 JSON 파일에 쓰기
-                for idx, obj in enumerate(iterator):
-                    obj = self.append_id(idx, obj)
-                    if dev:
-                        print(colored(f"\nORIGINAL: {obj}", 'blue'))
-                    t_obj = translate_func(asyncio.run(self.__call__), obj) # 입력으로 받은 번역 함수(translate_func)를 이용해 번역 작업 수행
-                    if dev:
-                        print(colored(f"TRANSLATED: {t_obj}", 'green'))
-                        if idx > 4:
-                            break # 개발자 모드(dev=True)일 때, 5개 이상 객체가 변환되면 break
-                    writer.write(t_obj) # 새로운 JSON 파일에 변환된 객체 쓰기
-    
+        if paths is None:
+            paths = field_paths(translate_func, 'translate')
+        executor = None
+        if not asyncio.iscoroutinefunction(translate_func):
+            sync_func = translate_func
+            # 동기 함수는 백그라운드 루프의 결과를 기다리며 스레드를 붙잡습니다. 루프의 기본 executor 는 캐시와 writer 도 사용하므로,
+            # 같이 쓰면 worker 수가 executor 크기 이상일 때 모든 스레드가 루프를 기다리며 멈춥니다. 따라서 이 호출만의 스레드 풀을 사용합니다.
+            executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='translate_jsonl')
+
+            async def translate_func(translator, obj):
+                return await asyncio.get_running_loop().run_in_executor(executor, sync_func, translator.translate, obj)
+
+        try:
+            return get_loop().run(self.atranslate_jsonl(in_filepath, out_filepath, translate_func,
+                                                        max_concurrency=max_concurrency,
+                                                        verbose=verbose,
+                                                        dev=dev,
+                                                        increment=increment,
+                                                        paths=paths,
+                                                        **kwargs))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
 
     async def atranslate_jsonl(
             self,
@@ -102,57 +122,76 @@ class Translate(ABC):
             max_concurrency=10,
             verbose=True,
             dev=False,
-            increment=True):
+            increment=True,
+            schedule='file',
+            dry_run=False,
+            paths=None,
+            **kwargs):
         """
         JSON 파일에서 데이터를 읽어 번역 함수(translate_func)로 변환한 후 새로운 JSON 파일로 저장하는 비동기 메서드입니다.
+        입력 파일은 스트리밍으로 읽으므로 파일 크기와 상관없이 메모리 사용량과 태스크 수가 max_concurrency에 비례합니다.
     
         Args:
             in_filepath (str): 입력할 JSON 파일의 경로와 이름. 확장자는 반드시 .jsonl 이어야 합니다.
             out_filepath (str): 출력할 JSON 파일의 경로와 이름. 확장자는 반드시 .jsonl 이어야 합니다.
             translate_func (Callable[[dict], dict]): 각각의 객체를 번역하는데 사용될 함수
-            max_concurrency (int): 동시에 실행될 태스크 수 (기본값: 10)
+            max_concurrency (int): 동시에 실행될 worker 수 (기본값: 10)
             verbose (bool): 진행 상황 메시지 출력 여부 (기본값: True)
             dev (bool): 개발자 모드 사용 여부 (기본값: False)
             increment (bool, optional): 증분 모드 여부. Defaults to True.
+            schedule (str, optional): 'file' 이면 입력 순서대로, 'longest' 이면 예상 처리 시간이 긴 레코드부터 처리합니다. Defaults to 'file'.
+            dry_run (bool, optional): True 이면 번역하지 않고 예상 토큰 수, 비용, 소요 시간만 출력합니다. Defaults to False.
+            paths (Sequence[str], optional): 번역할 필드 경로. dry_run 이나 schedule='longest' 에서 사용합니다.
+                None 이면 translate_fields 로 만든 translate_func 에서 읽고, 읽을 수 없으면 ValueError 가 발생합니다.
+            **kwargs: pipeline.arun_jsonl 에 전달할 추가 옵션 (retry_policy, dead_letter_filepath 등)
     
         Returns:
-            None
+            dict: dry_run 인 경우 planner.Planner.plan 의 결과, 그 외에는 None
         """
 
+        # 예상 처리량은 dry_run 과 schedule='longest' 에서만 필요합니다.
+        planner = Planner.of(self, translate_func, 'translate', paths) if dry_run or schedule == 'longest' else None
+        if dry_run:
+            plan = planner.plan(in_filepath, prepare=self.append_id)
+            report(plan)
+            return plan
+
         translate_call = partial(translate_func, self)  # translate_func에 self를 인자로 고정하여 새로운 함수(translate_call)를 생성합니다. 
 
-        async def run_task(sem, afp, obj):
-            async with sem:  # semaphore lock을 사용하여 동시에 실행되는 coroutine의 개수를 제한합니다.
-                result = await translate_call(obj)  # translate_call 함수를 실행하여 결과를 반환합니다.
-                await afp.write(json.dumps(result, ensure_ascii=False)+'\n')
-
-        with jsonlines.open(in_filepath) as reader:
-            data = [self.append_id(idx, obj) for idx, obj in enumerate(reader)]  # 입력 파일에서 모든 객체들을 리스트에 저장합니다.
-        
-        if increment and os.path.exists(out_filepath):  # increment 가 True 이고 out_filepath 가 존재하는 경우
-            afp = await async_open(out_filepath, 'a')  # 파일을 추가 모드로 열기 (이어서 쓰기 가능)
-            with jsonlines.open(out_filepath) as reader:  # jsonlines 로 읽기
-                processed_ids = [obj['id'] for obj in reader]  # 이미 처리한 id 들을 processed_ids 리스트에 저장
-            data = [obj for obj in data if obj['id'] not in processed_ids]  # data 의 id 가 이미 processed_ids 리스트에 있는 경우 제외한 데이터만 data 리스트에 저장
-        else:
-            afp = await async_open(out_filepath, "w")
-
-        if dev:
-            data = data[:5]  # 개발자 모드인 경우, 데이터의 일부만 변환하도록 하여 테스트할 수 있습니다.
-
-        semaphore = asyncio.Semaphore(max_concurrency)  # 최대 max_concurrency 수만큼의 태스크가 동시에 실행됩니다.
-
-        tasks = [asyncio.ensure_future(run_task(semaphore, afp, obj)) for obj in data]  # 모든 객체들에 대해서 비동기 태스크를 생성합니다.
-
-        if verbose:
-            print(colored(f"in_filepath: {in_filepath}", 'yellow'))  # 입력 파일 경로 출력
-            print(colored(f"out_filepath: {out_filepath}", 'yellow'))  # 출력 파일 경로 출력
-            print(colored(f"max_concurrency: {max_concurrency}", 'yellow'))  # 최대 max_concurrency 수 출력
-            results = await tqdm_asyncio.gather(*tasks)  # 결과값들을 모아서 반환합니다.
-        else:
-            results = await asyncio.gather(*tasks)  # 결과값들을 모아서 반환합니다.
-
-        await afp.close() # 번역된 결과물들을 출력 파일에 저장합니다.
+        # 입력 파일을 스트리밍으로 읽어 번역하고, 끝나는 대로 출력 파일에 저장합니다.
+        await arun_jsonl(in_filepath, out_filepath, translate_call,
+                         max_concurrency=max_concurrency,
+                         verbose=verbose,
+                         dev=dev,
+                         increment=increment,
+                         prepare=self.append_id,
+                         schedule=schedule,
+                         weigh=planner.weight if planner else None,
+                         **kwargs)
+
+
+class TranslateWrapper(Translate):
+    """
+    다른 Translate 객체를 감싸 기능(캐시 등)을 덧붙이는 클래스입니다.
+    감싼 객체의 속성(backend, model_name 등)은 그대로 노출되며, atranslate_jsonl 등은 감싼 결과를 기준으로 동작합니다.
+
+    Args:
+        inner (Translate): 감쌀 번역 객체
+    """
+
+    def __init__(self, inner: Translate):
+        self.inner = inner
+
+    def __getattr__(self, name):
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def __call__(self, original_text, target_lang=None):
+        # target_lang 이 주어지지 않으면 감싼 객체의 기본값을 사용합니다.
+        if target_lang is None:
+            return await self.inner(original_text)
+        return await self.inner(original_text, target_lang)
 
 
 # 현재 모듈의 이름이 __main__일 경우, 아래 코드를 실행합니다.
@@ -0,0 +1,126 @@
+# python
+from typing import Callable, Optional
+import json
+import os
+import time
+# 비동기
+import asyncio
+# framework
+from checkpoint import Checkpoint
+from metrics import metrics
+
+
+class JsonlWriter:
+    """
+    결과 객체를 jsonl 파일에 기록하는 단일 writer 입니다.
+    worker 들은 put() 으로 결과를 넘기기만 하고, run() 코루틴 하나가 모인 줄들을 큰 단위로 묶어 기록합니다.
+    ordered=True 이면 입력 순서(seq)대로 다시 정렬하여 기록하므로, 실행마다 같은 순서의 출력 파일을 얻을 수 있습니다.
+
+    Args:
+        filepath (str): 출력 jsonl 파일 경로
+        mode (str): 'w' (새로 쓰기) 또는 'a' (이어 쓰기)
+        checkpoint (Checkpoint, optional): 기록이 끝난 줄을 추가할 manifest
+        ordered (bool, optional): 입력 순서대로 기록할지 여부. Defaults to False.
+        flush_interval (float, optional): 모인 줄을 기록하는 최대 간격(초). Defaults to 0.5.
+        flush_bytes (int, optional): 이 크기 이상 모이면 간격과 상관없이 기록합니다. Defaults to 1MiB.
+        fsync (str, optional): 'never', 'close' (닫을 때 한 번), 'flush' (기록할 때마다). Defaults to 'close'.
+        on_settled (Callable[[int], None], optional): 순서가 확정되어 기록 버퍼로 넘어간(또는 건너뛴) 레코드 수를 받는 콜백
+    """
+
+    def __init__(self,
+                 filepath: str,
+                 mode: str = 'w',
+                 checkpoint: Optional[Checkpoint] = None,
+                 ordered=False,
+                 flush_interval=0.5,
+                 flush_bytes=1 << 20,
+                 fsync='close',
+                 on_settled: Optional[Callable[[int], None]] = None):
+        self.fp = open(filepath, mode + 'b')
+        self.checkpoint = checkpoint
+        self.ordered = ordered
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.on_settled = on_settled
+        self.queue = asyncio.Queue()
+        self.reorder = {}  # ordered 모드에서 앞 순서를 기다리는 결과들
+        self.next_seq = 0
+        self.lines = []  # 다음 기록에 포함될 (id, 직렬화된 줄)
+        self.buffered_bytes = 0
+        self.last_flush = time.monotonic()
+
+    def put(self, seq: int, result: dict):
+        """seq 번째 레코드의 결과를 기록 대기열에 넣습니다. 기다리지 않고 바로 반환합니다."""
+        line = (json.dumps(result, ensure_ascii=False)+'\n').encode('utf-8')
+        self.queue.put_nowait((seq, result.get('id'), line))
+
+    def skip(self, seq: int):
+        """seq 번째 레코드는 기록하지 않음을 알립니다. (ordered 모드에서 다음 레코드들이 기다리지 않도록)"""
+        self.queue.put_nowait((seq, None, None))
+
+    def close(self):
+        """대기 중인 줄을 모두 기록하고 run() 을 끝내도록 알립니다."""
+        self.queue.put_nowait(None)
+
+    async def run(self):
+        """writer 코루틴입니다. close() 가 호출될 때까지 결과를 모아 기록합니다."""
+        closing = False
+        try:
+            while not closing:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    item = ()
+                while item is not None:
+                    if item:
+                        self._accept(*item)
+                    if self.queue.empty():
+                        break
+                    item = self.queue.get_nowait()
+                closing = item is None
+                if closing or self.buffered_bytes >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                    await self._flush()
+            if self.fsync != 'never':
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, self.fp.fileno())
+        finally:
+            self.fp.close()
+
+    def _accept(self, seq, obj_id, line):
+        if not self.ordered:
+            self._append(obj_id, line)
+            return
+        self.reorder[seq] = (obj_id, line)
+        while self.next_seq in self.reorder:  # 앞 순서가 모두 도착한 결과들만 내보냅니다.
+            self._append(*self.reorder.pop(self.next_seq))
+            self.next_seq += 1
+
+    def _append(self, obj_id, line):
+        if line is not None:
+            self.lines.append((obj_id, line))
+            self.buffered_bytes += len(line)
+        if self.on_settled is not None:
+            self.on_settled(1)
+
+    async def _flush(self):
+        self.last_flush = time.monotonic()
+        if not self.lines:
+            return
+        lines = self.lines
+        data = b''.join(line for _, line in lines)
+        self.lines, self.buffered_bytes = [], 0
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+        metrics.observe('write_seconds', time.perf_counter() - started)
+        metrics.inc('written_bytes_total', len(data))
+        metrics.inc('written_records_total', len(lines))
+        if self.checkpoint is not None:
+            for obj_id, line in lines:
+                self.checkpoint.add(obj_id, len(line))  # 출력 파일에 기록이 끝난 뒤에 manifest 에 추가합니다.
+            self.checkpoint.flush()
+
+    def _write(self, data: bytes):
+        self.fp.write(data)
+        self.fp.flush()
+        if self.fsync == 'flush':
+            os.fsync(self.fp.fileno())